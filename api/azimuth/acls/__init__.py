@@ -1 +1 @@
-from .acls import allowed_by_acls
+from .acls import allowed_by_acls, compile_acls, filter_allowed
@@ -1,3 +1,4 @@
+import functools
 import re
 import logging
 
@@ -15,6 +16,93 @@ ACL_KEYS = [
 ]
 
 
+def _split_ids(annotation):
+    """
+    Splits a comma-separated list of IDs into a set, stripping any whitespace between IDs.
+    """
+    return frozenset(t.strip() for t in annotation.split(",")) if annotation else frozenset()
+
+
+class ACLMatcher:
+    """
+    The ACL annotations for an object, compiled into sets and regexes so that they can
+    be evaluated for many tenancies without being parsed again.
+    """
+    def __init__(self, allow_ids, deny_ids, allow_pattern, deny_pattern, present):
+        self.allow_ids = _split_ids(allow_ids)
+        self.deny_ids = _split_ids(deny_ids)
+        self.allow_pattern = re.compile(allow_pattern) if allow_pattern else None
+        self.deny_pattern = re.compile(deny_pattern) if deny_pattern else None
+        # If no ACL annotations are found then access is granted
+        self.unrestricted = not present
+        # If either 'allow' annotation is present and non-empty then default to deny
+        self.default = not (allow_ids or allow_pattern)
+
+    def allows(self, tenancy):
+        """
+        Returns true if the ACLs permit the given tenancy.
+        """
+        if self.unrestricted:
+            return True
+        # Deny IDs list takes priority over allow IDs list and any regex patterns
+        if tenancy.id in self.deny_ids:
+            return False
+        # Allow IDs list takes priority over any regex patterns
+        if tenancy.id in self.allow_ids:
+            return True
+        # Deny regex takes priority over allow regex
+        if self.deny_pattern and self.deny_pattern.search(tenancy.name):
+            return False
+        # Check allow regex last
+        if self.allow_pattern and self.allow_pattern.search(tenancy.name):
+            return True
+        return self.default
+
+
+#: The maximum number of object versions for which matchers are cached
+MAX_CACHED_OBJECTS = 4096
+
+# Map of (uid, resourceVersion) -> matcher
+_matchers = {}
+
+
+@functools.lru_cache(maxsize = 1024)
+def _compile(allow_ids, deny_ids, allow_pattern, deny_pattern, present):
+    return ACLMatcher(allow_ids, deny_ids, allow_pattern, deny_pattern, present)
+
+
+def compile_acls(raw):
+    """
+    Returns the :py:class:`ACLMatcher` for the ACL annotations of the given object.
+
+    Matchers are cached by object uid and resourceVersion, so the annotations of an object
+    are only read again when the object changes. Compilation is also cached by the values
+    of the annotations, so objects with the same ACLs share a matcher and an object is only
+    compiled again when its ACLs change.
+    """
+    metadata = raw.get("metadata", {})
+    uid = metadata.get("uid")
+    resource_version = metadata.get("resourceVersion")
+    key = (uid, resource_version) if uid and resource_version else None
+    matcher = _matchers.get(key) if key else None
+    if matcher is None:
+        annotations = metadata.get("annotations", {})
+        matcher = _compile(
+            annotations.get(ACL_ALLOW_IDS_KEY),
+            annotations.get(ACL_DENY_IDS_KEY),
+            annotations.get(ACL_ALLOW_PATTERN_KEY),
+            annotations.get(ACL_DENY_PATTERN_KEY),
+            not annotations.keys().isdisjoint(ACL_KEYS)
+        )
+        if key:
+            # Entries for old resource versions are never used again, so rather than
+            # tracking usage just start again when the cache is full
+            if len(_matchers) >= MAX_CACHED_OBJECTS:
+                _matchers.clear()
+            _matchers[key] = matcher
+    return matcher
+
+
 def allowed_by_acls(raw, tenancy):
     """
     Returns true if the application template is permitted in the given tenancy.
@@ -22,45 +110,25 @@ def allowed_by_acls(raw, tenancy):
     If the annotation is present but empty then we treat it is as if it were not
     present at all.
     """
-    annotations = raw.get("metadata", {}).get("annotations", {})
-
-    # If no ACL annotations are found then access is granted
-    if not any(k in annotations for k in ACL_KEYS):
-        return True
-
-    # Deny IDs list takes priority over allow IDs list and any regex patterns
-    deny_ids_annotation = annotations.get(ACL_DENY_IDS_KEY)
-    if deny_ids_annotation:
-        # Split into list and strip any whitespace between IDs
-        denied_tenancies = [t.strip() for t in deny_ids_annotation.split(",")]
-        # Return immediately if access is denied
-        if tenancy.id in denied_tenancies:
-            return False
+    return compile_acls(raw).allows(tenancy)
 
-    # Allow IDs list takes priority over any regex patterns
-    allow_ids_annotation = annotations.get(ACL_ALLOW_IDS_KEY)
-    if allow_ids_annotation:
-        allowed_tenancies = [t.strip() for t in allow_ids_annotation.split(",")]
-        # Return immediately if allowed since allow by
-        # IDs takes priority over deny by regex
-        if tenancy.id in allowed_tenancies:
-            return True
 
-    # Deny regex takes priority over allow regex
-    deny_pattern = annotations.get(ACL_DENY_PATTERN_KEY)
-    # Return immediately if access is denied
-    if deny_pattern and re.search(deny_pattern, tenancy.name):
-        return False
-
-    # Check allow regex last
-    allow_pattern = annotations.get(ACL_ALLOW_PATTERN_KEY)
-    if allow_pattern and re.search(allow_pattern, tenancy.name):
-        # Return immediately since we've already checked all deny
-        # annotations by this point so there won't be conflicts
-        return True
-
-    # If either 'allow' annotation is present and non-empty then default to deny
-    return not (
-        annotations.get(ACL_ALLOW_IDS_KEY) or
-        annotations.get(ACL_ALLOW_PATTERN_KEY)
-    )
+def filter_allowed(objects, tenancy):
+    """
+    Returns a list of the objects that are permitted in the given tenancy, in the
+    original order.
+
+    The ACLs are evaluated once for each distinct matcher, so objects that share the
+    same ACLs, including objects with no ACLs, are only checked once.
+    """
+    results = {}
+    allowed = []
+    for raw in objects:
+        matcher = compile_acls(raw)
+        try:
+            permitted = results[matcher]
+        except KeyError:
+            permitted = results[matcher] = matcher.allows(tenancy)
+        if permitted:
+            allowed.append(raw)
+    return allowed
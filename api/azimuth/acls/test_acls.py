@@ -1,3 +1,7 @@
+import itertools
+import logging
+import re
+import time
 from unittest import TestCase
 from .acls import (
     ACL_KEYS,
@@ -6,11 +10,16 @@ from .acls import (
     ACL_DENY_IDS_KEY,
     ACL_DENY_PATTERN_KEY,
     allowed_by_acls,
+    compile_acls,
+    filter_allowed,
 )
 
 from ..provider.dto import Tenancy
 
 
+logger = logging.getLogger(__name__)
+
+
 class ACLTestCase(TestCase):
 
     def assert_allowed(self, resource, tenancy):
@@ -175,3 +184,155 @@ class ACLTestCase(TestCase):
         self.assert_denied(test_resource, Tenancy("", "dev"))
         # Allowed since IDs take priority over regex matches
         self.assert_allowed(test_resource, Tenancy("id-2", "prod"))
+
+
+def reference_allowed_by_acls(raw, tenancy):
+    """
+    The original, uncompiled implementation of allowed_by_acls, used to check that the
+    compiled matchers are equivalent.
+    """
+    annotations = raw.get("metadata", {}).get("annotations", {})
+    if not any(k in annotations for k in ACL_KEYS):
+        return True
+    deny_ids_annotation = annotations.get(ACL_DENY_IDS_KEY)
+    if deny_ids_annotation:
+        denied_tenancies = [t.strip() for t in deny_ids_annotation.split(",")]
+        if tenancy.id in denied_tenancies:
+            return False
+    allow_ids_annotation = annotations.get(ACL_ALLOW_IDS_KEY)
+    if allow_ids_annotation:
+        allowed_tenancies = [t.strip() for t in allow_ids_annotation.split(",")]
+        if tenancy.id in allowed_tenancies:
+            return True
+    deny_pattern = annotations.get(ACL_DENY_PATTERN_KEY)
+    if deny_pattern and re.search(deny_pattern, tenancy.name):
+        return False
+    allow_pattern = annotations.get(ACL_ALLOW_PATTERN_KEY)
+    if allow_pattern and re.search(allow_pattern, tenancy.name):
+        return True
+    return not (
+        annotations.get(ACL_ALLOW_IDS_KEY) or
+        annotations.get(ACL_ALLOW_PATTERN_KEY)
+    )
+
+
+# Candidate values for each annotation, where None means the annotation is absent
+ANNOTATION_VALUES = {
+    ACL_ALLOW_IDS_KEY: [None, "", "id-1", " id-1 , id-2 ", "id-2,id-3"],
+    ACL_DENY_IDS_KEY: [None, "", "id-1", "id-3 , id-4"],
+    ACL_ALLOW_PATTERN_KEY: [None, "", "prod", "^(staging|dev)-"],
+    ACL_DENY_PATTERN_KEY: [None, "", "prod", "-2$"],
+}
+
+TENANCIES = [
+    Tenancy(id, name)
+    for id, name in itertools.product(
+        ["", "id-1", "id-2", "id-3", "id-4", "id-5"],
+        ["", "prod", "prod-2", "staging-1", "staging-2", "dev-1", "other"]
+    )
+]
+
+
+def make_resources():
+    """
+    Returns a resource for every combination of annotation values.
+    """
+    resources = []
+    keys = list(ANNOTATION_VALUES)
+    for i, values in enumerate(itertools.product(*ANNOTATION_VALUES.values())):
+        annotations = { k: v for k, v in zip(keys, values) if v is not None }
+        resources.append({
+            "metadata": {
+                "name": f"resource-{i}",
+                "uid": f"uid-{i}",
+                "resourceVersion": "1",
+                "annotations": annotations,
+            }
+        })
+    return resources
+
+
+class ACLEquivalenceTestCase(TestCase):
+
+    # Check that the compiled matchers agree with the original implementation for
+    # every combination of annotations and tenancies
+    def test_allowed_by_acls_equivalence(self):
+        mismatches = [
+            (resource["metadata"]["annotations"], tenancy)
+            for resource in make_resources()
+            for tenancy in TENANCIES
+            if allowed_by_acls(resource, tenancy) != reference_allowed_by_acls(resource, tenancy)
+        ]
+        self.assertEqual(mismatches, [])
+
+    # Check that the bulk filter returns the same objects in the same order
+    def test_filter_allowed_equivalence(self):
+        resources = make_resources()
+        for tenancy in TENANCIES:
+            self.assertEqual(
+                filter_allowed(resources, tenancy),
+                [r for r in resources if reference_allowed_by_acls(r, tenancy)],
+                tenancy
+            )
+
+    # Check that resources without metadata are allowed
+    def test_no_metadata(self):
+        self.assertTrue(allowed_by_acls({}, Tenancy("id-1", "name-1")))
+        self.assertEqual(filter_allowed([{}], Tenancy("id-1", "name-1")), [{}])
+
+    # Check that matchers are reused for the same ACLs and recompiled when they change
+    def test_matcher_cache(self):
+        resource = {"metadata": {"annotations": {ACL_ALLOW_IDS_KEY: "id-1"}}}
+        same_acls = {"metadata": {"annotations": {ACL_ALLOW_IDS_KEY: "id-1"}}}
+        self.assertIs(compile_acls(resource), compile_acls(same_acls))
+        changed = {"metadata": {"annotations": {ACL_ALLOW_IDS_KEY: "id-2"}}}
+        self.assertIsNot(compile_acls(resource), compile_acls(changed))
+        self.assertFalse(allowed_by_acls(changed, Tenancy("id-1", "")))
+
+    # Check that a new resource version of an object with changed ACLs is recompiled
+    def test_matcher_cache_resource_version(self):
+        def resource(resource_version, allow_ids):
+            return {
+                "metadata": {
+                    "uid": "uid-cached",
+                    "resourceVersion": resource_version,
+                    "annotations": {ACL_ALLOW_IDS_KEY: allow_ids},
+                }
+            }
+        tenancy = Tenancy("id-1", "")
+        self.assertTrue(allowed_by_acls(resource("1", "id-1"), tenancy))
+        self.assertFalse(allowed_by_acls(resource("2", "id-2"), tenancy))
+
+
+class ACLBenchmarkTestCase(TestCase):
+
+    # Micro-benchmark comparing the original implementation with the compiled matchers
+    # when filtering a list of resources for many tenancies, as the list views do
+    # The timings are reported rather than asserted so that the test is not flaky
+    def test_filter_allowed_benchmark(self):
+        resources = make_resources()
+        iterations = 3
+
+        start = time.perf_counter()
+        for _ in range(iterations):
+            for tenancy in TENANCIES:
+                expected = [r for r in resources if reference_allowed_by_acls(r, tenancy)]
+        reference_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in range(iterations):
+            for tenancy in TENANCIES:
+                actual = filter_allowed(resources, tenancy)
+        compiled_time = time.perf_counter() - start
+
+        self.assertEqual(actual, expected)
+        logger.info(
+            "ACL filtering of %s resources for %s tenancies x %s: "
+            "reference %.3fs, compiled %.3fs (%.1fx)",
+            len(resources),
+            len(TENANCIES),
+            iterations,
+            reference_time,
+            compiled_time,
+            reference_time / compiled_time
+        )
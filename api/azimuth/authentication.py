@@ -3,10 +3,13 @@ Django REST Framwork authentication backend for the Azimuth app.
 """
 
 import logging
+import time
 
 from rest_framework.authentication import BaseAuthentication
 from rest_framework.exceptions import AuthenticationFailed
 
+from . import metrics
+from .cache import LRUCache, get_cache, hash_key
 from .provider import errors
 from .settings import cloud_settings
 
@@ -51,3 +54,121 @@ class TokenHeaderAuthentication(BaseAuthentication):
 
     def authenticate_header(self, request):
         return "Token"
+
+
+class SessionSnapshot:
+    """
+    Snapshot of the user and tenancy information for an authenticated session.
+
+    Snapshots can be cached and used in place of a provider session by views that only
+    need this information.
+    """
+    def __init__(self, user_id, username, user_email, tenancies):
+        self._user_id = user_id
+        self._username = username
+        self._user_email = user_email
+        self._tenancies = tuple(tenancies)
+
+    @classmethod
+    def from_session(cls, session):
+        """
+        Returns a snapshot of the given provider session.
+        """
+        return cls(
+            session.user_id(),
+            session.username(),
+            session.user_email(),
+            session.tenancies()
+        )
+
+    def user_id(self):
+        return self._user_id
+
+    def username(self):
+        return self._username
+
+    def user_email(self):
+        return self._user_email
+
+    def tenancies(self):
+        return self._tenancies
+
+    def close(self):
+        # There is nothing to clean up for a snapshot
+        pass
+
+
+class CachedSessionAuthentication(TokenHeaderAuthentication):
+    """
+    Authentication backend that caches a snapshot of the session for a token for a short
+    time, along with failures to authenticate the token.
+
+    When the cache is hit, no provider session is constructed and the snapshot is returned
+    as the auth object. This makes it suitable only for views that use the methods of
+    :py:class:`SessionSnapshot`.
+
+    Snapshots are kept in an in-process LRU cache, so that most checks do not leave the
+    process, with the shared cache used as a fallback so that a snapshot taken by one
+    worker can be used by the others.
+    """
+    #: In-process cache of (expires_at, snapshot or error message) tuples
+    _snapshots = LRUCache("session_snapshots", maxsize = 10000)
+
+    def _key(self, token):
+        return "session-snapshot:{}".format(hash_key(token))
+
+    def _get(self, key):
+        """
+        Returns the cached snapshot or error message for the key, or ``None``.
+        """
+        entry = self._snapshots.get(key)
+        if entry is not None:
+            expires_at, cached = entry
+            if expires_at > time.monotonic():
+                return cached
+            self._snapshots.delete(key)
+        cached = get_cache().get(key)
+        if cached is not None:
+            # The remaining time in the shared cache is not known, so use the shorter TTL
+            ttl = min(
+                cloud_settings.VERIFY_CACHE_TTL,
+                cloud_settings.VERIFY_NEGATIVE_CACHE_TTL
+            )
+            self._snapshots.set(key, (time.monotonic() + ttl, cached))
+        return cached
+
+    def _set(self, key, value, ttl):
+        """
+        Stores the snapshot or error message for the key for the given number of seconds.
+        """
+        self._snapshots.set(key, (time.monotonic() + ttl, value))
+        get_cache().set(key, value, ttl)
+
+    def authenticate(self, request):
+        token = request.META.get(cloud_settings.TOKEN_HEADER)
+        if not token:
+            return None
+        key = self._key(token)
+        cached = self._get(key)
+        if cached is not None:
+            metrics.increment("cache.session_verify.hit")
+            # Failures are cached as the error message
+            if isinstance(cached, str):
+                raise AuthenticationFailed(cached)
+            return (AuthenticatedUser(cached.username()), cached)
+        metrics.increment("cache.session_verify.miss")
+        try:
+            user, session = super().authenticate(request)
+        except AuthenticationFailed as exc:
+            self._set(key, str(exc.detail), cloud_settings.VERIFY_NEGATIVE_CACHE_TTL)
+            raise
+        try:
+            snapshot = SessionSnapshot.from_session(session)
+        except errors.Error:
+            # If we fail to take a snapshot, return the session and let the view
+            # handle the error when it uses the session
+            return (user, session)
+        else:
+            session.close()
+        self._set(key, snapshot, cloud_settings.VERIFY_CACHE_TTL)
+        return (user, snapshot)
@@ -0,0 +1,218 @@
+"""
+Helpers for caching data that is shared between requests, threads and workers.
+"""
+
+import collections
+import hashlib
+import threading
+import time
+
+from django.core.cache import caches, InvalidCacheBackendError
+from django.core.cache.backends.base import BaseCache, DEFAULT_TIMEOUT
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.utils.module_loading import import_string
+
+from . import metrics
+
+
+#: The alias of the cache that is shared between the workers in a process group
+SHARED_CACHE_ALIAS = "azimuth"
+
+
+def get_cache(alias = SHARED_CACHE_ALIAS):
+    """
+    Returns the Django cache with the given alias, falling back to the default cache
+    if the alias is not configured.
+    """
+    try:
+        return caches[alias]
+    except InvalidCacheBackendError:
+        return caches["default"]
+
+
+def hash_key(*parts):
+    """
+    Returns a fixed-length key derived from the given parts.
+
+    This is used both to keep keys within the limits imposed by cache backends and to
+    avoid storing sensitive values, such as tokens, in cache keys.
+    """
+    return hashlib.sha256("\0".join(str(part) for part in parts).encode()).hexdigest()
+
+
+class ThrottledFileBasedCache(FileBasedCache):
+    """
+    File-based cache that checks whether entries need to be culled at most once every
+    ``CULL_INTERVAL`` seconds (an option, default 10), rather than listing the whole cache
+    directory on every write.
+
+    The number of entries may exceed ``MAX_ENTRIES`` by the number of entries that are
+    written between checks.
+    """
+    def __init__(self, dir, params):
+        super().__init__(dir, params)
+        self.cull_interval = params.get("OPTIONS", {}).get("CULL_INTERVAL", 10)
+        self._culled_at = None
+
+    def _cull(self):
+        now = time.monotonic()
+        if self._culled_at is not None and now - self._culled_at < self.cull_interval:
+            return
+        self._culled_at = now
+        super()._cull()
+
+
+#: Sentinel used to detect misses, as None is a valid cached value
+_MISSING = object()
+
+
+class TieredCache(BaseCache):
+    """
+    Cache backend that keeps entries in a bounded, in-process tier in front of a cache
+    that is shared between the workers, e.g. a file-based cache.
+
+    Reads that hit the local tier do not touch the shared cache. Entries are kept in the
+    local tier for at most ``LOCAL_TIMEOUT`` seconds, which bounds how long a change made
+    by another worker can go unnoticed.
+
+    In addition to the usual keys, the configuration for the cache accepts:
+
+      * ``SHARED``: the configuration for the shared cache, in the same form as the
+        entries in ``CACHES``
+      * ``LOCAL_TIMEOUT``: the maximum number of seconds that an entry is kept in the
+        local tier (default 10)
+      * ``LOCAL_MAX_ENTRIES``: the maximum number of entries in the local tier (default
+        1000), which are evicted in least-recently-used order
+    """
+    def __init__(self, location, params):
+        super().__init__(params)
+        shared = params["SHARED"]
+        self._shared = import_string(shared["BACKEND"])(shared.get("LOCATION", ""), shared)
+        self.local_timeout = params.get("LOCAL_TIMEOUT", 10)
+        self._local = LocMemCache(
+            # The location identifies the storage for the local tier within the process
+            f"tiered:{location}",
+            dict(
+                TIMEOUT = self.local_timeout,
+                OPTIONS = dict(MAX_ENTRIES = params.get("LOCAL_MAX_ENTRIES", 1000))
+            )
+        )
+
+    def _local_timeout(self, timeout):
+        """
+        Returns the timeout for the local tier for an entry with the given timeout.
+        """
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        return self.local_timeout if timeout is None else min(timeout, self.local_timeout)
+
+    def get(self, key, default = None, version = None):
+        value = self._local.get(key, _MISSING, version)
+        if value is _MISSING:
+            value = self._shared.get(key, _MISSING, version)
+            if value is _MISSING:
+                return default
+            # The remaining time in the shared cache is not known
+            self._local.set(key, value, self.local_timeout, version)
+        return value
+
+    def set(self, key, value, timeout = DEFAULT_TIMEOUT, version = None):
+        self._shared.set(key, value, timeout, version)
+        self._local.set(key, value, self._local_timeout(timeout), version)
+
+    def add(self, key, value, timeout = DEFAULT_TIMEOUT, version = None):
+        added = self._shared.add(key, value, timeout, version)
+        if added:
+            self._local.set(key, value, self._local_timeout(timeout), version)
+        return added
+
+    def touch(self, key, timeout = DEFAULT_TIMEOUT, version = None):
+        self._local.delete(key, version)
+        return self._shared.touch(key, timeout, version)
+
+    def delete(self, key, version = None):
+        self._local.delete(key, version)
+        return self._shared.delete(key, version)
+
+    def has_key(self, key, version = None):
+        return self._local.has_key(key, version) or self._shared.has_key(key, version)
+
+    def clear(self):
+        self._local.clear()
+        self._shared.clear()
+
+
+class LRUCache:
+    """
+    Thread-safe, bounded, in-process cache that discards the least recently used entries.
+
+    This is used for values that are cheap to keep but expensive to compute, e.g. DTOs
+    converted from Kubernetes objects, which cannot be shared between workers.
+
+    Args:
+        name: The name of the cache, used for metrics.
+        maxsize: The maximum number of entries to keep.
+    """
+    def __init__(self, name, maxsize = 2048):
+        self.name = name
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()
+
+    def get(self, key, default = None):
+        """
+        Returns the value for the key, or ``default`` if there is no entry.
+        """
+        with self._lock:
+            try:
+                value = self._entries[key]
+            except KeyError:
+                metrics.increment(f"cache.{self.name}.miss")
+                return default
+            self._entries.move_to_end(key)
+        metrics.increment(f"cache.{self.name}.hit")
+        return value
+
+    def set(self, key, value):
+        """
+        Stores the value for the key, discarding the least recently used entries if the
+        cache is full.
+        """
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last = False)
+
+    def delete(self, key):
+        """
+        Removes the entry for the key, if there is one.
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def get_or_set(self, key, func):
+        """
+        Returns the value for the key, calling ``func`` to compute and store it if there is
+        no entry. If the key is ``None``, ``func`` is called and the result is not stored.
+        """
+        if key is None:
+            return func()
+        with self._lock:
+            try:
+                value = self._entries[key]
+            except KeyError:
+                pass
+            else:
+                self._entries.move_to_end(key)
+                metrics.increment(f"cache.{self.name}.hit")
+                return value
+        metrics.increment(f"cache.{self.name}.miss")
+        value = func()
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last = False)
+        return value
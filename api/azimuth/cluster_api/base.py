@@ -20,10 +20,13 @@ from easykube import (
 
 from ..provider import base as cloud_base, dto as cloud_dto, errors as cloud_errors
 from ..scheduling import dto as scheduling_dto, k8s as scheduling_k8s
-from .. import utils
+from .. import concurrency, utils
+from ..cache import LRUCache
+from ..informer import Informer
+from ..kube import ClientPool, get_client_pool, object_version
 
 from . import dto, errors
-from ..acls import allowed_by_acls
+from ..acls import allowed_by_acls, filter_allowed
 
 
 logger = logging.getLogger(__name__)
@@ -65,13 +68,63 @@ def convert_exceptions(f):
     return wrapper
 
 
+#: Decorator that coalesces identical concurrent reads for the same tenancy
+coalesce_reads = concurrency.coalesce(lambda session: session._cloud_session.tenancy().id)
+
+
+# Converted DTOs, keyed by the version of the object they were converted from, so that
+# objects that have not changed are not converted again
+_cluster_dtos = LRUCache("capi_cluster_dtos")
+_app_dtos = LRUCache("capi_app_dtos")
+
+
 class Provider:
     """
     Base class for Cluster API providers.
+
+    Args:
+        use_informers: Indicates whether reads of cluster templates, clusters, app templates
+                       and apps should be served from process-level caches that are kept
+                       up to date using watches.
+        informer_sync_timeout: The maximum number of seconds that reads wait for the caches
+                               to be populated before falling back to the Kubernetes API.
     """
-    def __init__(self):
+    def __init__(self, use_informers = True, informer_sync_timeout = 5):
         # Get the easykube configuration from the environment
         self._ekconfig = Configuration.from_environment()
+        if use_informers:
+            self._informers = {
+                "clustertemplates": Informer(
+                    self._ekconfig,
+                    AZIMUTH_API_VERSION,
+                    "clustertemplates",
+                    namespaced = False,
+                    sync_timeout = informer_sync_timeout
+                ),
+                "clusters": Informer(
+                    self._ekconfig,
+                    AZIMUTH_API_VERSION,
+                    "clusters",
+                    sync_timeout = informer_sync_timeout
+                ),
+                "apptemplates": Informer(
+                    self._ekconfig,
+                    AZIMUTH_API_VERSION,
+                    "apptemplates",
+                    namespaced = False,
+                    sync_timeout = informer_sync_timeout
+                ),
+                # Only the HelmReleases that reference an Azimuth app template are apps
+                "helmreleases": Informer(
+                    self._ekconfig,
+                    CAPI_ADDONS_API_VERSION,
+                    "helmreleases",
+                    labels = { "azimuth.stackhpc.com/app-template": PRESENT },
+                    sync_timeout = informer_sync_timeout
+                ),
+            }
+        else:
+            self._informers = {}
 
     def get_session_class(self) -> t.Type['Session']:
         """
@@ -87,8 +140,8 @@ class Provider:
         Returns a Cluster API session scoped to the given cloud provider session.
         """
         session_class = self.get_session_class()
-        client = self._ekconfig.sync_client()
-        return session_class(client, cloud_session)
+        client_pool = get_client_pool()
+        return session_class(client_pool.acquire(), cloud_session, self._informers, client_pool)
 
 
 class NodeGroupSpec(t.TypedDict):
@@ -113,9 +166,18 @@ class Session:
     """
     Base class for a scoped session.
     """
-    def __init__(self, client: SyncClient, cloud_session: cloud_base.ScopedSession):
+    def __init__(
+        self,
+        client: SyncClient,
+        cloud_session: cloud_base.ScopedSession,
+        informers: t.Optional[t.Dict[str, Informer]] = None,
+        client_pool: t.Optional[ClientPool] = None
+    ):
         self._client = client
         self._cloud_session = cloud_session
+        self._informers = informers or {}
+        # If the client was borrowed from a pool, it is returned to the pool on close
+        self._client_pool = client_pool
 
     def _log(self, message, *args, level = logging.INFO, **kwargs):
         logger.log(
@@ -127,6 +189,72 @@ class Session:
             **kwargs
         )
 
+    def _informer(self, resource):
+        """
+        Returns the informer for the resource if there is one that can be used for reads,
+        or ``None`` if reads should go to the Kubernetes API.
+        """
+        informer = self._informers.get(resource)
+        if informer and informer.wait_for_sync():
+            return informer
+        else:
+            return None
+
+    def _namespace_for(self, informer):
+        return self._client.default_namespace if informer.namespaced else None
+
+    def _list_objects(self, api_version, resource, **params):
+        """
+        Lists the objects for the resource in the target namespace, using the informer for
+        the resource if possible.
+        """
+        informer = self._informer(resource)
+        if informer:
+            return list(informer.list(self._namespace_for(informer)))
+        else:
+            return list(self._client.api(api_version).resource(resource).list(**params))
+
+    def _fetch_object(self, api_version, resource, name):
+        """
+        Fetches the named object for the resource in the target namespace, using the
+        informer for the resource if possible.
+
+        Objects that are not in the informer's store, e.g. because they were created by
+        another process very recently, are fetched from the Kubernetes API.
+        """
+        informer = self._informer(resource)
+        if informer:
+            obj = informer.get(name, self._namespace_for(informer))
+            if obj is not None:
+                return obj
+        return self._refresh_object(api_version, resource, name)
+
+    def _refresh_object(self, api_version, resource, name):
+        """
+        Fetches the named object from the Kubernetes API and records it with the informer
+        for the resource, so that subsequent reads see the current state.
+        """
+        informer = self._informers.get(resource)
+        try:
+            obj = self._client.api(api_version).resource(resource).fetch(name)
+        except ApiError as exc:
+            if informer and exc.status_code == 404:
+                informer.forget(name, self._namespace_for(informer))
+            raise
+        if informer:
+            informer.record(obj)
+        return obj
+
+    def _record_object(self, resource, obj):
+        """
+        Records an object returned by a write with the informer for the resource, so that
+        reads in this process see the write even before the watch event arrives.
+        """
+        informer = self._informers.get(resource)
+        if informer:
+            informer.record(obj)
+        return obj
+
     def _from_api_cluster_template(self, ct):
         """
         Converts a cluster template from the Kubernetes API to a DTO.
@@ -152,37 +280,29 @@ class Session:
         )
 
     @convert_exceptions
+    @coalesce_reads
     def cluster_templates(self) -> t.Iterable[dto.ClusterTemplate]:
         """
         Lists the cluster templates currently available to the tenancy.
         """
         self._log("Fetching available cluster templates")
-        templates = list(
-            self._client
-                .api(AZIMUTH_API_VERSION)
-                .resource("clustertemplates")
-                .list()
-        )
+        templates = self._list_objects(AZIMUTH_API_VERSION, "clustertemplates")
 
         # Filter cluster templates based on ACL annotations
         tenancy = self._cloud_session.tenancy()
-        templates = [t for t in templates if allowed_by_acls(t, tenancy)]
+        templates = filter_allowed(templates, tenancy)
 
         self._log("Found %s cluster templates", len(templates))
         return tuple(self._from_api_cluster_template(ct) for ct in templates)
 
     @convert_exceptions
+    @coalesce_reads
     def find_cluster_template(self, id: str) -> dto.ClusterTemplate:
         """
         Finds a cluster template by id.
         """
         self._log("Fetching cluster template with id '%s'", id)
-        template = (
-            self._client
-                .api(AZIMUTH_API_VERSION)
-                .resource("clustertemplates")
-                .fetch(id)
-        )
+        template = self._fetch_object(AZIMUTH_API_VERSION, "clustertemplates", id)
         
         if not allowed_by_acls(template, self._cloud_session.tenancy()):
             raise errors.ObjectNotFoundError(f"Cannot find cluster template {id}")
@@ -191,6 +311,17 @@ class Session:
             
 
     def _from_api_cluster(self, cluster, sizes):
+        """
+        Converts a cluster from the Kubernetes API to a DTO, reusing the DTO from a previous
+        conversion of the same version of the cluster with the same sizes if possible.
+        """
+        key = object_version(cluster)
+        if key:
+            # Only the names and ids of the sizes are used in the conversion
+            key = (*key, tuple((size.name, size.id) for size in sizes))
+        return _cluster_dtos.get_or_set(key, lambda: self._convert_api_cluster(cluster, sizes))
+
+    def _convert_api_cluster(self, cluster, sizes):
         """
         Converts a cluster from the Kubernetes API to a DTO.
         """
@@ -225,6 +356,12 @@ class Session:
             elif cluster.spec != last_handled_spec:
                 cluster_state = "Reconciling"
 
+        # Index the sizes by name, as only the name is recorded in the cluster
+        # The first size with a particular name wins
+        size_ids = {}
+        for size in sizes:
+            size_ids.setdefault(size.name, size.id)
+
         # If there is a schedule in the annotations, unserialize it
         annotations = cluster.metadata.get("annotations", {})
         schedule_json = annotations.get("azimuth.stackhpc.com/schedule")
@@ -238,25 +375,11 @@ class Session:
             cluster.metadata.name,
             cluster.metadata.name,
             cluster.spec["templateName"],
-            next(
-                (
-                    size.id
-                    for size in sizes
-                    if size.name == cluster.spec["controlPlaneMachineSize"]
-                ),
-                None
-            ),
+            size_ids.get(cluster.spec["controlPlaneMachineSize"]),
             [
                 dto.NodeGroup(
                     ng["name"],
-                    next(
-                        (
-                            size.id
-                            for size in sizes
-                            if size.name == ng["machineSize"]
-                        ),
-                        None
-                    ),
+                    size_ids.get(ng["machineSize"]),
                     ng.get("autoscale", False),
                     ng.get("count"),
                     ng.get("minCount"),
@@ -279,14 +402,7 @@ class Session:
                     name,
                     node["role"],
                     node.get("phase", "Unknown"),
-                    next(
-                        (
-                            size.id
-                            for size in sizes
-                            if size.name == node["size"]
-                        ),
-                        None
-                    ),
+                    size_ids.get(node["size"]),
                     node.get("ip"),
                     node.get("kubeletVersion"),
                     node.get("nodeGroup"),
@@ -311,17 +427,13 @@ class Session:
         )
 
     @convert_exceptions
+    @coalesce_reads
     def clusters(self) -> t.Iterable[dto.Cluster]:
         """
         Lists the clusters currently available to the tenancy.
         """
         self._log("Fetching available clusters")
-        clusters = list(
-            self._client
-                .api(AZIMUTH_API_VERSION)
-                .resource("clusters")
-                .list()
-        )
+        clusters = self._list_objects(AZIMUTH_API_VERSION, "clusters")
         self._log("Found %s clusters", len(clusters))
         if clusters:
             sizes = list(self._cloud_session.sizes())
@@ -330,17 +442,13 @@ class Session:
             return ()
 
     @convert_exceptions
+    @coalesce_reads
     def find_cluster(self, id: str) -> dto.Cluster:
         """
         Finds a cluster by id.
         """
         self._log("Fetching cluster with id '%s'", id)
-        cluster = (
-            self._client
-                .api(AZIMUTH_API_VERSION)
-                .resource("clusters")
-                .fetch(id)
-        )
+        cluster = self._fetch_object(AZIMUTH_API_VERSION, "clusters", id)
         sizes = list(self._cloud_session.sizes())
         return self._from_api_cluster(cluster, sizes)
 
@@ -430,7 +538,7 @@ class Session:
         # Make sure any shared resources exist
         self._ensure_shared_resources()
         # Determine if leases are available on the target cluster
-        leases_available = scheduling_k8s.leases_available(self._client)
+        leases_available = scheduling_k8s.leases_available()
         try:
             credential = self._create_credential(name)
         except cloud_errors.InvalidOperationError:
@@ -502,6 +610,7 @@ class Session:
             },
             "spec": cluster_spec,
         })
+        self._record_object("clusters", cluster)
         # Create the scheduling resources for the cluster
         # This may or may not create a Blazar lease to reserve the resources
         scheduling_k8s.create_scheduling_resources(
@@ -510,7 +619,8 @@ class Session:
             cluster,
             cluster.spec["cloudCredentialsSecretName"],
             resources,
-            schedule
+            schedule,
+            use_leases = leases_available
         )
         # Use the sizes that we already have
         sizes = [control_plane_size] + [ng["machine_size"] for ng in node_groups]
@@ -532,6 +642,7 @@ class Session:
                 .resource("clusters")
                 .patch(cluster, { "spec": spec })
         )
+        self._record_object("clusters", cluster)
         sizes = list(self._cloud_session.sizes())
         return self._from_api_cluster(cluster, sizes)
 
@@ -557,6 +668,7 @@ class Session:
         # Apply a patch to the specified cluster to update the template
         ekclusters = self._client.api(AZIMUTH_API_VERSION).resource("clusters")
         cluster = ekclusters.patch(cluster, {"spec": spec})
+        self._record_object("clusters", cluster)
         sizes = list(self._cloud_session.sizes())
         return self._from_api_cluster(cluster, sizes)
 
@@ -596,6 +708,8 @@ class Session:
             cluster,
             propagation_policy = "Foreground"
         )
+        # Make sure that the deletion is visible to the read
+        self._refresh_object(AZIMUTH_API_VERSION, "clusters", cluster)
         return self.find_cluster(cluster)
 
     @convert_exceptions
@@ -609,12 +723,7 @@ class Session:
         if isinstance(cluster, dto.Cluster):
             cluster = cluster.id
         self._log("Generating kubeconfig for cluster with id '%s'", id)
-        cluster = (
-            self._client
-                .api(AZIMUTH_API_VERSION)
-                .resource("clusters")
-                .fetch(cluster)
-        )
+        cluster = self._fetch_object(AZIMUTH_API_VERSION, "clusters", cluster)
         # Just get the named secret
         kubeconfig_secret_name = cluster.get("status", {}).get("kubeconfigSecretName")
         if kubeconfig_secret_name:
@@ -659,22 +768,18 @@ class Session:
         )
 
     @convert_exceptions
+    @coalesce_reads
     def app_templates(self) -> t.Iterable[dto.AppTemplate]:
         """
         Lists the app templates currently available to the tenancy.
         """
         self._log("Fetching available app templates")
-        templates = list(
-            self._client
-                .api(AZIMUTH_API_VERSION)
-                .resource("apptemplates")
-                .list()
-        )
+        templates = self._list_objects(AZIMUTH_API_VERSION, "apptemplates")
         self._log("Found %s app templates", len(templates))
 
         # Filter templates based on ACL annotations
         tenancy = self._cloud_session.tenancy()
-        templates = [t for t in templates if allowed_by_acls(t, tenancy)]
+        templates = filter_allowed(templates, tenancy)
 
         # Don't return app templates with no versions
         return tuple(
@@ -684,17 +789,13 @@ class Session:
         )
 
     @convert_exceptions
+    @coalesce_reads
     def find_app_template(self, id: str) -> dto.AppTemplate:
         """
         Finds an app template by id.
         """
         self._log("Fetching app template with id '%s'", id)
-        template = (
-            self._client
-                .api(AZIMUTH_API_VERSION)
-                .resource("apptemplates")
-                .fetch(id)
-        )
+        template = self._fetch_object(AZIMUTH_API_VERSION, "apptemplates", id)
         
         tenancy =  self._cloud_session.tenancy()
         if not allowed_by_acls(template, tenancy):
@@ -707,6 +808,16 @@ class Session:
             raise errors.ObjectNotFoundError(f"Kubernetes app template '{id}' not found")
 
     def _from_helm_release(self, helm_release):
+        """
+        Converts a Helm release to an app DTO, reusing the DTO from a previous conversion
+        of the same version of the release if possible.
+        """
+        return _app_dtos.get_or_set(
+            object_version(helm_release),
+            lambda: self._convert_helm_release(helm_release)
+        )
+
+    def _convert_helm_release(self, helm_release):
         """
         Converts a Helm release to an app DTO.
         """
@@ -768,38 +879,32 @@ class Session:
         )
 
     @convert_exceptions
+    @coalesce_reads
     def apps(self) -> t.Iterable[dto.Cluster]:
         """
         Lists the apps for the tenancy.
         """
         self._log("Fetching available apps")
         # The apps are the HelmReleases that reference an Azimuth app template
-        apps = list(
-            self._client
-                .api(CAPI_ADDONS_API_VERSION)
-                .resource("helmreleases")
-                .list(
-                    labels = {
-                        "azimuth.stackhpc.com/app-template": PRESENT,
-                    }
-                )
+        apps = self._list_objects(
+            CAPI_ADDONS_API_VERSION,
+            "helmreleases",
+            labels = {
+                "azimuth.stackhpc.com/app-template": PRESENT,
+            }
         )
         self._log("Found %s apps", len(apps))
         return tuple(self._from_helm_release(app) for app in apps)
 
     @convert_exceptions
+    @coalesce_reads
     def find_app(self, id: str) -> dto.Cluster:
         """
         Finds an app by id.
         """
         self._log("Fetching app with id '%s'", id)
         # We only want to include apps with the app-template label
-        app = (
-            self._client
-                .api(CAPI_ADDONS_API_VERSION)
-                .resource("helmreleases")
-                .fetch(id)
-        )
+        app = self._fetch_object(CAPI_ADDONS_API_VERSION, "helmreleases", id)
         if "azimuth.stackhpc.com/app-template" not in app.metadata.labels:
             raise errors.ObjectNotFoundError(f"Kubernetes app \"{id}\" not found")
         return self._from_helm_release(app)
@@ -847,7 +952,7 @@ class Session:
                 ],
             },
         })
-        return self._from_helm_release(app)
+        return self._from_helm_release(self._record_object("helmreleases", app))
 
     @convert_exceptions
     def update_app(
@@ -863,7 +968,7 @@ class Session:
         # First, fetch the app to verify that it is actually an app, not a cluster addon
         if not isinstance(app, dto.App):
             app = self.find_app(app)
-        return self._from_helm_release(
+        app = (
             self._client
                 .api(CAPI_ADDONS_API_VERSION)
                 .resource("helmreleases")
@@ -896,6 +1001,7 @@ class Session:
                     },
                 )
         )
+        return self._from_helm_release(self._record_object("helmreleases", app))
 
     @convert_exceptions
     def delete_app(self, app: t.Union[dto.App, str]) -> t.Optional[dto.App]:
@@ -906,19 +1012,28 @@ class Session:
         if not isinstance(app, dto.App):
             app = self.find_app(app)
         self._client.api(CAPI_ADDONS_API_VERSION).resource("helmreleases").delete(app.id)
+        # Make sure that the deletion is visible to the read
+        self._refresh_object(CAPI_ADDONS_API_VERSION, "helmreleases", app.id)
         return self.find_app(app.id)
 
     def close(self):
         """
         Closes the session and performs any cleanup.
         """
-        self._client.close()
+        if self._client_pool:
+            client, self._client = self._client, None
+            if client is not None:
+                self._client_pool.release(client)
+        else:
+            self._client.close()
 
     def __enter__(self):
         """
         Called when entering a context manager block.
         """
-        self._client.__enter__()
+        # Pooled clients are already open and are reused after the block
+        if not self._client_pool:
+            self._client.__enter__()
         # Work out what namespace to target for the tenancy
         namespace = utils.get_namespace(self._client, self._cloud_session.tenancy())
         # Set the target namespace as the default namespace for the client
@@ -929,7 +1044,10 @@ class Session:
         """
         Called when exiting a context manager block. Ensures that close is called.
         """
-        self._client.__exit__(exc_type, exc_value, traceback)
+        if self._client_pool:
+            self.close()
+        else:
+            self._client.__exit__(exc_type, exc_value, traceback)
 
     def __del__(self):
         """
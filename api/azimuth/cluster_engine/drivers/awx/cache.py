@@ -0,0 +1,348 @@
+"""
+Process-level caches used by the AWX cluster engine driver.
+"""
+
+import dataclasses
+import hashlib
+import logging
+import re
+import threading
+import time
+import typing as t
+
+import requests
+import yaml
+
+from .... import concurrency, metrics
+from ... import dto, errors
+from . import api
+
+
+logger = logging.getLogger(__name__)
+
+
+class _MetadataEntry:
+    """
+    The cluster type metadata for a single version of a job template.
+    """
+    def __init__(self, key, spec, digest, etag = None, last_modified = None):
+        self.key = key
+        self.spec = spec
+        self.digest = digest
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fetched_at = time.monotonic()
+        self.cluster_type = None
+
+    @property
+    def url(self):
+        return self.key[2]
+
+    def get_cluster_type(self, name):
+        # Building the DTO is cheap compared to parsing, but it is still shared by all the
+        # requests that see this version of the metadata
+        if self.cluster_type is None or self.cluster_type.name != name:
+            self.cluster_type = dto.ClusterType.from_dict(name, self.spec)
+        return self.cluster_type
+
+
+class ClusterTypeMetadataCache:
+    """
+    Cache of the cluster type metadata referenced by the descriptions of job templates.
+
+    Entries are keyed by the job template id, its ``modified`` timestamp and the metadata
+    URL, so a job template that is changed in AWX is always loaded again. Metadata that
+    is loaded from a URL is revalidated using ETag/If-Modified-Since once it is older than
+    ``ttl`` seconds. The stale entry continues to be used while it is revalidated in the
+    background, and YAML is only parsed when the content has changed.
+
+    Args:
+        ttl: The number of seconds after which metadata from a URL is revalidated.
+        timeout: The number of seconds to wait when fetching metadata from a URL.
+    """
+    def __init__(self, ttl = 300, timeout = dto.FETCH_TIMEOUT):
+        self.ttl = ttl
+        self.timeout = timeout
+        self._session = requests.Session()
+        self._lock = threading.Lock()
+        # Map of job template id -> entry for the most recent version of the job template
+        self._entries = {}
+        # The ids of the job templates that are being revalidated
+        self._refreshing = set()
+
+    def _load(self, key, previous = None):
+        """
+        Loads the metadata for the given key, using the previous entry to make a
+        conditional request if it is for the same URL.
+        """
+        url = key[2]
+        if not re.match(r"https?://", url):
+            with open(url) as fh:
+                content = fh.read().encode()
+            return _MetadataEntry(key, yaml.safe_load(content), hashlib.sha256(content).digest())
+        if previous is not None and previous.url != url:
+            previous = None
+        headers = {}
+        if previous is not None:
+            if previous.etag:
+                headers["If-None-Match"] = previous.etag
+            if previous.last_modified:
+                headers["If-Modified-Since"] = previous.last_modified
+        try:
+            response = self._session.get(url, headers = headers, timeout = self.timeout)
+            response.raise_for_status()
+        except requests.RequestException as exc:
+            raise errors.CommunicationError(
+                "Could not fetch cluster type metadata from '{}'.".format(url)
+            ) from exc
+        if response.status_code == 304 and previous is not None:
+            metrics.increment("cache.awx_cluster_types.not_modified")
+            spec, digest = previous.spec, previous.digest
+        else:
+            digest = hashlib.sha256(response.content).digest()
+            if previous is not None and previous.digest == digest:
+                spec = previous.spec
+            else:
+                spec = yaml.safe_load(response.content)
+        return _MetadataEntry(
+            key,
+            spec,
+            digest,
+            response.headers.get("ETag"),
+            response.headers.get("Last-Modified")
+        )
+
+    def _replace(self, job_template_id, entry):
+        """
+        Replaces the entry for the job template with a revalidated entry, unless a newer
+        version of the job template has been loaded in the meantime.
+        """
+        with self._lock:
+            current = self._entries.get(job_template_id)
+            if current is not None and current.key == entry.key:
+                self._entries[job_template_id] = entry
+
+    def _refresh_in_background(self, job_template_id, entry):
+        with self._lock:
+            if job_template_id in self._refreshing:
+                return
+            self._refreshing.add(job_template_id)
+
+        def refresh():
+            try:
+                self._replace(job_template_id, self._load(entry.key, entry))
+            except Exception:
+                logger.warning(
+                    "Error revalidating cluster type metadata from %s",
+                    entry.url,
+                    exc_info = True
+                )
+                # Keep using the stale entry, but wait for the TTL before trying again
+                entry.fetched_at = time.monotonic()
+            finally:
+                with self._lock:
+                    self._refreshing.discard(job_template_id)
+
+        concurrency.get_executor().submit(refresh)
+
+    def get(self, job_template) -> dto.ClusterType:
+        """
+        Returns the cluster type for the given job template.
+        """
+        key = (job_template.id, job_template.modified, job_template.description)
+        with self._lock:
+            entry = self._entries.get(job_template.id)
+        if entry is not None and entry.key == key:
+            metrics.increment("cache.awx_cluster_types.hit")
+            is_url = re.match(r"https?://", entry.url)
+            if is_url and time.monotonic() - entry.fetched_at >= self.ttl:
+                self._refresh_in_background(job_template.id, entry)
+        else:
+            metrics.increment("cache.awx_cluster_types.miss")
+            entry = self._load(key, entry)
+            with self._lock:
+                self._entries[job_template.id] = entry
+        return entry.get_cluster_type(job_template.name)
+
+
+@dataclasses.dataclass(frozen = True)
+class InventoryStatus:
+    """
+    The status of the cluster for an inventory, as derived from its job history.
+    """
+    #: The id of the latest job for the inventory, or None if there are no jobs
+    latest_id: t.Optional[int]
+    #: The modified timestamp of the latest job when the status was derived
+    latest_modified: t.Optional[str]
+    #: The status of the cluster
+    status: dto.ClusterStatus
+    #: The task that the latest job was running, if it was running
+    task: t.Optional[str]
+    #: The error message from the latest job, if it failed
+    error_message: t.Optional[str]
+    #: The outputs from the last successful job
+    outputs: t.Mapping[str, t.Any]
+    #: The finished timestamp of the last successful job
+    updated: t.Optional[str]
+    #: The finished timestamp of the last successful patch job
+    patched: t.Optional[str]
+    #: The key for the variables, which are reused while the key is unchanged
+    variables_key: t.Any = None
+    #: The variables for the inventory
+    variables: t.Optional[t.Mapping[str, t.Any]] = None
+    #: Indicates if the latest job deleted the cluster, in which case the inventory is
+    #: ignored and none of the other fields are meaningful
+    deleted: bool = False
+
+    def is_current(self, latest: t.Optional[api.Job]) -> bool:
+        """
+        Returns true if the status was derived with the given job as the latest job.
+        """
+        if latest is None:
+            return self.latest_id is None
+        return self.is_for(latest)
+
+    def is_for(self, job: api.Job) -> bool:
+        """
+        Returns true if the status was derived with the given version of the job as the
+        latest job.
+        """
+        return self.latest_id == job.id and self.latest_modified == job.modified
+
+
+class InventoryStatusCache:
+    """
+    Cache of the most recent status for each inventory, so that the job history of an
+    inventory is only walked again when a new job is launched or the latest job changes.
+
+    Args:
+        maxsize: The maximum number of inventories to keep statuses for.
+    """
+    def __init__(self, maxsize = 4096):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._statuses = {}
+
+    def get(self, inventory_id) -> t.Optional[InventoryStatus]:
+        with self._lock:
+            return self._statuses.get(inventory_id)
+
+    def put(self, inventory_id, status: InventoryStatus):
+        with self._lock:
+            # Entries for deleted inventories are never used again, so rather than
+            # tracking usage just start again when the cache is full
+            if inventory_id not in self._statuses and len(self._statuses) >= self.maxsize:
+                self._statuses.clear()
+            self._statuses[inventory_id] = status
+
+    def discard(self, inventory_id):
+        with self._lock:
+            self._statuses.pop(inventory_id, None)
+
+
+class _TeamEntry:
+    """
+    The team for a tenancy and, once fetched, the roles held by the team.
+    """
+    def __init__(self, team, expires_at):
+        self.team = team
+        self.roles = None
+        self.expires_at = expires_at
+
+
+class TeamCache:
+    """
+    Short-lived cache of the AWX team for each tenancy and the roles held by the team,
+    so that the team and its permissions on job templates are fetched at most once in each
+    ``ttl`` seconds rather than several times for each request.
+
+    The driver updates or invalidates the entry for a tenancy whenever it creates the team
+    or grants it the execute role, so the TTL only bounds how long it takes to see changes
+    made by other processes or in AWX directly. Tenancies without a team are not cached,
+    so that a team created elsewhere is picked up straight away. The roles are not used for the permissions
+    on inventories, which are granted whenever a cluster is created and so must be seen
+    by every process straight away.
+
+    Args:
+        ttl: The number of seconds for which the team and roles are cached.
+        maxsize: The maximum number of tenancies to keep teams for.
+    """
+    def __init__(self, ttl = 15, maxsize = 1024):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        # Map of tenancy name -> entry
+        self._entries = {}
+
+    def _key(self, ctx: dto.Context):
+        # Teams are found using a case-insensitive match on the tenancy name
+        return ctx.tenancy.name.lower()
+
+    def _current(self, key):
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at > time.monotonic():
+            return entry
+        else:
+            return None
+
+    def set_team(self, ctx: dto.Context, team: api.Team):
+        """
+        Records the team for the tenancy, discarding any roles for the previous team.
+        """
+        key = self._key(ctx)
+        with self._lock:
+            if key not in self._entries and len(self._entries) >= self.maxsize:
+                self._entries.clear()
+            self._entries[key] = _TeamEntry(team, time.monotonic() + self.ttl)
+
+    def get_team(self, ctx: dto.Context, fetch, refresh = False) -> t.Optional[api.Team]:
+        """
+        Returns the team for the tenancy, calling ``fetch`` to fetch the team if there is
+        no current entry or a refresh is requested.
+        """
+        if not refresh:
+            with self._lock:
+                entry = self._current(self._key(ctx))
+            if entry is not None:
+                metrics.increment("cache.awx_teams.hit")
+                return entry.team
+        metrics.increment("cache.awx_teams.miss")
+        team = fetch()
+        if team is not None:
+            self.set_team(ctx, team)
+        else:
+            with self._lock:
+                self._entries.pop(self._key(ctx), None)
+        return team
+
+    def get_roles(self, ctx: dto.Context, team: api.Team, fetch) -> t.Sequence[api.Role]:
+        """
+        Returns the roles held by the given team, calling ``fetch`` to fetch the roles if
+        they are not cached.
+        """
+        key = self._key(ctx)
+        with self._lock:
+            entry = self._current(key)
+            if entry is not None and (entry.team is None or entry.team.id != team.id):
+                entry = None
+            roles = entry.roles if entry is not None else None
+        if roles is not None:
+            metrics.increment("cache.awx_team_roles.hit")
+            return roles
+        metrics.increment("cache.awx_team_roles.miss")
+        roles = tuple(fetch())
+        if entry is not None:
+            with self._lock:
+                # Only store the roles if the entry has not been replaced in the meantime
+                if self._entries.get(key) is entry:
+                    entry.roles = roles
+        return roles
+
+    def invalidate_roles(self, ctx: dto.Context):
+        """
+        Discards the roles for the tenancy, e.g. because a role was granted to the team.
+        """
+        with self._lock:
+            entry = self._entries.get(self._key(ctx))
+            if entry is not None:
+                entry.roles = None
@@ -2,6 +2,7 @@
 This module contains the cluster engine implementation for AWX.
 """
 
+import dataclasses
 import functools
 import logging
 import json
@@ -14,9 +15,10 @@ import dateutil.parser
 
 import rackit
 
+from .... import concurrency, metrics
 from ... import dto, errors
 from .. import base
-from . import api
+from . import api, cache
 
 
 logger = logging.getLogger(__name__)
@@ -26,6 +28,9 @@ logger = logging.getLogger(__name__)
 #: Currently, only OpenStack tokens are supported
 CREDENTIAL_TYPE_NAMES = dict(openstack_token = "OpenStack Token")
 
+#: The page size to use when fetching the jobs for several inventories at once
+JOBS_PAGE_SIZE = 200
+
 
 def convert_exceptions(f):
     """
@@ -90,12 +95,23 @@ class Driver(base.Driver):
         create_teams: bool = False,
         create_team_allow_all_permission: bool = False,
         verify_ssl: bool = True,
-        template_inventory: str = "openstack"
+        template_inventory: str = "openstack",
+        inventory_delete_timeout: float = 5,
+        cluster_type_cache_ttl: float = 300,
+        cluster_type_fetch_timeout: float = 10,
+        team_cache_ttl: float = 15
     ):
         self._connection = api.Connection(url.rstrip("/"), username, password, verify_ssl)
         self._create_teams = create_teams
         self._create_team_allow_all_permission = create_team_allow_all_permission
         self._template_inventory = template_inventory
+        self._inventory_delete_timeout = inventory_delete_timeout
+        self._cluster_types = cache.ClusterTypeMetadataCache(
+            cluster_type_cache_ttl,
+            cluster_type_fetch_timeout
+        )
+        self._inventory_statuses = cache.InventoryStatusCache()
+        self._teams = cache.TeamCache(team_cache_ttl)
 
     def _log(
         self,
@@ -125,15 +141,44 @@ class Driver(base.Driver):
             self._log("Using AWX organisation '%s'", organisation.name)
         return organisation
 
+    def _get_object_role(self, resource: api.Resource, resource_type: str, name: str):
+        """
+        Returns the id of the named role for the given AWX object.
+        """
+        # AWX includes the roles for an object in its summary fields
+        object_roles = getattr(resource, "summary_fields", {}).get("object_roles", {})
+        role = object_roles.get(f"{name}_role")
+        if role:
+            return role["id"]
+        # Otherwise, only fetch the roles for objects with the same id rather than every
+        # role in AWX
+        try:
+            return next(
+                role.id
+                for role in self._connection.roles.all(object_id = resource.id)
+                if (
+                    role.name.lower() == name and
+                    role.summary_fields.get("resource_type") == resource_type and
+                    role.summary_fields.get("resource_id") == resource.id
+                )
+            )
+        except StopIteration:
+            raise errors.ImproperlyConfiguredError(
+                f"Could not find {name} role for {resource_type} {resource.id}."
+            )
+
     def _get_team(self, ctx: dto.Context):
         """
         Returns the AWX team associated with the given context, or None if the team
         has not been created yet.
+
+        The team is cached for a short time once it exists.
         """
-        team = None
-        try:
-            team = next(self._connection.teams.all(name__iexact = ctx.tenancy.name))
-        except StopIteration:
+        team = self._teams.get_team(
+            ctx,
+            lambda: next(self._connection.teams.all(name__iexact = ctx.tenancy.name), None)
+        )
+        if not team:
             # If we are creating teams on-demand, just return None
             # If we are not, then not finding a team for the context is a permissions error
             if self._create_teams:
@@ -141,10 +186,21 @@ class Driver(base.Driver):
             else:
                 self._log("Could not find AWX team", level = logging.WARN, ctx = ctx)
                 raise errors.PermissionDeniedError("Clusters are not enabled for this tenancy")
-        else:
-            self._log("Found AWX team", ctx = ctx)
         return team
 
+    def _get_team_roles(self, team: api.Team, ctx: dto.Context, cached: bool = True):
+        """
+        Returns the roles held by the given team, which are cached with the team unless
+        ``cached`` is false.
+        """
+        def fetch():
+            self._log("Fetching roles for team", ctx = ctx)
+            return team.roles.all()
+        if cached:
+            return self._teams.get_roles(ctx, team, fetch)
+        else:
+            return tuple(fetch())
+
     def _get_or_create_team(self, ctx: dto.Context):
         """
         Return a team for the given context, creating it if enabled.
@@ -157,20 +213,15 @@ class Driver(base.Driver):
                 name = ctx.tenancy.name,
                 organization = self._organisation.id
             )
+            self._teams.set_team(ctx, team)
             # Create the allow all permission if required
             # This is represented in AWX as holding the execute role for the entire organisation
             if self._create_team_allow_all_permission:
                 self._log("Granting allow-all permission to team", ctx = ctx)
-                execute_role = next(
-                    role
-                    for role in self._connection.roles.all()
-                    if (
-                        role.name.lower() == "execute" and
-                        role.summary_fields.get("resource_type") == "organization" and
-                        role.summary_fields.get("resource_id") == self._organisation.id
-                    )
+                team.associate_role(
+                    self._get_object_role(self._organisation, "organization", "execute")
                 )
-                team.associate_role(execute_role)
+                self._teams.invalidate_roles(ctx)
         return team
 
     def _get_permitted_job_templates(self, ctx: dto.Context):
@@ -183,8 +234,7 @@ class Driver(base.Driver):
             self._log("Using allow-all permission directly", ctx = ctx)
             return (self._create_team_allow_all_permission, set())
         # If we have a real team, start by fetching the roles
-        self._log("Fetching roles for team", ctx = ctx)
-        roles = list(team.roles.all())
+        roles = self._get_team_roles(team, ctx)
         # If the team has the execute permission for the organisation, it is permitted to
         # access all the templates
         allow_all = any(
@@ -218,8 +268,13 @@ class Driver(base.Driver):
             raise errors.ImproperlyConfiguredError(
                 "No metadata specified for cluster type '{}'".format(job_template.name)
             )
-        self._log("Loading metadata from %s", job_template.description, ctx = ctx)
-        return dto.ClusterType.from_yaml(job_template.name, job_template.description)
+        self._log(
+            "Loading metadata from %s",
+            job_template.description,
+            level = logging.DEBUG,
+            ctx = ctx
+        )
+        return self._cluster_types.get(job_template)
 
     @convert_exceptions
     def cluster_types(self, ctx: dto.Context) -> t.Iterable[dto.ClusterType]:
@@ -262,8 +317,9 @@ class Driver(base.Driver):
         """
         Returns the ids of the inventories that the given team has access to.
         """
-        self._log("Fetching roles for team", ctx = ctx)
-        roles = list(team.roles.all())
+        # The roles are always fetched fresh here, as inventories are granted to the team
+        # by whichever process creates the cluster and must be visible everywhere at once
+        roles = self._get_team_roles(team, ctx, cached = False)
         # The team will have the admin permission on their own inventories
         permitted = {
             role.summary_fields["resource_id"]
@@ -276,20 +332,131 @@ class Driver(base.Driver):
         self._log("Found %s permitted inventories", len(permitted), ctx = ctx)
         return permitted
 
-    def _from_inventory(self, inventory: api.Inventory, ctx: dto.Context):
+    def _jobs_by_inventory(self, inventories: t.Iterable[api.Inventory], ctx: dto.Context):
         """
-        Returns a cluster from the given inventory.
+        Returns a dictionary mapping the id of each of the given inventories to the jobs
+        that :py:meth:`_from_inventory` needs for it, most recent first.
+
+        The jobs for all the inventories are fetched using a single filtered query,
+        which is only read as far as required to find the latest job, the last successful
+        job and the last successful patch job for every inventory, or the latest job from
+        the recorded status for the inventory. Only the latest job is needed for the
+        inventory of a deleted cluster, and the query is not read beyond the creation of
+        an inventory, so inventories with no jobs do not cause the whole history to be read.
+        """
+        created = {
+            inventory.id: dateutil.parser.parse(inventory.created)
+            for inventory in inventories
+        }
+        self._log("Fetching jobs for %s inventories", len(created), ctx = ctx)
+        jobs = self._connection.jobs.all(
+            inventory__in = ",".join(str(id) for id in sorted(created)),
+            order_by = "-started",
+            page_size = JOBS_PAGE_SIZE
+        )
+        selected = { id: [] for id in created }
+        # The inventories for which we have not yet seen a successful job or a successful
+        # patch job respectively
+        not_updated = set(created)
+        not_patched = set(created)
+        for job in jobs:
+            # Jobs are in descending order of start time, and an inventory cannot have
+            # jobs that started before it was created
+            if job.started:
+                started = dateutil.parser.parse(job.started)
+                exhausted = {
+                    id
+                    for id in not_updated | not_patched
+                    if created[id] > started
+                }
+                not_updated.difference_update(exhausted)
+                not_patched.difference_update(exhausted)
+            if not (not_updated or not_patched):
+                break
+            inventory_jobs = selected.get(job.inventory)
+            if inventory_jobs is None:
+                continue
+            pending = job.inventory in not_updated or job.inventory in not_patched
+            # Older jobs are not needed once we reach the latest job from the recorded
+            # status, as the history from that job onwards is already known
+            previous = self._inventory_statuses.get(job.inventory)
+            if previous and previous.is_for(job):
+                if pending or not inventory_jobs:
+                    inventory_jobs.append(job)
+                not_updated.discard(job.inventory)
+                not_patched.discard(job.inventory)
+                continue
+            # The latest job is always required
+            required = not inventory_jobs
+            # If the latest job deleted the cluster, no other jobs are required
+            if required and self._is_deleted(job):
+                inventory_jobs.append(job)
+                not_updated.discard(job.inventory)
+                not_patched.discard(job.inventory)
+                continue
+            if job.status == "successful":
+                if job.inventory in not_updated:
+                    not_updated.discard(job.inventory)
+                    required = True
+                if (
+                    job.inventory in not_patched and
+                    json.loads(job.extra_vars).get("cluster_upgrade_system_packages", False)
+                ):
+                    not_patched.discard(job.inventory)
+                    required = True
+            if required:
+                inventory_jobs.append(job)
+        return selected
+
+    def _is_deleted(self, job: api.Job):
+        """
+        Returns true if the given job successfully deleted the cluster.
+        """
+        cluster_state = json.loads(job.extra_vars).get("cluster_state", "present")
+        return job.status == "successful" and cluster_state != "present"
+
+    def _current_task(self, job: api.Job):
+        """
+        Returns the name of the task that the given job is currently executing.
+        """
+        # Use a combination of the task and the role that it comes from (if present)
+        # However we remove any galaxy namespaces from the role if present
+        return next(
+            (
+                "{} : {}".format(event.role.split(".")[-1], event.task)
+                    if event.role
+                    else event.task
+                for event in job.job_events.all(
+                    event = "playbook_on_task_start",
+                    order_by = "-created",
+                    page_size = 1
+                )
+            ),
+            # If there is no task, indicate that we are waiting to be scheduled
+            "Waiting to be scheduled"
+        )
+
+    def _inventory_status(
+        self,
+        inventory: api.Inventory,
+        latest: t.Optional[api.Job],
+        jobs: t.Iterator[api.Job],
+        previous: t.Optional[cache.InventoryStatus],
+        ctx: dto.Context
+    ) -> cache.InventoryStatus:
+        """
+        Derives the status for the inventory from the latest job and the jobs before it.
+
+        Once the walk through the history reaches the latest job from the previous
+        status, the outputs and timestamps from the previous status are used.
+
+        If the latest job deleted the cluster, a status marked as deleted is returned so
+        that the outcome can be cached like any other status.
         """
-        # Get the jobs for the inventory
-        self._log("Fetching jobs for inventory '%s'", inventory.name, ctx = ctx)
-        jobs = self._connection.jobs.all(inventory = inventory.id, order_by = "-started")
         # The status of the cluster is based on the status of the latest job
-        latest = None
         task = None
         error_message = None
-        try:
-            latest = next(jobs)
-        except StopIteration:
+        if not latest:
             # There should be at least one job...
             status = dto.ClusterStatus.ERROR
         else:
@@ -300,13 +467,16 @@ class Driver(base.Driver):
                 if cluster_state == "present":
                     status = dto.ClusterStatus.READY
                 else:
-                    self._log(
-                        "Inventory '%s' represents deleted cluster - ignoring",
-                        inventory.name,
-                        ctx = ctx
-                    )
-                    raise errors.ObjectNotFoundError(
-                        "Could not find cluster with ID {}".format(inventory.id)
+                    return cache.InventoryStatus(
+                        latest.id,
+                        latest.modified,
+                        dto.ClusterStatus.DELETING,
+                        None,
+                        None,
+                        {},
+                        None,
+                        None,
+                        deleted = True
                     )
             elif latest.status == "canceled":
                 status = dto.ClusterStatus.ERROR
@@ -315,7 +485,11 @@ class Driver(base.Driver):
                 status = dto.ClusterStatus.ERROR
                 # Try to retrieve an error from the failed task
                 event = next(
-                    latest.job_events.all(event = "runner_on_failed", order_by = "-created"),
+                    latest.job_events.all(
+                        event = "runner_on_failed",
+                        order_by = "-created",
+                        page_size = 1
+                    ),
                     None
                 )
                 host = getattr(event, "event_data", {}).get("host")
@@ -334,22 +508,7 @@ class Driver(base.Driver):
                     status = dto.ClusterStatus.CONFIGURING
                 else:
                     status = dto.ClusterStatus.DELETING
-                # Find the name of the currently executing task
-                # Use a combination of the task and the role that it comes from (if present)
-                # However we remove any galaxy namespaces from the role if present
-                task = next(
-                    (
-                        "{} : {}".format(event.role.split(".")[-1], event.task)
-                            if event.role
-                            else event.task
-                        for event in latest.job_events.all(
-                            event = "playbook_on_task_start",
-                            order_by = "-created"
-                        )
-                    ),
-                    # If there is no task, indicate that we are waiting to be scheduled
-                    "Waiting to be scheduled"
-                )
+                task = self._current_task(latest)
         # The outputs and updated time come from the last successful job
         # The patched time comes from the last successful job with cluster_upgrade_system_packages = True
         job = latest
@@ -358,14 +517,25 @@ class Driver(base.Driver):
         patched = None
         # If we haven't found the update or patch time, traverse the rest of the jobs until we find them
         while job:
+            if previous and previous.is_for(job):
+                # The history from this job onwards is unchanged since the previous status
+                if not updated:
+                    updated = previous.updated
+                    outputs = previous.outputs
+                patched = patched or previous.patched
+                break
             if job.status == "successful":
                 # Outputs and updated are set together, based on the same job
                 if not updated:
                     updated = updated or job.finished
                     # If the last task is a debug action for the "outputs" variable, then that
-                    # value is used as the outputs
+                    # value is used as the outputs
                     event = next(
-                        job.job_events.all(event = "runner_on_ok", order_by = "-created"),
+                        job.job_events.all(
+                            event = "runner_on_ok",
+                            order_by = "-created",
+                            page_size = 1
+                        ),
                         None
                     )
                     event_data = getattr(event, "event_data", {})
@@ -377,9 +547,75 @@ class Driver(base.Driver):
                 break
             else:
                 job = next(jobs, None)
-        # Get the inventory variables
-        params = inventory.variable_data._as_dict()
+        return cache.InventoryStatus(
+            latest.id if latest else None,
+            latest.modified if latest else None,
+            status,
+            task,
+            error_message,
+            outputs,
+            updated,
+            patched
+        )
+
+    def _from_inventory(
+        self,
+        inventory: api.Inventory,
+        ctx: dto.Context,
+        jobs: t.Optional[t.Iterable[api.Job]] = None
+    ):
+        """
+        Returns a cluster from the given inventory.
+
+        If given, ``jobs`` should contain the jobs for the inventory, most recent first.
+        """
+        # Get the jobs for the inventory
+        if jobs is None:
+            self._log("Fetching jobs for inventory '%s'", inventory.name, ctx = ctx)
+            jobs = self._connection.jobs.all(inventory = inventory.id, order_by = "-started")
+        jobs = iter(jobs)
+        latest = next(jobs, None)
+        # Only derive the status again if the latest job has changed
+        previous = self._inventory_statuses.get(inventory.id)
+        if previous and previous.is_current(latest):
+            metrics.increment("cache.awx_inventory_status.hit")
+            inventory_status = previous
+            # The modified time of a job does not change as it moves between tasks
+            if inventory_status.task:
+                inventory_status = dataclasses.replace(
+                    inventory_status,
+                    task = self._current_task(latest)
+                )
+        else:
+            metrics.increment("cache.awx_inventory_status.miss")
+            inventory_status = self._inventory_status(inventory, latest, jobs, previous, ctx)
+        if inventory_status.deleted:
+            if inventory_status is not previous:
+                self._inventory_statuses.put(inventory.id, inventory_status)
+            self._log(
+                "Inventory '%s' represents deleted cluster - ignoring",
+                inventory.name,
+                ctx = ctx
+            )
+            raise errors.ObjectNotFoundError(
+                "Could not find cluster with ID {}".format(inventory.id)
+            )
+        # The variables are changed by launching a job, but may also be changed in AWX
+        variables_key = (
+            inventory.modified,
+            inventory_status.latest_id,
+            inventory_status.latest_modified
+        )
+        if inventory_status.variables_key != variables_key:
+            inventory_status = dataclasses.replace(
+                inventory_status,
+                variables_key = variables_key,
+                variables = inventory.variable_data._as_dict()
+            )
+        if inventory_status is not previous:
+            self._inventory_statuses.put(inventory.id, inventory_status)
         # Extract the parameters that aren't really parameters
+        params = dict(inventory_status.variables)
         name = params.pop("cluster_name")
         cluster_type = params.pop("cluster_type")
         return dto.Cluster(
@@ -387,15 +623,23 @@ class Driver(base.Driver):
             name,
             cluster_type,
             "",  # no version to report here
-            status,
-            task,
-            error_message,
+            inventory_status.status,
+            inventory_status.task,
+            inventory_status.error_message,
             params,
             (),
-            outputs,
+            inventory_status.outputs,
             dateutil.parser.parse(inventory.created),
-            dateutil.parser.parse(updated) if updated else None,
-            dateutil.parser.parse(patched) if patched else None
+            (
+                dateutil.parser.parse(inventory_status.updated)
+                if inventory_status.updated
+                else None
+            ),
+            (
+                dateutil.parser.parse(inventory_status.patched)
+                if inventory_status.patched
+                else None
+            )
         )
 
     @convert_exceptions
@@ -407,18 +651,28 @@ class Driver(base.Driver):
         if not team:
             return ()
         permitted = self._get_permitted_inventories(team, ctx)
+        if not permitted:
+            return ()
         self._log("Fetching inventories", ctx = ctx)
-        inventories = self._connection.inventories.all()
-        def active_inventories(inventories):
-            for inventory in inventories:
-                if inventory.id in permitted:
-                    try:
-                        yield self._from_inventory(inventory, ctx)
-                    except errors.ObjectNotFoundError:
-                        pass
-        inventories = tuple(active_inventories(inventories))
-        self._log("Found %s inventories", len(inventories), ctx = ctx)
-        return inventories
+        inventories = list(
+            self._connection.inventories.all(
+                id__in = ",".join(str(id) for id in sorted(permitted))
+            )
+        )
+        jobs = self._jobs_by_inventory(inventories, ctx)
+        def from_inventory(inventory):
+            try:
+                return self._from_inventory(inventory, ctx, jobs[inventory.id])
+            except errors.ObjectNotFoundError:
+                return None
+        # The events and variables for each inventory are fetched concurrently
+        clusters = tuple(
+            cluster
+            for cluster in concurrency.map_concurrently(from_inventory, inventories)
+            if cluster
+        )
+        self._log("Found %s inventories", len(clusters), ctx = ctx)
+        return clusters
 
     @convert_exceptions
     def find_cluster(self, id: str, ctx: dto.Context) -> dto.Cluster:
@@ -556,19 +810,21 @@ class Driver(base.Driver):
                 )
                 # If the cluster does not exist, delete the inventory
                 inventory._delete()
-                # Inventories don't always delete straight away, so try up to
-                # five times to refetch it until we get a 404
-                remaining = 5
-                while remaining > 0:
+                # Inventories don't always delete straight away, so refetch it until we
+                # get a 404, backing off between attempts until the deadline
+                # AWX has no way to watch for the deletion, so we have to poll
+                deadline = time.monotonic() + self._inventory_delete_timeout
+                delay = 0.1
+                while True:
                     try:
                         inventory = self._connection.inventories.get(inventory.id, force = True)
                     except rackit.NotFound:
                         break
-                    else:
-                        remaining = remaining - 1
-                        time.sleep(1)
-                else:
-                    raise errors.OperationTimedOutError("Timed out while removing inventory.")
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise errors.OperationTimedOutError("Timed out while removing inventory.")
+                    time.sleep(min(delay, remaining))
+                    delay = delay * 2
             else:
                 # If the cluster already exists, we have a conflict
                 raise errors.BadInputError("A cluster called '{}' aleady exists.".format(name))
@@ -577,16 +833,7 @@ class Driver(base.Driver):
         inventory = template_inventory.copy(inventory_name)
         # Once the inventory exists, add the team as an admin
         self._log("Granting admin role for inventory '%s'", inventory.name, ctx = ctx)
-        admin_role = next(
-            role
-            for role in self._connection.roles.all()
-            if (
-                role.name.lower() == "admin" and
-                role.summary_fields.get("resource_type") == "inventory" and
-                role.summary_fields.get("resource_id") == inventory.id
-            )
-        )
-        team.associate_role(admin_role)
+        team.associate_role(self._get_object_role(inventory, "inventory", "admin"))
         # Update the inventory variables
         self._log("Setting inventory variables for '%s'", inventory.name, ctx = ctx)
         inventory.variable_data._update(
@@ -2,33 +2,39 @@
 This module contains the cluster engine implementation for azimuth-caas-crd.
 """
 import collections
+import contextlib
 import datetime
 import dateutil.parser
 import logging
-import time
 import typing as t
 
 import easykube
 
-from azimuth.acls import allowed_by_acls
+from azimuth.acls import allowed_by_acls, filter_allowed
 from azimuth.cluster_engine.drivers import base
 from azimuth.cluster_engine import dto
 from azimuth.cluster_engine import errors
 from azimuth.scheduling import dto as scheduling_dto, k8s as scheduling_k8s
 from azimuth import utils
+from azimuth.cache import LRUCache
+from azimuth.informer import Informer
+from azimuth.kube import get_client_pool, object_version
 
 
 CAAS_API_VERSION = "caas.azimuth.stackhpc.com/v1alpha1"
 LOG = logging.getLogger(__name__)
 
+# Converted cluster DTOs, keyed by the version of the cluster they were converted from
+_cluster_dtos = LRUCache("caas_cluster_dtos")
 
+
+@contextlib.contextmanager
 def get_k8s_client(ctx: dto.Context, ensure_namespace: bool = False):
-    ekconfig = easykube.Configuration.from_environment()
-    client = ekconfig.sync_client()
-    client.default_namespace = utils.get_namespace(client, ctx.tenancy)
-    if ensure_namespace:
-        utils.ensure_namespace(client, client.default_namespace, ctx.tenancy)
-    return client
+    with get_client_pool().client() as client:
+        client.default_namespace = utils.get_namespace(client, ctx.tenancy)
+        if ensure_namespace:
+            utils.ensure_namespace(client, client.default_namespace, ctx.tenancy)
+        yield client
 
 
 def _get_cluster_type_dto(raw):
@@ -43,15 +49,24 @@ def _get_cluster_type_dto(raw):
 def get_cluster_types(client, tenancy) -> t.Iterable[dto.ClusterType]:
     raw_types = list(client.api(CAAS_API_VERSION).resource("clustertypes").list())
     cluster_types = []
-    for raw in raw_types:
-        if allowed_by_acls(raw, tenancy):
-            cluster_type = _get_cluster_type_dto(raw)
-            if cluster_type:
-                cluster_types.append(cluster_type)
+    for raw in filter_allowed(raw_types, tenancy):
+        cluster_type = _get_cluster_type_dto(raw)
+        if cluster_type:
+            cluster_types.append(cluster_type)
     return cluster_types
 
 
 def get_cluster_dto(raw_cluster, status_if_ready: t.Optional[dto.ClusterStatus] = None):
+    key = object_version(raw_cluster)
+    if key:
+        key = (*key, status_if_ready)
+    return _cluster_dtos.get_or_set(
+        key,
+        lambda: _convert_cluster(raw_cluster, status_if_ready)
+    )
+
+
+def _convert_cluster(raw_cluster, status_if_ready: t.Optional[dto.ClusterStatus] = None):
     raw_status = raw_cluster.get("status", {})
     status = dto.ClusterStatus.CONFIGURING
     task = None
@@ -178,7 +193,8 @@ def create_cluster(
         "createdByUserId": ctx.user_id,
     }
     # Tell the cluster which lease it should wait for
-    if scheduling_k8s.leases_available(client):
+    leases_available = scheduling_k8s.leases_available()
+    if leases_available:
         cluster_spec["leaseName"] = f"caas-{safe_name}"
     if params:
         cluster_spec["extraVars"] = {}
@@ -211,13 +227,51 @@ def create_cluster(
         cluster,
         secret_name,
         resources,
-        schedule
+        schedule,
+        use_leases=leases_available
     )
 
     return get_cluster_dto(cluster)
 
 
-def delete_cluster(client, name: str):
+def _wait_for_operator(
+    client,
+    name: str,
+    acknowledged: t.Callable[[t.Optional[t.Dict[str, t.Any]]], bool],
+    informer: t.Optional[Informer] = None,
+    timeout: float = 0
+):
+    """
+    Waits for up to ``timeout`` seconds for the operator to acknowledge a change to the
+    named cluster, as determined by ``acknowledged``, which is called with the most recent
+    version of the cluster or ``None`` if it no longer exists.
+
+    Returns the most recent version of the cluster, or ``None`` if it no longer exists.
+    """
+    if informer and timeout > 0 and informer.wait_for_sync():
+        _, raw_cluster = informer.wait_for(
+            name,
+            client.default_namespace,
+            acknowledged,
+            timeout
+        )
+        return raw_cluster
+    # Without a watch, just return the current state of the cluster
+    try:
+        return client.api(CAAS_API_VERSION).resource("clusters").fetch(name)
+    except easykube.ApiError as exc:
+        if exc.status_code == 404:
+            return None
+        else:
+            raise
+
+
+def delete_cluster(
+    client,
+    name: str,
+    informer: t.Optional[Informer] = None,
+    timeout: float = 0
+):
     safe_name = utils.sanitise(name)
 
     # TODO(johngarbutt) should we be refreshing the application cred here?
@@ -226,13 +280,29 @@ def delete_cluster(client, name: str):
 
     # NOTE(johngarbutt) we are racing the operator here,
     # returning the ready state will confuse people
-    time.sleep(0.1)
+    # So wait for the operator to report that the cluster is deleting, or for it to go
+    raw_cluster = _wait_for_operator(
+        client,
+        safe_name,
+        lambda raw: raw is None or raw.get("status", {}).get("phase") == "Deleting",
+        informer,
+        timeout
+    )
     # NOTE(sd109) Avoid checking allowed_by_acls here so that deletion is never blocked
-    raw_cluster = cluster_resource.fetch(safe_name)
-    return get_cluster_dto(raw_cluster, status_if_ready=dto.ClusterStatus.DELETING)
+    if raw_cluster:
+        return get_cluster_dto(raw_cluster, status_if_ready=dto.ClusterStatus.DELETING)
+    else:
+        return None
 
 
-def patch_cluster(client, name: str, params: t.Mapping[str, t.Any], ctx: dto.Context):
+def patch_cluster(
+    client,
+    name: str,
+    params: t.Mapping[str, t.Any],
+    ctx: dto.Context,
+    informer: t.Optional[Informer] = None,
+    timeout: float = 0
+):
     safe_name = utils.sanitise(name)
 
     # get current version for requested cluster type
@@ -246,11 +316,12 @@ def patch_cluster(client, name: str, params: t.Mapping[str, t.Any], ctx: dto.Con
 
     # Trigger an update, even if no change in version requested
     # TODO(johngarbutt): cluster_upgrade_system_packages=true needed?
-    return update_cluster(client, name, params, cluster_type.version, ctx)
+    return update_cluster(client, name, params, cluster_type.version, ctx, informer, timeout)
 
 
 def update_cluster(client, name: str, params: t.Mapping[str, t.Any],
-                   version: str, ctx: dto.Context):
+                   version: str, ctx: dto.Context,
+                   informer: t.Optional[Informer] = None, timeout: float = 0):
     safe_name = utils.sanitise(name)
 
     # trigger updates even when params are same as create or last update
@@ -269,12 +340,28 @@ def update_cluster(client, name: str, params: t.Mapping[str, t.Any],
 
     # TODO(johngarbutt) should we be refreshing the application creds first?
     cluster_resource = client.api(CAAS_API_VERSION).resource("clusters")
-    cluster_resource.patch(safe_name, dict(spec=spec))
+    patched = cluster_resource.patch(safe_name, dict(spec=spec))
+    if informer:
+        informer.record(patched)
 
     # NOTE(johngarbutt) we are racing the operator here,
     # returning the ready state will confuse people
-    time.sleep(0.1)
-    raw_cluster = cluster_resource.fetch(safe_name)
+    # So wait for the operator to update the status or observe the new generation
+    generation = patched["metadata"].get("generation")
+    status = patched.get("status", {})
+
+    def acknowledged(raw):
+        if raw is None:
+            return True
+        raw_status = raw.get("status", {})
+        return raw_status != status or (
+            generation is not None and
+            raw_status.get("observedGeneration", 0) >= generation
+        )
+
+    raw_cluster = _wait_for_operator(client, safe_name, acknowledged, informer, timeout)
+    if not raw_cluster:
+        raise errors.ObjectNotFoundError(f"Cannot find cluster {name}")
     if not allowed_by_acls(raw_cluster, ctx.tenancy):
         raise errors.ObjectNotFoundError(f"Cannot update cluster {name} - cluster type not found")
 
@@ -288,36 +375,73 @@ class Driver(base.Driver):
     Cluster types correspond to available job templates, and clusters correspond
     to inventories. A cluster is configured by launching a job using the job
     template for the cluster type and the cluster inventory.
+
+    Args:
+        operator_timeout: The maximum number of seconds that updates and deletes wait for
+                          the operator to acknowledge the change before returning.
     """
 
-    def __init__(self):
-        pass
+    def __init__(self, operator_timeout: float = 2):
+        self._operator_timeout = operator_timeout
+        # Clusters are found by id using an index of the watched clusters
+        self._cluster_informer = Informer(
+            easykube.Configuration.from_environment(),
+            CAAS_API_VERSION,
+            "clusters",
+            indexers = {
+                "uid": lambda cluster: [cluster["metadata"]["uid"]],
+            }
+        )
 
     def cluster_types(self, ctx: dto.Context) -> t.Iterable[dto.ClusterType]:
-        client = get_k8s_client(ctx)
-        return get_cluster_types(client, ctx.tenancy)
+        with get_k8s_client(ctx) as client:
+            return get_cluster_types(client, ctx.tenancy)
 
     def find_cluster_type(self, name: str, ctx: dto.Context) -> dto.ClusterType:
         """
         See :py:meth:`.base.Driver.find_cluster_type`.
         """
-        all_types = self.cluster_types(ctx)
-        for ctype in all_types:
-            if ctype.name == name:
-                return ctype
-        raise errors.ObjectNotFoundError(name)
+        with get_client_pool().client() as client:
+            try:
+                raw = client.api(CAAS_API_VERSION).resource("clustertypes").fetch(name)
+            except easykube.ApiError as exc:
+                if exc.status_code == 404:
+                    raise errors.ObjectNotFoundError(name)
+                else:
+                    raise
+        # Cluster types that are not permitted or not available are not found
+        cluster_type = _get_cluster_type_dto(raw) if allowed_by_acls(raw, ctx.tenancy) else None
+        if cluster_type:
+            return cluster_type
+        else:
+            raise errors.ObjectNotFoundError(name)
 
     def clusters(self, ctx: dto.Context) -> t.Iterable[dto.Cluster]:
         """
         List the clusters that are deployed.
         """
-        client = get_k8s_client(ctx)
-        return get_clusters(client)
+        with get_k8s_client(ctx) as client:
+            return get_clusters(client)
 
     def find_cluster(self, id: str, ctx: dto.Context) -> dto.Cluster:
         """
         Find a cluster by id.
         """
+        if self._cluster_informer.wait_for_sync():
+            with get_client_pool().client() as client:
+                namespace = utils.get_namespace(client, ctx.tenancy)
+            raw_cluster = next(
+                (
+                    raw_cluster
+                    for raw_cluster in self._cluster_informer.by_index("uid", id)
+                    if raw_cluster["metadata"]["namespace"] == namespace
+                ),
+                None
+            )
+            if raw_cluster is not None:
+                return get_cluster_dto(raw_cluster)
+        # If the cluster is not in the index, e.g. because it was created by another
+        # process very recently, fall back to searching the clusters in the namespace
         all_clusters = self.clusters(ctx)
         for cluster in all_clusters:
             if cluster.id == id:
@@ -336,8 +460,8 @@ class Driver(base.Driver):
         """
         Create a new cluster with the given name, type and parameters.
         """
-        client = get_k8s_client(ctx, True)
-        return create_cluster(client, name, cluster_type, params, resources, schedule, ctx)
+        with get_k8s_client(ctx, True) as client:
+            return create_cluster(client, name, cluster_type, params, resources, schedule, ctx)
 
     def update_cluster(
         self,
@@ -348,9 +472,11 @@ class Driver(base.Driver):
         """
         Updates an existing cluster with the given parameters.
         """
-        client = get_k8s_client(ctx, True)
-        return update_cluster(client, cluster.name, params,
-                              version=None, ctx=ctx)
+        with get_k8s_client(ctx, True) as client:
+            return update_cluster(client, cluster.name, params,
+                                  version=None, ctx=ctx,
+                                  informer=self._cluster_informer,
+                                  timeout=self._operator_timeout)
 
     def patch_cluster(
         self,
@@ -361,8 +487,15 @@ class Driver(base.Driver):
         """
         Patches the given existing cluster.
         """
-        client = get_k8s_client(ctx, True)
-        return patch_cluster(client, cluster.name, params, ctx)
+        with get_k8s_client(ctx, True) as client:
+            return patch_cluster(
+                client,
+                cluster.name,
+                params,
+                ctx,
+                self._cluster_informer,
+                self._operator_timeout
+            )
 
     def delete_cluster(
         self,
@@ -372,5 +505,10 @@ class Driver(base.Driver):
         """
         Deletes an existing cluster.
         """
-        client = get_k8s_client(ctx, True)
-        return delete_cluster(client, cluster.name)
+        with get_k8s_client(ctx, True) as client:
+            return delete_cluster(
+                client,
+                cluster.name,
+                self._cluster_informer,
+                self._operator_timeout
+            )
@@ -17,6 +17,10 @@ from ..provider import dto as cloud_dto
 from ..scheduling import dto as scheduling_dto
 
 
+#: The number of seconds to wait when fetching a cluster type specification from a URL
+FETCH_TIMEOUT = 10
+
+
 @dataclass(frozen = True)
 class Context:
     """
@@ -146,7 +150,7 @@ class ClusterType:
     @classmethod
     def _open(cls, path):
         if re.match(r'https?://', path):
-            response = requests.get(path)
+            response = requests.get(path, timeout = FETCH_TIMEOUT)
             response.raise_for_status()
             return io.StringIO(response.text)
         else:
@@ -8,6 +8,7 @@ import typing as t
 
 import jinja2
 
+from .. import concurrency
 from ..provider import base as cloud_base
 from ..scheduling import dto as scheduling_dto
 from ..zenith import Zenith
@@ -54,6 +55,10 @@ class Engine:
         return ClusterManager(self._driver, self._zenith, cloud_session)
 
 
+#: Decorator that coalesces identical concurrent reads for the same tenancy
+coalesce_reads = concurrency.coalesce(lambda manager: manager._tenancy.id)
+
+
 class ClusterManager:
     """
     Class for a tenancy-scoped cluster manager.
@@ -72,13 +77,15 @@ class ClusterManager:
         self._tenancy = cloud_session.tenancy()
         self._jinja_env = jinja2.Environment()
 
+    @coalesce_reads
     def cluster_types(self) -> t.Iterable[dto.ClusterType]:
         """
         Lists the available cluster types.
         """
         ctx = dto.Context(self._username, self._user_id, self._tenancy)
-        return self._driver.cluster_types(ctx)
+        return tuple(self._driver.cluster_types(ctx))
 
+    @coalesce_reads
     def find_cluster_type(self, name: str) -> dto.ClusterType:
         """
         Find a cluster type by name.
@@ -149,13 +156,28 @@ class ClusterManager:
         )
         return self._cloud_session.cluster_modify(cluster)
 
+    @coalesce_reads
+    def _driver_clusters(self) -> t.Iterable[dto.Cluster]:
+        """
+        Returns the clusters from the driver.
+        """
+        ctx = dto.Context(self._username, self._user_id, self._tenancy)
+        return tuple(self._driver.clusters(ctx))
+
+    @coalesce_reads
+    def _driver_find_cluster(self, id: str) -> dto.Cluster:
+        """
+        Returns the cluster with the given id from the driver.
+        """
+        ctx = dto.Context(self._username, self._user_id, self._tenancy)
+        return self._driver.find_cluster(id, ctx)
+
     def clusters(self) -> t.Iterable[dto.Cluster]:
         """
         List the clusters that are deployed.
         """
-        ctx = dto.Context(self._username, self._user_id, self._tenancy)
         cluster_types = None
-        for cluster in self._driver.clusters(ctx):
+        for cluster in self._driver_clusters():
             # cluster_types is lazily initialised once we know there is a cluster
             if not cluster_types:
                 cluster_types = {
@@ -168,8 +190,7 @@ class ClusterManager:
         """
         Find a cluster by id.
         """
-        ctx = dto.Context(self._username, self._user_id, self._tenancy)
-        cluster = self._driver.find_cluster(id, ctx)
+        cluster = self._driver_find_cluster(id)
         return self._cluster_modify(cluster)
 
     def validate_cluster_params(
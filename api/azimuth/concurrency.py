@@ -0,0 +1,168 @@
+"""
+Helpers for running independent pieces of I/O-bound work concurrently.
+"""
+
+import concurrent.futures
+import functools
+import os
+import threading
+
+from . import metrics
+
+
+#: The maximum number of threads in the shared pool, per process
+MAX_WORKERS = int(os.environ.get("AZIMUTH_CONCURRENCY_MAX_WORKERS", "16"))
+
+
+_executor = None
+_executor_lock = threading.Lock()
+_local = threading.local()
+
+
+def _mark_worker_thread():
+    _local.is_worker = True
+
+
+def get_executor():
+    """
+    Returns the process-wide bounded thread pool, creating it if required.
+
+    The pool is created lazily so that it is created after the gunicorn workers fork.
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers = MAX_WORKERS,
+                    thread_name_prefix = "azimuth-concurrent",
+                    initializer = _mark_worker_thread
+                )
+    return _executor
+
+
+def map_concurrently(func, *iterables):
+    """
+    Like the built-in ``map``, except that the calls are made concurrently using the
+    shared thread pool. The results are returned as a list in the order of the inputs.
+
+    If any of the calls raises an exception, the first such exception (in input order)
+    is raised once all the calls have completed.
+
+    When called from a thread in the shared pool, the calls are made sequentially in
+    the current thread so that nested use cannot exhaust the pool and deadlock.
+    """
+    if getattr(_local, "is_worker", False):
+        return list(map(func, *iterables))
+    futures = [get_executor().submit(func, *args) for args in zip(*iterables)]
+    # Wait for all the futures to complete before raising any exceptions, so that
+    # no work is left running after we return
+    concurrent.futures.wait(futures)
+    return [future.result() for future in futures]
+
+
+def run_concurrently(*funcs):
+    """
+    Calls each of the given zero-argument functions concurrently and returns a list
+    of the results in the same order. See :py:func:`map_concurrently`.
+    """
+    return map_concurrently(lambda func: func(), funcs)
+
+
+class _Call:
+    """
+    Represents a call that is in progress.
+    """
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.exception = None
+
+
+def _copy_exception(exc):
+    """
+    Returns a copy of the exception, without its traceback, so that it can be raised in
+    another thread without the threads modifying the same traceback. If the exception
+    cannot be copied, the exception itself is returned.
+    """
+    # The copy is made without calling __init__, as exceptions with custom constructors
+    # cannot always be constructed from their args
+    exc_type = type(exc)
+    try:
+        copied = exc_type.__new__(exc_type, *exc.args)
+        copied.__dict__.update(exc.__dict__)
+    except Exception:
+        return exc
+    copied.args = exc.args
+    return copied
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key, so that only one of them does the work
+    and the others wait for, and share, its result.
+
+    Calls are only coalesced with other calls in the same process.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, func):
+        """
+        Calls the function, unless a call with the same key is already in progress in which
+        case the result of that call is returned (or its exception raised) instead.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if leader:
+            try:
+                call.result = func()
+            except BaseException as exc:
+                call.exception = exc
+                raise
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.event.set()
+            return call.result
+        else:
+            metrics.increment("single_flight.coalesced")
+            call.event.wait()
+            if call.exception is not None:
+                # Each waiter raises its own copy, chained to the exception from the leader
+                exc = _copy_exception(call.exception)
+                if exc is call.exception:
+                    raise exc
+                raise exc from call.exception
+            return call.result
+
+
+_single_flight = SingleFlight()
+
+
+def coalesce(scope):
+    """
+    Returns a decorator for methods that perform reads, so that identical concurrent
+    reads are coalesced. The key for a call is formed from the scope, the method and the
+    arguments, where the scope is obtained by calling ``scope`` with the instance, e.g.
+    to return the id of the project that the read is for.
+
+    Calls whose arguments are not hashable are not coalesced. Because the result is shared
+    between the callers, it should not be mutated.
+    """
+    def decorator(method):
+        name = f"{method.__module__}.{method.__qualname__}"
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            key = (scope(self), name, args, tuple(sorted(kwargs.items())))
+            try:
+                hash(key)
+            except TypeError:
+                return method(self, *args, **kwargs)
+            return _single_flight.do(key, lambda: method(self, *args, **kwargs))
+        return wrapper
+    return decorator
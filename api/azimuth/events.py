@@ -0,0 +1,468 @@
+"""
+Module containing the shared watchers that feed the tenancy event streams.
+
+Each process has at most one watcher per tenancy, regardless of how many clients are
+subscribed to events for that tenancy. The watcher periodically lists the resources in
+the tenancy, using a token from one of the subscribers, and publishes an event to every
+subscriber for each resource that has been added, updated or deleted since the last time.
+"""
+
+import json
+import logging
+import queue
+import threading
+import time
+from urllib.parse import urljoin
+
+from rest_framework.utils.encoders import JSONEncoder
+
+from . import metrics, serializers
+from .provider import errors as provider_errors
+from .settings import cloud_settings
+
+
+logger = logging.getLogger(__name__)
+
+
+class TooManyStreams(Exception):
+    """
+    Raised when a process already has the maximum number of event streams.
+    """
+
+
+class LinkBuilder:
+    """
+    Stands in for the request in serializer contexts, so that links can be built for a
+    subscriber without keeping the request once the response has started.
+    """
+    def __init__(self, base_url):
+        self.base_url = base_url
+
+    def build_absolute_uri(self, location):
+        return urljoin(self.base_url, location)
+
+
+class Subscription:
+    """
+    A subscription by a single client to the events for a tenancy.
+
+    The token is only kept while the subscription is open, and is used by the watcher
+    to fetch the resources and to check that the client still has access to the tenancy.
+
+    At most ``max_queued`` events are queued for the client. If the client falls further
+    behind than that, the subscription is closed and the client is expected to reconnect.
+
+    Events that are published before :py:meth:`start` is called are held back, so that
+    they are sent after the resources that existed when the client subscribed.
+    """
+    def __init__(self, watcher, token, base_url, existing, max_queued):
+        self.watcher = watcher
+        self.token = token
+        self.base_url = base_url
+        self.context = {
+            "request": LinkBuilder(base_url),
+            "tenant": watcher.tenancy_id,
+        }
+        self.validated_at = time.monotonic()
+        self._lock = threading.Lock()
+        # Leave room for the error and end of stream markers when the queue overflows
+        self._queue = queue.Queue(max_queued + 2)
+        self._max_queued = max_queued
+        # Map of kind -> DTOs for the resources that existed when the client subscribed
+        self._existing = existing
+        self._held = []
+        self._closed = False
+
+    def _put(self, event):
+        # Must be called with the lock held
+        if self._closed:
+            return
+        if self._queue.qsize() >= self._max_queued:
+            self.watcher._log("Event stream overflowed - closing", level = logging.WARNING)
+            metrics.increment("events.overflowed")
+            # Discard the queued events, as the client must reconnect to catch up anyway
+            while True:
+                try:
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            self._close("Too many pending events.")
+            self.watcher.unsubscribe(self)
+        else:
+            self._queue.put_nowait(event)
+
+    def _close(self, reason):
+        # Must be called with the lock held
+        if not self._closed:
+            if reason:
+                self._queue.put_nowait(("error", { "detail": reason }))
+            self._queue.put_nowait(None)
+            self._closed = True
+
+    def start(self):
+        """
+        Sends the resources that existed when the client subscribed, followed by any events
+        that have been held back in the meantime.
+        """
+        # Serializing the resources may take a while, so it is done without holding any locks
+        initial = [
+            (kind, { "type": "update", "object": data })
+            for kind, objs in self._existing.items()
+            for data in _serialize(kind, objs, self.context)
+        ]
+        self._existing = None
+        with self._lock:
+            for event in initial:
+                self._put(event)
+            held, self._held = self._held, None
+            for event in held:
+                self._put(event)
+
+    def publish(self, event):
+        with self._lock:
+            if self._held is not None:
+                self._held.append(event)
+            else:
+                self._put(event)
+
+    def close(self, reason = None):
+        """
+        Closes the subscription, optionally sending an error event first.
+        """
+        with self._lock:
+            # Pending events are discarded so that there is room for the error
+            while True:
+                try:
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            self._close(reason)
+
+    def _events(self, duration, heartbeat_interval):
+        deadline = time.monotonic() + duration
+        # Ask the client to wait a second before reconnecting
+        yield "retry: 1000\n\n"
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                event = self._queue.get(timeout = min(remaining, heartbeat_interval))
+            except queue.Empty:
+                # Send a comment so that proxies keep the connection open and so that
+                # we notice if the client has gone away
+                yield ": keepalive\n\n"
+                continue
+            if event is None:
+                break
+            event_type, data = event
+            yield "event: {}\ndata: {}\n\n".format(
+                event_type,
+                json.dumps(data, cls = JSONEncoder)
+            )
+
+    def stream(self, duration, heartbeat_interval):
+        """
+        Returns an iterable that yields the events for the subscription in server-sent
+        event format for up to ``duration`` seconds, after which the client is expected
+        to reconnect. The subscription ends when the iterable is closed.
+        """
+        return _Stream(self, self._events(duration, heartbeat_interval))
+
+
+class _Stream:
+    """
+    Iterable of server-sent events that unsubscribes when it is closed, even if it was
+    never iterated, e.g. because the client went away before the response started.
+    """
+    def __init__(self, subscription, events):
+        self._subscription = subscription
+        self._events = events
+
+    def __iter__(self):
+        return self._events
+
+    def close(self):
+        self._events.close()
+        self._subscription.watcher.unsubscribe(self._subscription)
+
+
+class TenancyWatcher:
+    """
+    Watches the resources in a tenancy on behalf of all the subscribers for the tenancy
+    in this process.
+
+    The watcher keeps the DTOs for the resources, and serializes the resources for each
+    subscriber using the context for that subscriber.
+
+    Args:
+        tenancy_id: The id of the tenancy to watch.
+        interval: The number of seconds between refreshes of the resources.
+        revalidate_interval: The number of seconds between checks that the token for each
+                             subscriber still has access to the tenancy.
+        max_queued: The maximum number of events to queue for each subscriber.
+        on_stopped: Called with the watcher when its thread exits because there are no
+                    subscribers left.
+    """
+    def __init__(
+        self,
+        tenancy_id,
+        interval,
+        revalidate_interval = 60,
+        max_queued = 1000,
+        on_stopped = None
+    ):
+        self.tenancy_id = tenancy_id
+        self.interval = interval
+        self.revalidate_interval = revalidate_interval
+        self.max_queued = max_queued
+        self.on_stopped = on_stopped
+        self._lock = threading.Lock()
+        self._subscriptions = []
+        # Map of resource kind -> resource id -> DTO
+        self._resources = {}
+        self._thread = None
+        self.stopped = False
+
+    def _log(self, message, *args, level = logging.INFO, **kwargs):
+        logger.log(level, "[%s] " + message, self.tenancy_id, *args, **kwargs)
+
+    @property
+    def subscription_count(self):
+        with self._lock:
+            return len(self._subscriptions)
+
+    def subscribe(self, token, base_url):
+        """
+        Returns a new subscription for the given token. The resources that are already
+        known are sent to the new subscriber when :py:meth:`Subscription.start` is called.
+
+        Returns ``None`` if the watcher has stopped, in which case a new watcher is required.
+        """
+        with self._lock:
+            if self.stopped:
+                return None
+            subscription = Subscription(
+                self,
+                token,
+                base_url,
+                { kind: list(resources.values()) for kind, resources in self._resources.items() },
+                self.max_queued
+            )
+            self._subscriptions.append(subscription)
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target = self._run,
+                    name = f"events-{self.tenancy_id}",
+                    daemon = True
+                )
+                self._thread.start()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            try:
+                self._subscriptions.remove(subscription)
+            except ValueError:
+                pass
+
+    def _publish(self, kind, event_type, objs):
+        """
+        Publishes an event for each of the given DTOs to every subscriber, serializing
+        the DTOs once for each distinct context.
+        """
+        if not objs:
+            return
+        metrics.increment(f"events.{event_type}", len(objs))
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        serialized = {}
+        for subscription in subscriptions:
+            try:
+                items = serialized[subscription.base_url]
+            except KeyError:
+                items = serialized[subscription.base_url] = _serialize(
+                    kind,
+                    objs,
+                    subscription.context
+                )
+            for data in items:
+                subscription.publish((kind, { "type": event_type, "object": data }))
+
+    def _fetchers(self, session):
+        """
+        Yields ``(kind, fetch)`` tuples for the kinds of resource that are watched, where
+        ``fetch`` returns the DTOs for the resources of that kind.
+        """
+        yield "machines", session.machines
+        yield "volumes", session.volumes
+        yield "external_ips", session.external_ips
+        if cloud_settings.CLUSTER_API_PROVIDER:
+            def kubernetes_clusters():
+                with cloud_settings.CLUSTER_API_PROVIDER.session(session) as capi_session:
+                    return capi_session.clusters()
+            def kubernetes_apps():
+                with cloud_settings.CLUSTER_API_PROVIDER.session(session) as capi_session:
+                    return capi_session.apps()
+            yield "kubernetes_clusters", kubernetes_clusters
+            yield "kubernetes_apps", kubernetes_apps
+        if cloud_settings.CLUSTER_ENGINE:
+            def clusters():
+                with cloud_settings.CLUSTER_ENGINE.create_manager(session) as cluster_manager:
+                    return cluster_manager.clusters()
+            yield "clusters", clusters
+
+    def _diff(self, kind, objs):
+        """
+        Publishes the events for the changes between the previous and current resources.
+        """
+        current = { str(obj.id): obj for obj in objs }
+        previous = self._resources.get(kind, {})
+        self._publish(
+            kind,
+            "update",
+            [obj for obj_id, obj in current.items() if previous.get(obj_id) != obj]
+        )
+        self._publish(
+            kind,
+            "delete",
+            [obj for obj_id, obj in previous.items() if obj_id not in current]
+        )
+        with self._lock:
+            self._resources[kind] = current
+
+    def _refresh(self, subscription):
+        """
+        Refreshes the resources using the token from the given subscription.
+        """
+        with cloud_settings.PROVIDER.from_token(subscription.token) as session:
+            with session.scoped_session(self.tenancy_id) as scoped_session:
+                subscription.validated_at = time.monotonic()
+                for kind, fetch in self._fetchers(scoped_session):
+                    try:
+                        objs = list(fetch())
+                    except Exception:
+                        # Keep the previous resources, so that a transient error does not
+                        # look like the resources have been deleted
+                        self._log("Error fetching %s", kind, level = logging.WARNING, exc_info = True)
+                    else:
+                        self._diff(kind, objs)
+
+    def _revalidate(self, subscriptions):
+        """
+        Checks that the tokens for the given subscriptions still have access to the tenancy,
+        if they have not been checked recently, and closes the subscriptions that do not.
+        """
+        now = time.monotonic()
+        for subscription in subscriptions:
+            if now - subscription.validated_at < self.revalidate_interval:
+                continue
+            try:
+                with cloud_settings.PROVIDER.from_token(subscription.token) as session:
+                    with session.scoped_session(self.tenancy_id):
+                        subscription.validated_at = now
+            except (
+                provider_errors.AuthenticationError,
+                provider_errors.PermissionDeniedError,
+                provider_errors.ObjectNotFoundError
+            ) as exc:
+                self.unsubscribe(subscription)
+                subscription.close(str(exc))
+            except Exception:
+                # Try again on the next refresh
+                self._log("Error validating subscriber", level = logging.WARNING, exc_info = True)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                subscriptions = list(self._subscriptions)
+                if not subscriptions:
+                    # Once stopped, the watcher is discarded and the next subscriber for
+                    # the tenancy gets a new watcher with fresh resources
+                    self.stopped = True
+                    self._resources = {}
+                    break
+            # Use the token from the most recent subscriber, as it is the least likely
+            # to have expired, and stop the streams for any tokens that are not valid
+            for subscription in reversed(subscriptions):
+                try:
+                    self._refresh(subscription)
+                except (
+                    provider_errors.AuthenticationError,
+                    provider_errors.PermissionDeniedError,
+                    provider_errors.ObjectNotFoundError
+                ) as exc:
+                    self.unsubscribe(subscription)
+                    subscription.close(str(exc))
+                except Exception:
+                    self._log("Error refreshing resources", level = logging.ERROR, exc_info = True)
+                    break
+                else:
+                    break
+            # The resources are published to every subscriber, so make sure that each
+            # subscriber is still allowed to see them
+            self._revalidate(subscriptions)
+            time.sleep(self.interval)
+        if self.on_stopped:
+            self.on_stopped(self)
+
+
+#: The serializer for each kind of resource
+SERIALIZERS = {
+    "machines": serializers.MachineSerializer,
+    "volumes": serializers.VolumeSerializer,
+    "external_ips": serializers.ExternalIPSerializer,
+    "kubernetes_clusters": serializers.KubernetesClusterSerializer,
+    "kubernetes_apps": serializers.KubernetesAppSerializer,
+    "clusters": serializers.ClusterSerializer,
+}
+
+
+def _serialize(kind, objs, context):
+    """
+    Returns the serialized data for the given DTOs of the given kind.
+    """
+    return SERIALIZERS[kind](list(objs), many = True, context = context).data
+
+
+_watchers = {}
+_watchers_lock = threading.Lock()
+
+
+def _remove_watcher(watcher):
+    """
+    Removes a watcher that has stopped, unless it has already been replaced.
+    """
+    with _watchers_lock:
+        if _watchers.get(watcher.tenancy_id) is watcher:
+            del _watchers[watcher.tenancy_id]
+
+
+def subscribe(tenancy_id, token, base_url) -> Subscription:
+    """
+    Subscribes to the events for the given tenancy using the given token. Links in the
+    events are built using the given base URL.
+
+    Raises :py:class:`TooManyStreams` if this process already has the maximum number
+    of event streams.
+    """
+    with _watchers_lock:
+        streams = sum(watcher.subscription_count for watcher in _watchers.values())
+        if streams >= cloud_settings.EVENTS.MAX_STREAMS:
+            raise TooManyStreams()
+        watcher = _watchers.get(tenancy_id)
+        subscription = watcher.subscribe(token, base_url) if watcher else None
+        if subscription is None:
+            # There is no watcher for the tenancy, or it stopped before we could subscribe
+            watcher = _watchers[tenancy_id] = TenancyWatcher(
+                tenancy_id,
+                cloud_settings.EVENTS.POLL_INTERVAL,
+                revalidate_interval = cloud_settings.EVENTS.REVALIDATE_INTERVAL,
+                max_queued = cloud_settings.EVENTS.MAX_QUEUED_EVENTS,
+                on_stopped = _remove_watcher
+            )
+            subscription = watcher.subscribe(token, base_url)
+    # The existing resources are serialized without holding the lock, so that subscribers
+    # for other tenancies are not held up
+    subscription.start()
+    return subscription
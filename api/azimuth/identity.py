@@ -1,9 +1,10 @@
 import dataclasses
 import typing as t
 
-from easykube import Configuration, ApiError
+from easykube import ApiError
 
 from .cluster_engine import dto as cluster_dto
+from .kube import get_client_pool
 from .provider import dto
 from . import utils
 
@@ -11,10 +12,6 @@ from . import utils
 AZIMUTH_IDENTITY_API_VERSION = "identity.azimuth.stackhpc.com/v1alpha1"
 
 
-# Configure the Kubernetes client from the environment
-ekconfig = Configuration.from_environment()
-
-
 @dataclasses.dataclass(frozen = True)
 class Realm:
     """
@@ -47,7 +44,7 @@ def get_realm(tenancy: dto.Tenancy) -> t.Optional[Realm]:
     """
     Returns the identity realm for the tenancy.
     """
-    with ekconfig.sync_client() as client:
+    with get_client_pool().client() as client:
         tenancy_namespace = utils.get_namespace(client, tenancy)
         try:
             realm = client.api(AZIMUTH_IDENTITY_API_VERSION).resource("realms").fetch(
@@ -67,7 +64,7 @@ def ensure_realm(tenancy: dto.Tenancy) -> Realm:
     """
     Ensures that an identity realm exists for the given tenancy.
     """
-    with ekconfig.sync_client(default_field_manager = "azimuth") as client:
+    with get_client_pool(default_field_manager = "azimuth").client() as client:
         tenancy_namespace = utils.get_namespace(client, tenancy)
         # Create the namespace if required
         utils.ensure_namespace(client, tenancy_namespace, tenancy)
@@ -103,7 +100,7 @@ def ensure_platform_for_cluster(
     """
     Ensures that an identity platform exists for the cluster.
     """
-    with ekconfig.sync_client(default_field_manager = "azimuth") as client:
+    with get_client_pool(default_field_manager = "azimuth").client() as client:
         tenancy_namespace = utils.get_namespace(client, tenancy)
         client.apply_object(
             {
@@ -0,0 +1,289 @@
+"""
+Process-level caches of Kubernetes resources that are kept up to date using watches.
+"""
+
+import logging
+import os
+import threading
+import time
+
+from . import metrics
+
+
+logger = logging.getLogger(__name__)
+
+
+def _resource_version(obj):
+    """
+    Returns the resource version of the object as an integer, or ``None`` if it is not
+    an integer.
+
+    Resource versions are officially opaque, but in practice they are the etcd revision
+    and so can be used to decide which of two versions of an object is more recent.
+    """
+    try:
+        return int(obj["metadata"]["resourceVersion"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def _is_newer(obj, existing):
+    """
+    Returns true if ``obj`` should replace ``existing`` in the store.
+    """
+    if existing is None:
+        return True
+    obj_version = _resource_version(obj)
+    existing_version = _resource_version(existing)
+    if obj_version is None or existing_version is None:
+        return True
+    return obj_version >= existing_version
+
+
+class Informer:
+    """
+    Maintains an in-memory copy of all the objects of a Kubernetes resource, across all
+    namespaces, using a LIST followed by a WATCH in a background thread.
+
+    The objects are indexed by namespace and name, and by any additional indexes that are
+    given. Objects returned by writes can be
+    recorded in the store so that subsequent reads in this process see the write even
+    before the corresponding watch event is received.
+
+    The thread is started on first use, so that it is started after the gunicorn workers
+    fork, and is restarted if the process has forked since it was started.
+
+    Args:
+        ekconfig: The easykube configuration used to create the client for the watch.
+        api_version: The API version of the resource.
+        resource: The name of the resource.
+        namespaced: Indicates whether the resource is namespaced.
+        labels: Labels that objects must have to be included, as accepted by easykube.
+        indexers: Mapping of index name to a function that returns the keys for an object
+                  in that index, for use with :py:meth:`by_index`.
+        sync_timeout: The maximum number of seconds that reads wait for the initial LIST
+                      to complete after the informer is started. Reads made while the
+                      store is not synced should fall back to the API.
+        retry_interval: The number of seconds to wait before re-establishing a failed watch.
+    """
+    def __init__(
+        self,
+        ekconfig,
+        api_version,
+        resource,
+        *,
+        namespaced = True,
+        labels = None,
+        indexers = None,
+        sync_timeout = 5,
+        retry_interval = 5
+    ):
+        self._ekconfig = ekconfig
+        self.api_version = api_version
+        self.resource = resource
+        self.namespaced = namespaced
+        self.labels = labels
+        self.indexers = indexers or {}
+        self.sync_timeout = sync_timeout
+        self.retry_interval = retry_interval
+        self._lock = threading.Lock()
+        # Notified whenever the store changes
+        self._changed = threading.Condition(self._lock)
+        self._synced = threading.Event()
+        # Map of namespace -> name -> object
+        # For cluster-scoped resources, the namespace is None
+        self._objects = {}
+        # Map of index name -> index key -> set of (namespace, name)
+        self._indexes = { index: {} for index in self.indexers }
+        self._thread = None
+        self._pid = None
+        self._started_at = None
+
+    def _log(self, message, *args, level = logging.INFO, **kwargs):
+        logger.log(level, "[%s] " + message, self.resource, *args, **kwargs)
+
+    def _key(self, obj):
+        return (
+            obj["metadata"].get("namespace") if self.namespaced else None,
+            obj["metadata"]["name"]
+        )
+
+    def _index(self, obj, add = True):
+        key = self._key(obj)
+        for index, indexer in self.indexers.items():
+            for index_key in indexer(obj):
+                if add:
+                    self._indexes[index].setdefault(index_key, set()).add(key)
+                else:
+                    keys = self._indexes[index].get(index_key, set())
+                    keys.discard(key)
+                    if not keys:
+                        self._indexes[index].pop(index_key, None)
+
+    def _put(self, obj):
+        namespace, name = self._key(obj)
+        objects = self._objects.setdefault(namespace, {})
+        existing = objects.get(name)
+        if _is_newer(obj, existing):
+            if existing is not None:
+                self._index(existing, add = False)
+            objects[name] = obj
+            self._index(obj)
+            self._changed.notify_all()
+
+    def _remove(self, namespace, name):
+        objects = self._objects.get(namespace, {})
+        existing = objects.pop(name, None)
+        if existing is not None:
+            self._index(existing, add = False)
+            self._changed.notify_all()
+        if not objects:
+            self._objects.pop(namespace, None)
+
+    def _replace(self, objs):
+        with self._lock:
+            self._objects = {}
+            self._indexes = { index: {} for index in self.indexers }
+            for obj in objs:
+                self._put(obj)
+            self._changed.notify_all()
+
+    def _handle_event(self, event):
+        event_type = event["type"]
+        obj = event["object"]
+        if event_type in {"ADDED", "MODIFIED"}:
+            with self._lock:
+                self._put(obj)
+        elif event_type == "DELETED":
+            with self._lock:
+                self._remove(*self._key(obj))
+
+    def _watch(self):
+        """
+        Lists the objects and then watches for changes, returning if the watch ends.
+        """
+        params = {}
+        if self.namespaced:
+            params["all_namespaces"] = True
+        if self.labels:
+            params["labels"] = self.labels
+        with self._ekconfig.sync_client() as client:
+            ekresource = client.api(self.api_version).resource(self.resource)
+            initial_state, events = ekresource.watch_list(**params)
+            initial_state = list(initial_state)
+            self._replace(initial_state)
+            self._synced.set()
+            self._log("Synced %s objects", len(initial_state))
+            for event in events:
+                self._handle_event(event)
+
+    def _run(self):
+        while True:
+            try:
+                self._watch()
+            except Exception:
+                self._log("Error watching resource", level = logging.ERROR, exc_info = True)
+                # Until the watch is re-established, readers should use the API
+                self._synced.clear()
+                time.sleep(self.retry_interval)
+            else:
+                self._log("Watch ended, restarting", level = logging.DEBUG)
+
+    def start(self):
+        """
+        Starts the background thread if it is not already running in this process.
+        """
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._lock:
+            if self._pid == pid:
+                return
+            # Any state inherited from a parent process is discarded
+            self._objects = {}
+            self._indexes = { index: {} for index in self.indexers }
+            self._synced = threading.Event()
+            self._thread = threading.Thread(
+                target = self._run,
+                name = f"informer-{self.resource}",
+                daemon = True
+            )
+            self._thread.start()
+            self._started_at = time.monotonic()
+            self._pid = pid
+
+    def wait_for_sync(self):
+        """
+        Starts the informer if required and returns true if the store can be used for reads.
+
+        Only reads made within ``sync_timeout`` seconds of the informer starting wait for
+        the initial LIST, so that reads are not delayed while a failed watch is retried.
+        """
+        self.start()
+        timeout = max(0, self._started_at + self.sync_timeout - time.monotonic())
+        synced = self._synced.wait(timeout)
+        if not synced:
+            metrics.increment(f"cache.informer_{self.resource}.unsynced")
+        return synced
+
+    def list(self, namespace = None):
+        """
+        Returns the objects in the given namespace, or all the objects for a cluster-scoped
+        resource.
+        """
+        with self._lock:
+            return tuple(self._objects.get(namespace, {}).values())
+
+    def get(self, name, namespace = None):
+        """
+        Returns the named object in the given namespace, or ``None`` if it is not in the
+        store.
+        """
+        with self._lock:
+            obj = self._objects.get(namespace, {}).get(name)
+        metrics.increment(
+            "cache.informer_{}.{}".format(self.resource, "miss" if obj is None else "hit")
+        )
+        return obj
+
+    def by_index(self, index, key):
+        """
+        Returns the objects that have the given key in the named index.
+        """
+        with self._lock:
+            return tuple(
+                self._objects[namespace][name]
+                for namespace, name in sorted(
+                    self._indexes[index].get(key, ()),
+                    key = lambda k: (k[0] or "", k[1])
+                )
+            )
+
+    def wait_for(self, name, namespace, predicate, timeout):
+        """
+        Waits for up to ``timeout`` seconds for the named object to satisfy the predicate,
+        which is called with the object or ``None`` if the object is not in the store.
+
+        Returns a ``(satisfied, obj)`` tuple containing the most recent version of the
+        object, which is returned even if the predicate is not satisfied.
+        """
+        def current():
+            return self._objects.get(namespace, {}).get(name)
+        with self._changed:
+            satisfied = self._changed.wait_for(lambda: predicate(current()), timeout)
+            return satisfied, current()
+
+    def record(self, obj):
+        """
+        Records an object that was returned by a write, unless the store already has a
+        more recent version of it.
+        """
+        with self._lock:
+            self._put(obj)
+
+    def forget(self, name, namespace = None):
+        """
+        Removes the named object from the store, e.g. when it is known to have been deleted.
+        """
+        with self._lock:
+            self._remove(namespace, name)
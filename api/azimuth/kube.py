@@ -0,0 +1,276 @@
+"""
+Helpers for sharing Kubernetes clients between requests and threads.
+"""
+
+import contextlib
+import functools
+import logging
+import os
+import threading
+import time
+
+from easykube import ApiError, Configuration
+
+
+logger = logging.getLogger(__name__)
+
+
+#: The maximum number of idle clients that are kept in each pool
+MAX_IDLE_CLIENTS = int(os.environ.get("AZIMUTH_KUBE_MAX_IDLE_CLIENTS", "8"))
+
+#: The number of seconds after which the capabilities of the cluster are rediscovered
+CAPABILITIES_TTL = int(os.environ.get("AZIMUTH_KUBE_CAPABILITIES_TTL", "300"))
+
+#: The API versions that are discovered together the first time a capability is checked
+#: Only API versions that a feature check reads from the registry should be listed
+CAPABILITY_API_VERSIONS = (
+    "scheduling.azimuth.stackhpc.com/v1alpha1",
+)
+
+
+# Incremented when the resources available in the cluster change, so that pooled clients
+# know to discard the results of any previous discovery
+_discovery_generation = 0
+
+
+def object_version(obj):
+    """
+    Returns a ``(uid, resourceVersion)`` tuple that identifies the given version of the
+    Kubernetes object, or ``None`` if the object does not have both.
+    """
+    metadata = obj.get("metadata", {})
+    uid = metadata.get("uid")
+    resource_version = metadata.get("resourceVersion")
+    return (uid, resource_version) if uid and resource_version else None
+
+
+class ClientPool:
+    """
+    Thread-safe pool of easykube clients.
+
+    Each client is used by one thread at a time, but is kept for reuse when it is released
+    so that its connections and the results of API discovery are reused. The ``api``
+    method of each client is memoized, so that each API version is discovered at most
+    once per client.
+
+    Args:
+        ekconfig: The easykube configuration used to create clients.
+        max_idle: The maximum number of idle clients to keep.
+        client_kwargs: Keyword arguments for the clients, e.g. ``default_field_manager``.
+    """
+    def __init__(self, ekconfig, max_idle = MAX_IDLE_CLIENTS, **client_kwargs):
+        self._ekconfig = ekconfig
+        self.max_idle = max_idle
+        self._client_kwargs = client_kwargs
+        self._lock = threading.Lock()
+        self._idle = []
+
+    def _create_client(self):
+        client = self._ekconfig.sync_client(**self._client_kwargs)
+        # Memoize the API objects for the client, which cache the resources discovered
+        # for each API version
+        client.api = functools.lru_cache(maxsize = None)(client.api)
+        client._pool_discovery_generation = _discovery_generation
+        # Remember the default namespace so that it can be restored on release
+        client._pool_default_namespace = client.default_namespace
+        return client
+
+    def acquire(self, namespace = None):
+        """
+        Returns a client from the pool, creating one if there are no idle clients.
+
+        If a namespace is given, it is set as the default namespace for the client.
+        """
+        with self._lock:
+            client = self._idle.pop() if self._idle else None
+        if client is None:
+            client = self._create_client()
+        elif client._pool_discovery_generation != _discovery_generation:
+            client.api.cache_clear()
+            client._pool_discovery_generation = _discovery_generation
+        if namespace:
+            client.default_namespace = namespace
+        return client
+
+    def release(self, client):
+        """
+        Returns a client to the pool, closing it if the pool already has enough idle clients.
+        """
+        client.default_namespace = client._pool_default_namespace
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(client)
+                return
+        client.close()
+
+    @contextlib.contextmanager
+    def client(self, namespace = None):
+        """
+        Context manager that borrows a client from the pool for the duration of the block.
+        """
+        client = self.acquire(namespace)
+        try:
+            yield client
+        finally:
+            self.release(client)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+_pools_pid = None
+
+
+def get_client_pool(**client_kwargs) -> ClientPool:
+    """
+    Returns the process-wide client pool for clients with the given keyword arguments.
+
+    Pools are discarded when the process forks, as connections cannot be shared with the
+    parent process.
+    """
+    global _pools_pid
+    key = tuple(sorted(client_kwargs.items()))
+    with _pools_lock:
+        if _pools_pid != os.getpid():
+            _pools.clear()
+            _pools_pid = os.getpid()
+        try:
+            return _pools[key]
+        except KeyError:
+            pool = _pools[key] = ClientPool(Configuration.from_environment(), **client_kwargs)
+            return pool
+
+
+class CapabilityRegistry:
+    """
+    Registry of the resources that are available in each API group/version, so that
+    feature checks can be made without a network call.
+
+    The given API versions are discovered together the first time a capability is checked,
+    and any other API version is discovered the first time it is checked. After that, the
+    registry is refreshed in the background when the results are older than ``ttl`` seconds,
+    or when :py:meth:`invalidate` is called, e.g. because a request returned a 404.
+
+    Args:
+        client_pool: The client pool to use for discovery.
+        api_versions: The API versions to discover on first use.
+        ttl: The number of seconds after which the results are refreshed.
+    """
+    def __init__(
+        self,
+        client_pool: ClientPool,
+        api_versions = CAPABILITY_API_VERSIONS,
+        ttl = CAPABILITIES_TTL
+    ):
+        self._client_pool = client_pool
+        self.api_versions = api_versions
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # Map of API version -> set of resource names
+        self._resources = {}
+        self._refreshed_at = None
+        self._refreshing = False
+
+    def _discover(self, client, api_version):
+        """
+        Returns the names of the resources available in the given API version.
+        """
+        path = f"/apis/{api_version}" if "/" in api_version else f"/api/{api_version}"
+        try:
+            response = client.get(path)
+        except ApiError as exc:
+            if exc.status_code == 404:
+                return frozenset()
+            else:
+                raise
+        if response.status_code == 404:
+            return frozenset()
+        response.raise_for_status()
+        return frozenset(
+            resource["name"]
+            for resource in response.json().get("resources", [])
+            # Exclude subresources, e.g. clusters/status
+            if "/" not in resource["name"]
+        )
+
+    def _refresh(self, api_versions):
+        """
+        Rediscovers the given API versions and updates the registry.
+        """
+        global _discovery_generation
+        with self._client_pool.client() as client:
+            resources = {
+                api_version: self._discover(client, api_version)
+                for api_version in api_versions
+            }
+        with self._lock:
+            changed = any(
+                self._resources.get(api_version) != names
+                for api_version, names in resources.items()
+            )
+            # Only reset the TTL if every known API version was refreshed
+            if set(self._resources).issubset(resources):
+                self._refreshed_at = time.monotonic()
+            self._resources.update(resources)
+            if changed:
+                _discovery_generation += 1
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+            api_versions = list(self._resources)
+
+        def refresh():
+            try:
+                self._refresh(api_versions)
+            except Exception:
+                logger.exception("Error refreshing Kubernetes API capabilities")
+            finally:
+                with self._lock:
+                    self._refreshing = False
+
+        threading.Thread(target = refresh, name = "kube-capabilities", daemon = True).start()
+
+    def has_resource(self, api_version, resource) -> bool:
+        """
+        Returns true if the given resource is available in the given API version.
+        """
+        with self._lock:
+            resources = self._resources.get(api_version)
+            stale = (
+                self._refreshed_at is not None and
+                time.monotonic() - self._refreshed_at >= self.ttl
+            )
+        if resources is None:
+            # This is the only case where the check waits for discovery
+            self._refresh({ api_version, *self.api_versions })
+            with self._lock:
+                resources = self._resources[api_version]
+        elif stale:
+            self._refresh_in_background()
+        return resource in resources
+
+    def invalidate(self):
+        """
+        Schedules a background refresh of the registry, e.g. because a request for a
+        resource that was thought to be available returned a 404.
+        """
+        self._refresh_in_background()
+
+
+_capabilities = None
+_capabilities_lock = threading.Lock()
+_capabilities_pid = None
+
+
+def get_capability_registry() -> CapabilityRegistry:
+    """
+    Returns the process-wide capability registry.
+    """
+    global _capabilities, _capabilities_pid
+    with _capabilities_lock:
+        if _capabilities_pid != os.getpid():
+            _capabilities = CapabilityRegistry(get_client_pool())
+            _capabilities_pid = os.getpid()
+        return _capabilities
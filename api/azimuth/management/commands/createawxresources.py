@@ -2,11 +2,14 @@
 Module containing the management command for creating AWX resources required for CaaS.
 """
 
+import concurrent.futures
+import functools
 import json
 import re
+import threading
 import time
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 
 from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
 from cryptography.hazmat.primitives.serialization import (
@@ -18,6 +21,9 @@ from cryptography.hazmat.primitives.serialization import (
 
 import rackit
 
+import yaml
+
+from ... import concurrency
 from ...settings import cloud_settings
 from ...cluster_engine.drivers.awx.driver import CREDENTIAL_TYPE_NAMES
 from ...cluster_engine.drivers.awx import api
@@ -159,12 +165,275 @@ CAAS_CREDENTIAL_TYPES = [
 ]
 
 
+#: The maximum number of resources that are ensured at the same time
+MAX_CONCURRENCY = 8
+
+#: The page size to use when fetching the existing resources
+PAGE_SIZE = 200
+
+#: The value that AWX returns in place of secret inputs
+AWX_ENCRYPTED = "$encrypted$"
+
+#: The verbs used to report each action that changes a resource
+ACTION_VERBS = dict(create = "Creating", update = "Updating", associate = "Associating")
+
+#: The symbols used for each action in the dry-run report
+ACTION_SYMBOLS = dict(create = "+", update = "~", associate = "&", unverifiable = "?")
+
+
+def _differs(current, desired):
+    """
+    Returns true if the current value of a field differs from the desired value.
+
+    Only the keys that are in the desired value are compared for dictionaries, as AWX
+    adds defaults to some fields. Secret values cannot be compared, as AWX does not
+    return them, so they are never treated as changed (see :py:func:`secret_fields`).
+    """
+    if current == AWX_ENCRYPTED:
+        return False
+    if isinstance(desired, dict):
+        return (
+            not isinstance(current, dict) or
+            any(_differs(current.get(key), value) for key, value in desired.items())
+        )
+    if isinstance(desired, (list, tuple)):
+        return (
+            not isinstance(current, (list, tuple)) or
+            len(current) != len(desired) or
+            any(_differs(c, d) for c, d in zip(current, desired))
+        )
+    return current != desired
+
+
+def job_template_name(playbook):
+    """
+    Returns the name of the job template for the given playbook.
+    """
+    # Sanitise any weird characters in the playbook name
+    return re.sub(
+        '[^a-zA-Z0-9-]+',
+        '-',
+        playbook.removesuffix('.yml').removesuffix('.yaml')
+    )
+
+
+def changed_fields(resource, params):
+    """
+    Returns the names of the fields of the resource that differ from the given params.
+    """
+    changed = []
+    for name, desired in params.items():
+        current = getattr(resource, name, None)
+        # Extra vars are stored as a string, which may have been reformatted
+        if name == "extra_vars":
+            current = yaml.safe_load(current or "") or {}
+            desired = json.loads(desired)
+        if _differs(current, desired):
+            changed.append(name)
+    return changed
+
+
+def _secrets(current, desired, path):
+    if current == AWX_ENCRYPTED:
+        return [path]
+    if isinstance(desired, dict) and isinstance(current, dict):
+        return [
+            secret
+            for key, value in desired.items()
+            for secret in _secrets(current.get(key), value, f"{path}.{key}")
+        ]
+    return []
+
+
+def secret_fields(resource, params):
+    """
+    Returns the paths of the fields of the resource that are secret and so cannot be
+    compared with the given params, e.g. ``inputs.password``.
+    """
+    return [
+        secret
+        for name, desired in params.items()
+        for secret in _secrets(getattr(resource, name, None), desired, name)
+    ]
+
+
+class PlannedResource:
+    """
+    Stands in for a resource that would be created when the command is run with
+    ``--dry-run``, so that the resources that depend on it can still be planned.
+    """
+    def __init__(self, name, **fields):
+        self.id = None
+        self.name = name
+        self.summary_fields = {}
+        for key, value in fields.items():
+            setattr(self, key, value)
+
+
+class ExistingResources:
+    """
+    The resources that exist in AWX when the command starts, fetched using one bulk
+    listing for each type of resource so that resources can be found without further
+    requests.
+
+    Args:
+        connection: The AWX connection.
+        names: Mapping of resource type to the names of the resources of that type that
+               the command will look for. Only resources with those names are fetched.
+               Resource types that are not in the mapping, or whose names are ``None``,
+               are fetched in full.
+    """
+    RESOURCE_TYPES = (
+        "credential_types",
+        "credentials",
+        "organisations",
+        "execution_environments",
+        "inventories",
+        "projects",
+        "job_templates",
+    )
+
+    def __init__(self, connection, names = None):
+        self._connection = connection
+        self._names = names or {}
+        resources = concurrency.map_concurrently(self._fetch, self.RESOURCE_TYPES)
+        self._resources = dict(zip(self.RESOURCE_TYPES, resources))
+
+    def _fetch(self, resource_type):
+        params = dict(page_size = PAGE_SIZE)
+        names = self._names.get(resource_type)
+        if names is not None:
+            # There is nothing to find if no resources of this type are required
+            if not names:
+                return []
+            params.update(name__in = ",".join(sorted(names)))
+        return list(getattr(self._connection, resource_type).all(**params))
+
+    def find(self, resource_type, **filters):
+        """
+        Returns the first resource of the given type with the given field values, or
+        ``None`` if there is no such resource.
+        """
+        return next(
+            (
+                resource
+                for resource in self._resources[resource_type]
+                if all(getattr(resource, k, None) == v for k, v in filters.items())
+            ),
+            None
+        )
+
+
+class DependencyGraph:
+    """
+    Runs named tasks, starting each task as soon as all the tasks that it depends on have
+    completed so that independent tasks run concurrently.
+
+    Each task is called with the results of the tasks that it depends on, in order.
+    """
+    def __init__(self):
+        self._tasks = {}
+
+    def add(self, name, func, *dependencies):
+        self._tasks[name] = (func, dependencies)
+        return name
+
+    def run(self, max_workers = MAX_CONCURRENCY):
+        """
+        Runs the tasks and returns a dictionary of the results, raising the first error.
+        """
+        results = {}
+        pending = dict(self._tasks)
+        running = {}
+        with concurrent.futures.ThreadPoolExecutor(max_workers = max_workers) as executor:
+            while pending or running:
+                for name, (func, dependencies) in list(pending.items()):
+                    if all(dependency in results for dependency in dependencies):
+                        del pending[name]
+                        args = [results[dependency] for dependency in dependencies]
+                        running[executor.submit(func, *args)] = name
+                if not running:
+                    raise CommandError(
+                        "Unable to satisfy dependencies for: {}".format(", ".join(pending))
+                    )
+                done, _ = concurrent.futures.wait(
+                    running,
+                    return_when = concurrent.futures.FIRST_COMPLETED
+                )
+                for future in done:
+                    results[running.pop(future)] = future.result()
+        return results
+
+
 class Command(BaseCommand):
     """
     Management command for creating the AWX resources required by Cluster-as-a-Service.
     """
     help = 'Creates AWX resources required by Cluster-as-a-Service.'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action = "store_true",
+            help = "Report the changes that would be made without making them."
+        )
+        parser.add_argument(
+            "--force-secrets",
+            action = "store_true",
+            help = (
+                "Rewrite secret inputs, which cannot be compared with the existing values, "
+                "even when nothing else has changed."
+            )
+        )
+
+    def report(self, action, resource_type, name, fields = ()):
+        """
+        Reports the action for a resource, recording it for the dry-run report if it is
+        a change.
+        """
+        if action == "unchanged":
+            self.stdout.write(f"Found up-to-date {resource_type} '{name}'")
+            return
+        if action == "unverifiable":
+            self.stdout.write(
+                f"Unable to verify secrets for {resource_type} '{name}' "
+                f"({', '.join(fields)}) - use --force-secrets to rewrite them"
+            )
+            with self.changes_lock:
+                self.unverifiable.append((action, resource_type, name, fields))
+            return
+        detail = f" ({', '.join(fields)})" if fields else ""
+        if self.dry_run:
+            self.stdout.write(f"Would {action} {resource_type} '{name}'{detail}")
+        else:
+            self.stdout.write(f"{ACTION_VERBS[action]} {resource_type} '{name}'{detail}")
+        with self.changes_lock:
+            self.changes.append((action, resource_type, name, fields))
+
+    def ensure_resource(self, manager, resource_type, resource, name, params):
+        """
+        Ensures that a resource with the given name and params exists, creating or
+        updating it only if required.
+        """
+        if not resource:
+            self.report("create", resource_type, name)
+            if self.dry_run:
+                return PlannedResource(name, **params)
+            return manager.create(name = name, **params)
+        changed = changed_fields(resource, params)
+        secrets = secret_fields(resource, params)
+        # Secrets are only rewritten along with other changes unless they are forced
+        if secrets and self.force_secrets:
+            changed.extend(secret for secret in secrets if secret not in changed)
+        if changed:
+            self.report("update", resource_type, name, changed)
+            return resource if self.dry_run else resource._update(**params)
+        if secrets:
+            self.report("unverifiable", resource_type, name, secrets)
+        else:
+            self.report("unchanged", resource_type, name)
+        return resource
+
     def wait_for_awx(self, connection):
         """
         Waits for the AWX API to become available before returning.
@@ -181,65 +450,66 @@ class Command(BaseCommand):
                 break
             time.sleep(5)
 
-    def ensure_credential_type(self, connection, ct_spec):
+    def ensure_credential_type(self, connection, existing, ct_spec):
         """
         Ensures that given credential type exists.
         """
-        ct = connection.credential_types.find_by_name(ct_spec['name'])
-        if ct:
-            self.stdout.write(f"Updating credential type '{ct_spec['name']}'")
-            ct = ct._update(**ct_spec)
-        else:
-            self.stdout.write(f"Creating credential type '{ct_spec['name']}'")
-            ct = connection.credential_types.create(**ct_spec)
-        return ct
+        return self.ensure_resource(
+            connection.credential_types,
+            "credential type",
+            existing.find("credential_types", name = ct_spec['name']),
+            ct_spec['name'],
+            { k: v for k, v in ct_spec.items() if k != 'name' }
+        )
 
-    def ensure_credential_types(self, connection):
+    def ensure_credential_types(self, connection, existing):
         """
         Ensures that the credential types that are used by Cluster-as-a-Service exist.
         """
+        credential_types = concurrency.map_concurrently(
+            lambda ct: self.ensure_credential_type(connection, existing, ct),
+            CAAS_CREDENTIAL_TYPES
+        )
         return {
-            ct['name']: self.ensure_credential_type(connection, ct)
-            for ct in CAAS_CREDENTIAL_TYPES
+            ct_spec['name']: ct
+            for ct_spec, ct in zip(CAAS_CREDENTIAL_TYPES, credential_types)
         }
 
-    def ensure_organisation(self, connection):
+    def ensure_organisation(self, connection, existing):
         """
         Ensures that the CaaS organisation exists.
         """
-        organisation = connection.organisations.find_by_name(CAAS_ORGANISATION_NAME)
-        if organisation:
-            self.stdout.write(f"Found existing organisation '{CAAS_ORGANISATION_NAME}'")
-        else:
-            self.stdout.write(f"Creating organisation '{CAAS_ORGANISATION_NAME}'")
-            organisation = connection.organisations.create(name = CAAS_ORGANISATION_NAME)
-        return organisation
+        return self.ensure_resource(
+            connection.organisations,
+            "organisation",
+            existing.find("organisations", name = CAAS_ORGANISATION_NAME),
+            CAAS_ORGANISATION_NAME,
+            {}
+        )
 
-    def ensure_organisation_ee_cred(self, connection, organisation, credentials):
+    def ensure_organisation_ee_cred(self, connection, existing, organisation, credentials):
         """
         Ensures that the registry credential for the CaaS organisation EE exists, if required.
         """
-        ct = connection.credential_types.find_by_kind("registry")
+        ct = existing.find("credential_types", kind = "registry")
         credential_name = f"{CAAS_ORGANISATION_NAME} EE Credential"
-        credential = connection.credentials.find_by_name(credential_name)
-        params = dict(
-            credential_type = ct.id,
-            organization = organisation.id,
-            inputs = dict(
-                host = credentials["HOST"],
-                username = credentials["USERNAME"],
-                password = credentials["TOKEN"]
+        return self.ensure_resource(
+            connection.credentials,
+            "credential",
+            existing.find("credentials", name = credential_name),
+            credential_name,
+            dict(
+                credential_type = ct.id,
+                organization = organisation.id,
+                inputs = dict(
+                    host = credentials["HOST"],
+                    username = credentials["USERNAME"],
+                    password = credentials["TOKEN"]
+                )
             )
         )
-        if credential:
-            self.stdout.write("Updating organisation registry credential")
-            credential = credential._update(**params)
-        else:
-            self.stdout.write("Creating registry credential for organisation")
-            credential = connection.credentials.create(name = credential_name, **params)
-        return credential
 
-    def ensure_organisation_ee(self, connection, organisation):
+    def ensure_organisation_ee(self, connection, existing, organisation):
         """
         Ensures that the execution environment for the CaaS organisation exists, if required.
         """
@@ -248,203 +518,243 @@ class Command(BaseCommand):
             return None
         credentials = cloud_settings.AWX.EXECUTION_ENVIRONMENT.get("CREDENTIALS")
         if credentials:
-            credential = self.ensure_organisation_ee_cred(connection, organisation, credentials)
+            credential = self.ensure_organisation_ee_cred(
+                connection,
+                existing,
+                organisation,
+                credentials
+            )
         else:
             credential = None
         ee_name = f"{CAAS_ORGANISATION_NAME} EE"
-        ee = connection.execution_environments.find_by_name(ee_name)
-        params = dict(
-            image = cloud_settings.AWX.EXECUTION_ENVIRONMENT["IMAGE"],
-            organization = organisation.id,
-            pull = (
-                "always"
-                if cloud_settings.AWX.EXECUTION_ENVIRONMENT.get("ALWAYS_PULL", False)
-                else "missing"
-            ),
-            credential = getattr(credential, "id", None)
+        ee = self.ensure_resource(
+            connection.execution_environments,
+            "execution environment",
+            existing.find("execution_environments", name = ee_name),
+            ee_name,
+            dict(
+                image = cloud_settings.AWX.EXECUTION_ENVIRONMENT["IMAGE"],
+                organization = organisation.id,
+                pull = (
+                    "always"
+                    if cloud_settings.AWX.EXECUTION_ENVIRONMENT.get("ALWAYS_PULL", False)
+                    else "missing"
+                ),
+                credential = getattr(credential, "id", None)
+            )
         )
-        if ee:
-            self.stdout.write(f"Updating execution environment '{ee.name}'")
-            ee = ee._update(**params)
-        else:
-            self.stdout.write(f"Creating execution environment '{ee_name}'")
-            ee = connection.execution_environments.create(name = ee_name, **params)
         # Set the execution environment as the default environment for the org
-        organisation._update(default_environment = ee.id)
+        if ee.id is None:
+            # In a dry run, an execution environment that would be created has no id to
+            # compare, but the organisation would always be updated to use it
+            self.report("update", "organisation", organisation.name, ["default_environment"])
+        else:
+            self.ensure_resource(
+                connection.organisations,
+                "organisation",
+                organisation,
+                organisation.name,
+                dict(default_environment = ee.id)
+            )
         return ee
 
-    def ensure_galaxy_credential(self, connection, organisation):
+    def ensure_galaxy_credential(self, connection, existing, organisation):
         """
         Ensure that the organisation has a Galaxy credential.
 
         This is important to allow roles to be downloaded.
         """
         # Get the galaxy credential type
-        galaxy_ct = connection.credential_types.find_by_kind("galaxy")
+        galaxy_ct = existing.find("credential_types", kind = "galaxy")
         # Get the galaxy credential associated with the org
-        credential = next(
-            connection.credentials.all(
-                organization = organisation.id,
-                credential_type = galaxy_ct.id
-            ),
-            None
-        )
+        # The existing credentials are only those with known names, so query for it
+        if organisation.id:
+            credential = next(
+                connection.credentials.all(
+                    organization = organisation.id,
+                    credential_type = galaxy_ct.id
+                ),
+                None
+            )
+        else:
+            credential = None
         if credential:
-            self.stdout.write("Found existing Galaxy credential for organisation")
+            self.report("unchanged", "Galaxy credential", credential.name)
         else:
-            self.stdout.write("Creating Galaxy credential for organisation")
-            credential = connection.credentials.create(
-                name = f"{CAAS_ORGANISATION_NAME} Galaxy Credential",
-                credential_type = galaxy_ct.id,
-                organization = organisation.id,
-                inputs = dict(url = "https://galaxy.ansible.com")
+            credential = self.ensure_resource(
+                connection.credentials,
+                "Galaxy credential",
+                None,
+                f"{CAAS_ORGANISATION_NAME} Galaxy Credential",
+                dict(
+                    credential_type = galaxy_ct.id,
+                    organization = organisation.id,
+                    inputs = dict(url = "https://galaxy.ansible.com")
+                )
             )
         # Weirdly, although the credential is created under the organisation, we also
         # need to make this association
-        connection.api_post(
-            f"/organizations/{organisation.id}/galaxy_credentials/",
-            json = dict(id = credential.id)
-        )
+        if organisation.id and credential.id:
+            response = connection.api_get(f"/organizations/{organisation.id}/galaxy_credentials/")
+            associated = { c["id"] for c in response.json()["results"] }
+        else:
+            associated = set()
+        if credential.id in associated:
+            return credential
+        self.report("associate", "Galaxy credential", credential.name, ["organisation"])
+        if not self.dry_run:
+            connection.api_post(
+                f"/organizations/{organisation.id}/galaxy_credentials/",
+                json = dict(id = credential.id)
+            )
         return credential
 
-    def ensure_caas_deploy_keypair(self, connection, organisation, ct):
+    def ensure_caas_deploy_keypair(self, connection, existing, organisation, credential_types):
         """
         Ensure that a CaaS deploy keypair with the expected name exists.
         """
-        credential = connection.credentials.find_by_name(CAAS_DEPLOY_KEYPAIR_CREDENTIAL_NAME)
+        credential = existing.find("credentials", name = CAAS_DEPLOY_KEYPAIR_CREDENTIAL_NAME)
         if credential:
-            self.stdout.write("Found existing CaaS deploy keypair credential")
-        else:
-            self.stdout.write("Generating ed25519 key pair")
-            # Generate a keypair to use
-            keypair = Ed25519PrivateKey.generate()
-            private_key = (
-                keypair
-                    .private_bytes(Encoding.PEM, PrivateFormat.OpenSSH, NoEncryption())
-                    .decode()
-            )
-            public_key = (
-                keypair
-                    .public_key()
-                    .public_bytes(Encoding.OpenSSH, PublicFormat.OpenSSH)
-                    .decode()
-            )
-            self.stdout.write("Creating CaaS deploy keypair credential")
-            credential = connection.credentials.create(
-                name = CAAS_DEPLOY_KEYPAIR_CREDENTIAL_NAME,
-                credential_type = ct.id,
-                organization = organisation.id,
-                inputs = dict(public_key = public_key, private_key = private_key)
-            )
-        return credential
+            # The keypair is never changed once it has been generated
+            self.report("unchanged", "credential", CAAS_DEPLOY_KEYPAIR_CREDENTIAL_NAME)
+            return credential
+        self.report("create", "credential", CAAS_DEPLOY_KEYPAIR_CREDENTIAL_NAME)
+        if self.dry_run:
+            return PlannedResource(CAAS_DEPLOY_KEYPAIR_CREDENTIAL_NAME)
+        self.stdout.write("Generating ed25519 key pair")
+        # Generate a keypair to use
+        keypair = Ed25519PrivateKey.generate()
+        private_key = (
+            keypair
+                .private_bytes(Encoding.PEM, PrivateFormat.OpenSSH, NoEncryption())
+                .decode()
+        )
+        public_key = (
+            keypair
+                .public_key()
+                .public_bytes(Encoding.OpenSSH, PublicFormat.OpenSSH)
+                .decode()
+        )
+        return connection.credentials.create(
+            name = CAAS_DEPLOY_KEYPAIR_CREDENTIAL_NAME,
+            credential_type = credential_types[CAAS_DEPLOY_KEYPAIR_CREDENTIAL_NAME].id,
+            organization = organisation.id,
+            inputs = dict(public_key = public_key, private_key = private_key)
+        )
 
-    def ensure_template_inventory(self, connection, organisation):
+    def ensure_template_inventory(self, connection, existing, organisation):
         """
         Ensures that the template inventory used by Cluster-as-a-Service exists.
         """
         inventory_name = cloud_settings.AWX.TEMPLATE_INVENTORY
         # Ensure that the template inventory exists and is in the correct organisation
-        inventory = connection.inventories.find_by_name(inventory_name)
-        if inventory:
-            self.stdout.write(f"Updating inventory '{inventory_name}'")
-            # Make sure the inventory is in the correct organisation
-            inventory = inventory._update(organization = organisation.id)
-        else:
-            self.stdout.write(f"Creating inventory '{inventory_name}'")
-            inventory = connection.inventories.create(
-                name = inventory_name,
-                organization = organisation.id
-            )
-        # Create the openstack group
-        group = inventory.groups.find_by_name('openstack')
-        if group:
-            self.stdout.write("Found existing inventory group 'openstack'")
-        else:
-            self.stdout.write("Creating inventory group 'openstack'")
-            group = inventory.groups.create(name = 'openstack')
+        inventory = self.ensure_resource(
+            connection.inventories,
+            "inventory",
+            existing.find("inventories", name = inventory_name),
+            inventory_name,
+            dict(organization = organisation.id)
+        )
+        # Create the openstack group
+        # In a dry run, a new inventory has no groups or hosts to look for
+        group = self.ensure_resource(
+            getattr(inventory, "groups", None),
+            "inventory group",
+            inventory.groups.find_by_name('openstack') if inventory.id else None,
+            'openstack',
+            {}
+        )
         # Create localhost in the inventory and group
-        localhost = group.hosts.find_by_name("localhost")
-        if localhost:
-            self.stdout.write("Found existing localhost for inventory")
-        else:
-            self.stdout.write("Creating localhost for inventory")
-            localhost = group.hosts.create(name = "localhost", inventory = inventory.id)
+        localhost = self.ensure_resource(
+            getattr(group, "hosts", None),
+            "inventory host",
+            group.hosts.find_by_name("localhost") if group.id else None,
+            "localhost",
+            dict(inventory = inventory.id)
+        )
         # Update the variables associated with localhost
-        self.stdout.write("Updating inventory variables for localhost")
-        localhost.variable_data._update(
-            dict(
-                ansible_host = '127.0.0.1',
-                ansible_connection = 'local',
-                ansible_python_interpreter = '{{ ansible_playbook_python }}',
-            )
+        variables = dict(
+            ansible_host = '127.0.0.1',
+            ansible_connection = 'local',
+            ansible_python_interpreter = '{{ ansible_playbook_python }}',
         )
+        current = localhost.variable_data._as_dict() if localhost.id else {}
+        if _differs(current, variables):
+            self.report("update", "inventory host variables", "localhost")
+            if not self.dry_run:
+                localhost.variable_data._update(variables)
+        return inventory
 
-    def ensure_extra_credential(self, connection, organisation, credential_types, cred_spec):
+    def ensure_extra_credential(
+        self,
+        connection,
+        existing,
+        organisation,
+        credential_types,
+        cred_spec
+    ):
         """
         Ensure that the specified extra credential exists.
         """
-        # Try to find the credential type from the name
-        credential = connection.credentials.find_by_name(cred_spec['NAME'])
-        params = dict(
-            credential_type = credential_types[cred_spec['TYPE']].id,
-            organization = organisation.id,
-            inputs = cred_spec['INPUTS']
+        return self.ensure_resource(
+            connection.credentials,
+            "credential",
+            existing.find("credentials", name = cred_spec['NAME']),
+            cred_spec['NAME'],
+            dict(
+                credential_type = credential_types[cred_spec['TYPE']].id,
+                organization = organisation.id,
+                inputs = cred_spec['INPUTS']
+            )
         )
-        if credential:
-            self.stdout.write(f"Updating credential '{credential.name}'")
-            credential = credential._update(**params)
-        else:
-            self.stdout.write(f"Creating credential '{cred_spec['NAME']}'")
-            credential = connection.credentials.create(name = cred_spec['NAME'], **params)
-        return credential
 
-    def ensure_extra_credentials(self, connection, organisation, credential_types):
+    def ensure_extra_credentials(self, connection, existing, organisation, credential_types):
         """
         Ensure that any extra credentials that are configured exist.
         """
-        return [
-            self.ensure_extra_credential(connection, organisation, credential_types, cred_spec)
-            for cred_spec in cloud_settings.AWX.EXTRA_CREDENTIALS
-        ]
+        return concurrency.map_concurrently(
+            lambda cred_spec: self.ensure_extra_credential(
+                connection,
+                existing,
+                organisation,
+                credential_types,
+                cred_spec
+            ),
+            cloud_settings.AWX.EXTRA_CREDENTIALS
+        )
 
-    def ensure_project(self, connection, organisation, project_spec):
+    def ensure_project(self, connection, existing, project_spec, organisation):
         """
-        Ensure that the given project exists.
+        Ensure that the given project exists and has synced successfully.
         """
-        project = connection.projects.find_by_name(project_spec['NAME'])
-        params = dict(
-            scm_type = 'git',
-            scm_url = project_spec['GIT_URL'],
-            scm_branch = project_spec['GIT_VERSION'],
-            organization = organisation.id,
-            scm_update_on_launch = project_spec.get('ALWAYS_UPDATE', False)
+        project = self.ensure_resource(
+            connection.projects,
+            "project",
+            existing.find("projects", name = project_spec['NAME']),
+            project_spec['NAME'],
+            dict(
+                scm_type = 'git',
+                scm_url = project_spec['GIT_URL'],
+                scm_branch = project_spec['GIT_VERSION'],
+                organization = organisation.id,
+                scm_update_on_launch = project_spec.get('ALWAYS_UPDATE', False)
+            )
         )
-        if project:
-            self.stdout.write(f"Updating project '{project.name}'")
-            project = project._update(**params)
-        else:
-            self.stdout.write(f"Creating project '{project_spec['NAME']}'")
-            project = connection.projects.create(name = project_spec['NAME'], **params)
+        if self.dry_run:
+            return project
         # Wait for the project to move into the successful state
-        self.stdout.write(f"Waiting for project to become available...")
+        # Each project waits in its own task, so projects sync in parallel
+        if project.status != "successful":
+            self.stdout.write(f"Waiting for project '{project.name}' to become available...")
         while project.status != "successful":
             time.sleep(3)
             project = connection.projects.get(project.id, force = True)
         return project
 
-    def ensure_projects(self, connection, organisation):
-        """
-        Ensure that the configured projects exist.
-        """
-        # Return (project_spec, project) pairs so we have access to the spec later
-        return [
-            (project_spec, self.ensure_project(connection, organisation, project_spec))
-            for project_spec in cloud_settings.AWX.DEFAULT_PROJECTS
-        ]
-
     def ensure_job_template_for_playbook(
         self,
         connection,
+        existing,
         project_spec,
         project,
         playbook,
@@ -453,12 +763,8 @@ class Command(BaseCommand):
         """
         Ensures that a job template exists for the given project and playbook.
         """
-        # Sanitise any weird characters in the playbook name
-        template_name = re.sub(
-            '[^a-zA-Z0-9-]+',
-            '-',
-            playbook.removesuffix('.yml').removesuffix('.yaml')
-        )
+        template_name = job_template_name(playbook)
+        self.claim_job_template_name(template_name, project_spec['NAME'])
         # Work out what extra vars we should use for the job template
         # Start with the common extra vars
         extra_vars_spec = project_spec.get('EXTRA_VARS', {})
@@ -474,44 +780,69 @@ class Command(BaseCommand):
         )
         # The metadata file should be named after the playbook
         metadata_url = f"{metadata_root}/{playbook}"
-        job_template = connection.job_templates.find_by_name(template_name)
-        params = dict(
-            description = metadata_url,
-            job_type = 'run',
-            project = project.id,
-            playbook = playbook,
-            extra_vars = json.dumps(extra_vars),
-            # We will add the deploy keypair as a default credential,
-            # but also allow extra credentials to be added
-            ask_credential_on_launch = True,
-            ask_inventory_on_launch = True,
-            # As well as the extra vars for the template, we allow per-job variables
-            ask_variables_on_launch = True,
-            allow_simultaneous = True
-        )
-        if job_template:
-            self.stdout.write(f"Updating job template '{template_name}'")
-            job_template = job_template._update(**params)
-        else:
-            self.stdout.write(f"Creating job template '{template_name}'")
-            job_template = connection.job_templates.create(name = template_name, **params)
-        existing_creds = [c['id'] for c in job_template.summary_fields['credentials']]
+        job_template = self.ensure_resource(
+            connection.job_templates,
+            "job template",
+            existing.find("job_templates", name = template_name),
+            template_name,
+            dict(
+                description = metadata_url,
+                job_type = 'run',
+                project = project.id,
+                playbook = playbook,
+                extra_vars = json.dumps(extra_vars),
+                # We will add the deploy keypair as a default credential,
+                # but also allow extra credentials to be added
+                ask_credential_on_launch = True,
+                ask_inventory_on_launch = True,
+                # As well as the extra vars for the template, we allow per-job variables
+                ask_variables_on_launch = True,
+                allow_simultaneous = True
+            )
+        )
+        existing_creds = [
+            c['id']
+            for c in job_template.summary_fields.get('credentials', [])
+        ]
         # Update credential associations where required
-        unassociated_creds = [c for c in credentials if c.id not in existing_creds]
+        unassociated_creds = [
+            c
+            for c in credentials
+            if c.id is None or c.id not in existing_creds
+        ]
         for cred in unassociated_creds:
-            self.stdout.write(f"Associating credential '{cred.name}' with job template")
-            connection.api_post(
-                f"/job_templates/{job_template.id}/credentials/",
-                json = dict(id = cred.id)
-            )
+            self.report("associate", "credential", cred.name, [f"job template '{template_name}'"])
+            if not self.dry_run:
+                connection.api_post(
+                    f"/job_templates/{job_template.id}/credentials/",
+                    json = dict(id = cred.id)
+                )
         return job_template
 
+    def claim_job_template_name(self, template_name, project_name):
+        """
+        Records that the job template with the given name is for the given project, raising
+        an error if it is already claimed by another project.
+
+        This catches clashes between playbooks that are only discovered once a project has
+        synced, which cannot be detected up front.
+        """
+        with self.changes_lock:
+            claimed_by = self.job_template_names.setdefault(template_name, project_name)
+        if claimed_by != project_name:
+            raise CommandError(
+                f"Job template '{template_name}' is required by projects "
+                f"'{claimed_by}' and '{project_name}'"
+            )
+
     def ensure_job_templates_for_project(
         self,
         connection,
+        existing,
         project_spec,
         project,
-        credentials
+        deploy_keypair_cred,
+        extra_credentials
     ):
         """
         Ensures that a job template exists for each playbook in a project.
@@ -519,55 +850,151 @@ class Command(BaseCommand):
         self.stdout.write(f"Creating or updating job templates for '{project.name}'")
         if 'PLAYBOOKS' in project_spec:
             playbooks = project_spec['PLAYBOOKS']
+        elif project.id is None:
+            self.stdout.write(
+                f"Playbooks for project '{project.name}' are not known until it is created"
+            )
+            return []
         else:
             self.stdout.write(f"Fetching playbooks for project '{project.name}'")
             playbooks = project.playbooks._fetch()
         self.stdout.write(f"Using playbooks: {playbooks}")
-        return [
-            self.ensure_job_template_for_playbook(
+        credentials = [deploy_keypair_cred, *extra_credentials]
+        return concurrency.map_concurrently(
+            lambda playbook: self.ensure_job_template_for_playbook(
                 connection,
+                existing,
                 project_spec,
                 project,
                 playbook,
                 credentials
-            )
-            for playbook in playbooks
-        ]
+            ),
+            playbooks
+        )
 
-    def ensure_job_templates(self, connection, projects, credentials):
+    def write_report(self):
         """
-        Ensure that a job template exists for each playbook in each project.
+        Writes the changes that would be made by the command.
         """
-        return [
-            job_template
-            for (project_spec, project) in projects
-            for job_template in self.ensure_job_templates_for_project(
-                connection,
-                project_spec,
-                project,
-                credentials
+        if self.changes:
+            self.stdout.write(f"Dry run complete - {len(self.changes)} changes required:")
+        else:
+            self.stdout.write("Dry run complete - no changes required")
+        for action, resource_type, name, fields in self.changes:
+            detail = f" ({', '.join(fields)})" if fields else ""
+            self.stdout.write(f"  {ACTION_SYMBOLS[action]} {resource_type} '{name}'{detail}")
+        if self.unverifiable:
+            self.stdout.write(
+                "Secrets that cannot be verified (use --force-secrets to rewrite them):"
+            )
+        for action, resource_type, name, fields in self.unverifiable:
+            self.stdout.write(
+                f"  {ACTION_SYMBOLS[action]} {resource_type} '{name}' ({', '.join(fields)})"
             )
-        ]
+
+    def required_names(self):
+        """
+        Returns the names of the resources that the command will look for, raising an
+        error if two projects would use the same job template name.
+        """
+        credential_names = {
+            CAAS_DEPLOY_KEYPAIR_CREDENTIAL_NAME,
+            f"{CAAS_ORGANISATION_NAME} EE Credential",
+            *(cred_spec['NAME'] for cred_spec in cloud_settings.AWX.EXTRA_CREDENTIALS),
+        }
+        template_names = set()
+        playbooks_known = True
+        for project_spec in cloud_settings.AWX.DEFAULT_PROJECTS:
+            for playbook in project_spec.get('PLAYBOOKS', []):
+                template_name = job_template_name(playbook)
+                self.claim_job_template_name(template_name, project_spec['NAME'])
+                template_names.add(template_name)
+            playbooks_known = playbooks_known and 'PLAYBOOKS' in project_spec
+        return dict(
+            inventories = { cloud_settings.AWX.TEMPLATE_INVENTORY },
+            credentials = credential_names,
+            projects = { p['NAME'] for p in cloud_settings.AWX.DEFAULT_PROJECTS },
+            # If the playbooks for a project are not known until it has synced, the job
+            # templates cannot be filtered by name
+            job_templates = template_names if playbooks_known else None
+        )
 
     def handle(self, *args, **options):
+        self.dry_run = options["dry_run"]
+        self.force_secrets = options["force_secrets"]
+        self.changes = []
+        # Resources with secrets that cannot be compared, which are not rewritten
+        self.unverifiable = []
+        self.changes_lock = threading.Lock()
+        # Map of job template name -> the name of the project that it is for
+        self.job_template_names = {}
         connection = api.Connection(
             cloud_settings.AWX.URL,
             cloud_settings.AWX.ADMIN_USERNAME,
             cloud_settings.AWX.ADMIN_PASSWORD,
             cloud_settings.AWX.VERIFY_SSL
         )
+        # Work out the names to look for first, so that clashes are reported straight away
+        names = self.required_names()
         self.wait_for_awx(connection)
-        credential_types = self.ensure_credential_types(connection)
-        organisation = self.ensure_organisation(connection)
-        self.ensure_organisation_ee(connection, organisation)
-        self.ensure_galaxy_credential(connection, organisation)
-        deploy_keypair_cred = self.ensure_caas_deploy_keypair(
-            connection,
-            organisation,
-            credential_types[CAAS_DEPLOY_KEYPAIR_CREDENTIAL_NAME]
-        )
-        self.ensure_template_inventory(connection, organisation)
-        credentials = self.ensure_extra_credentials(connection, organisation, credential_types)
-        credentials.insert(0, deploy_keypair_cred)
-        projects = self.ensure_projects(connection, organisation)
-        self.ensure_job_templates(connection, projects, credentials)
+        # Fetch the existing resources up front, so that unchanged resources can be skipped
+        self.stdout.write("Fetching existing resources...")
+        existing = ExistingResources(connection, names)
+        # Each resource is ensured as soon as the resources that it depends on are ready
+        graph = DependencyGraph()
+        graph.add(
+            "credential_types",
+            functools.partial(self.ensure_credential_types, connection, existing)
+        )
+        graph.add(
+            "organisation",
+            functools.partial(self.ensure_organisation, connection, existing)
+        )
+        graph.add(
+            "execution_environment",
+            functools.partial(self.ensure_organisation_ee, connection, existing),
+            "organisation"
+        )
+        graph.add(
+            "galaxy_credential",
+            functools.partial(self.ensure_galaxy_credential, connection, existing),
+            "organisation"
+        )
+        graph.add(
+            "deploy_keypair",
+            functools.partial(self.ensure_caas_deploy_keypair, connection, existing),
+            "organisation",
+            "credential_types"
+        )
+        graph.add(
+            "template_inventory",
+            functools.partial(self.ensure_template_inventory, connection, existing),
+            "organisation"
+        )
+        graph.add(
+            "extra_credentials",
+            functools.partial(self.ensure_extra_credentials, connection, existing),
+            "organisation",
+            "credential_types"
+        )
+        for project_spec in cloud_settings.AWX.DEFAULT_PROJECTS:
+            project = graph.add(
+                f"project:{project_spec['NAME']}",
+                functools.partial(self.ensure_project, connection, existing, project_spec),
+                "organisation"
+            )
+            graph.add(
+                f"job_templates:{project_spec['NAME']}",
+                functools.partial(
+                    self.ensure_job_templates_for_project,
+                    connection,
+                    existing,
+                    project_spec
+                ),
+                project,
+                "deploy_keypair",
+                "extra_credentials"
+            )
+        graph.run()
+        if self.dry_run:
+            self.write_report()
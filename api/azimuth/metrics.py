@@ -0,0 +1,99 @@
+"""
+Module containing helpers for publishing application metrics.
+
+Metrics are sent to the same statsd server as the gunicorn metrics, if one is configured,
+using the ``azimuth`` namespace under the gunicorn prefix. Counters are also kept in the
+process so that they can be inspected without a statsd server.
+"""
+
+import collections
+import contextlib
+import logging
+import os
+import socket
+import threading
+import time
+
+
+logger = logging.getLogger(__name__)
+
+
+_lock = threading.Lock()
+_counters = collections.Counter()
+_socket = None
+_address = None
+_prefix = "{}.azimuth".format(os.environ.get("GUNICORN_STATSD_PREFIX", "azimuth-api"))
+
+
+def _get_address():
+    """
+    Returns the address of the statsd server, or ``None`` if none is configured.
+    """
+    global _socket, _address
+    if _address is None:
+        with _lock:
+            if _address is None:
+                host = os.environ.get("GUNICORN_STATSD_HOST")
+                if host:
+                    hostname, _, port = host.rpartition(":")
+                    _socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                    _address = (hostname or "localhost", int(port))
+                else:
+                    _address = False
+    return _address
+
+
+def _send(name, value, metric_type):
+    address = _get_address()
+    if not address:
+        return
+    try:
+        _socket.sendto(f"{_prefix}.{name}:{value}|{metric_type}".encode(), address)
+    except OSError:
+        # Metrics are best effort, so never fail a request because of them
+        logger.debug("Failed to send metric '%s'", name, exc_info = True)
+
+
+def increment(name, value = 1):
+    """
+    Increments the named counter by the given value.
+    """
+    with _lock:
+        _counters[name] += value
+    _send(name, value, "c")
+
+
+def gauge(name, value):
+    """
+    Sets the named gauge to the given value.
+    """
+    _send(name, value, "g")
+
+
+def timing(name, seconds):
+    """
+    Records a duration, in seconds, for the named timer.
+    """
+    _send(name, int(seconds * 1000), "ms")
+
+
+@contextlib.contextmanager
+def timer(name):
+    """
+    Context manager that records the duration of the block for the named timer.
+
+    Can also be used as a decorator.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timing(name, time.perf_counter() - start)
+
+
+def counters(prefix = ""):
+    """
+    Returns a snapshot of the counters in this process whose names begin with the prefix.
+    """
+    with _lock:
+        return { k: v for k, v in _counters.items() if k.startswith(prefix) }
@@ -160,6 +160,15 @@ class ScopedSession:
             "Operation not supported for provider '{}'".format(self.provider_name)
         )
 
+    def recent_quotas(self) -> Iterable[dto.Quota]:
+        """
+        Returns quota information for the tenancy that may be slightly out of date, e.g.
+        from a snapshot taken by a recent call to :py:meth:`quotas`.
+
+        By default, this just returns the current quotas.
+        """
+        return self.quotas()
+
     def images(self) -> Iterable[dto.Image]:
         """
         Lists the images available to the tenancy.
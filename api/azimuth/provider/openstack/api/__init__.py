@@ -1,3 +1,3 @@
-from .core import Connection, ServiceNotSupported
+from .core import Connection, ServiceNotSupported, TransportPool
 # Import the modules for each of the services
 from . import block_store, coe, compute, identity, image, network, orchestration, share
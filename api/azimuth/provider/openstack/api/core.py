@@ -2,18 +2,237 @@
 Module containing helpers for interacting with the OpenStack API.
 """
 
+import functools
 import json
 import logging
+import queue
+import threading
+import time
 from urllib.parse import urlsplit
 
+import dateutil.parser
+
 import requests
 
 import rackit
 
+from .... import metrics
+
 
 logger = logging.getLogger(__name__)
 
 
+def _grow_pool(pool, maxsize):
+    """
+    Grows the given urllib3 connection pool in place so that it keeps up to ``maxsize``
+    connections, without discarding the connections that it already holds.
+    """
+    pool_queue = pool.pool
+    if pool_queue is None:
+        # The pool has been closed
+        return
+    with pool_queue.mutex:
+        extra = maxsize - pool_queue.maxsize
+        if extra <= 0:
+            return
+        pool_queue.maxsize = maxsize
+    # urllib3 represents a slot for a connection that has not been opened yet as None
+    for _ in range(extra):
+        try:
+            pool_queue.put_nowait(None)
+        except queue.Full:
+            # Connections were returned to the pool in the meantime
+            break
+
+
+class PooledHTTPAdapter(requests.adapters.HTTPAdapter):
+    """
+    HTTP adapter whose connection pool is shared by many sessions.
+
+    Closing a session that the adapter is mounted on does not close the adapter.
+    """
+    def __init__(self, transport, service, **kwargs):
+        self.transport = transport
+        # The services whose endpoints are on the host that the adapter is for
+        self.services = frozenset({service})
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        # Keep the counts for pools that are evicted, so that the statistics are not reset
+        pools = self.poolmanager.pools
+        dispose = pools.dispose_func
+        def dispose_func(pool):
+            self.transport.retire_pool(self, pool)
+            if dispose:
+                dispose(pool)
+        pools.dispose_func = dispose_func
+
+    @property
+    def label(self):
+        """
+        The label for the adapter in the statistics, which names all the services that
+        share the host.
+        """
+        return "+".join(sorted(self.services))
+
+    def add_service(self, service, pool_maxsize):
+        """
+        Records that the given service shares the host, growing the pool if the service
+        needs more connections than the pool currently keeps.
+        """
+        # The set is replaced rather than modified, as it is read without the lock
+        self.services = self.services | {service}
+        if pool_maxsize <= self._pool_maxsize:
+            return
+        self._pool_maxsize = pool_maxsize
+        pools = self.poolmanager.pools
+        if len(pools) == 0:
+            # No requests have been made to the host yet, so the pool can just be created
+            # with the new size
+            # The size is part of the key for a pool, so it must not be changed once the
+            # pool exists or the pool would be replaced
+            self.poolmanager.connection_pool_kw["maxsize"] = pool_maxsize
+        else:
+            # Grow the pools that are in use without losing their connections
+            for key in pools.keys():
+                try:
+                    _grow_pool(pools[key], pool_maxsize)
+                except KeyError:
+                    # The pool was evicted since we listed the keys
+                    continue
+
+    def send(self, request, **kwargs):
+        try:
+            return super().send(request, **kwargs)
+        finally:
+            self.transport.maybe_publish_stats()
+
+    def close(self):
+        # The adapter is shared with other sessions, so the pool is left open
+        pass
+
+    def stats(self):
+        """
+        Returns the number of requests made and connections opened by the adapter.
+        """
+        num_requests, num_connections = self.transport.retired_counts(self)
+        pools = self.poolmanager.pools
+        for key in pools.keys():
+            try:
+                pool = pools[key]
+            except KeyError:
+                # The pool was evicted since we listed the keys
+                continue
+            num_requests += pool.num_requests
+            num_connections += pool.num_connections
+        return dict(requests = num_requests, connections = num_connections)
+
+
+class TransportPool:
+    """
+    Process-wide pool of HTTP transports that allows connections to OpenStack services to
+    be kept alive and reused across requests, rather than being opened for each request.
+
+    There is one adapter, and hence one connection pool, for each combination of endpoint
+    host and SSL verification setting. The auth for each request is still provided by the
+    :py:class:`Connection` that the request is made with. When several services have
+    endpoints on the same host, the pool for the host keeps as many connections as the
+    largest of the sizes for those services, and the statistics for the host are reported
+    under a label naming all of them, e.g. ``compute+image``.
+
+    Args:
+        pool_maxsize: The default number of connections to keep for each endpoint host.
+        service_pool_maxsize: Mapping of catalog type to the number of connections to keep
+                              for the endpoint host of that service, e.g. ``{"compute": 20}``.
+        stats_interval: The minimum interval in seconds between publishing the connection
+                        reuse statistics.
+    """
+    def __init__(self, pool_maxsize = 10, service_pool_maxsize = None, stats_interval = 60):
+        self.pool_maxsize = pool_maxsize
+        self.service_pool_maxsize = service_pool_maxsize or {}
+        self.stats_interval = stats_interval
+        self._adapters = {}
+        self._lock = threading.Lock()
+        # Map of adapter -> (requests, connections) for the pools that the adapter has
+        # discarded, which are included in the statistics for the adapter
+        self._retired = {}
+        self._retired_lock = threading.Lock()
+        self._published = {}
+        self._published_at = time.monotonic()
+
+    def mount(self, session, url, service):
+        """
+        Mounts the shared adapter for the host of the given URL on the given session.
+        """
+        base_url = urlsplit(url)._replace(path = '', query = '', fragment = '').geturl()
+        key = (base_url, session.verify)
+        adapter = self._adapters.get(key)
+        if not adapter or service not in adapter.services:
+            with self._lock:
+                adapter = self._adapters.get(key)
+                pool_maxsize = self.service_pool_maxsize.get(service, self.pool_maxsize)
+                if not adapter:
+                    adapter = PooledHTTPAdapter(self, service, pool_maxsize = pool_maxsize)
+                    self._adapters[key] = adapter
+                elif service not in adapter.services:
+                    adapter.add_service(service, pool_maxsize)
+        # Use a trailing slash so that the prefix cannot match a different port
+        session.mount(f"{base_url}/", adapter)
+
+    def retire_pool(self, adapter, pool):
+        """
+        Records the counts for a pool that is being discarded by the given adapter.
+        """
+        with self._retired_lock:
+            num_requests, num_connections = self._retired.get(adapter, (0, 0))
+            self._retired[adapter] = (
+                num_requests + pool.num_requests,
+                num_connections + pool.num_connections
+            )
+
+    def retired_counts(self, adapter):
+        """
+        Returns the ``(requests, connections)`` for the pools discarded by the given adapter.
+        """
+        with self._retired_lock:
+            return self._retired.get(adapter, (0, 0))
+
+    def stats(self):
+        """
+        Returns the connection reuse statistics for each service, or group of services
+        that share a host.
+        """
+        stats = {}
+        for adapter in list(self._adapters.values()):
+            service_stats = stats.setdefault(adapter.label, dict(requests = 0, connections = 0))
+            for name, value in adapter.stats().items():
+                service_stats[name] += value
+        for service_stats in stats.values():
+            service_stats["reused"] = max(service_stats["requests"] - service_stats["connections"], 0)
+        return stats
+
+    def maybe_publish_stats(self):
+        """
+        Publishes the changes in the statistics since they were last published, if the
+        stats interval has elapsed.
+        """
+        now = time.monotonic()
+        if now - self._published_at < self.stats_interval:
+            return
+        with self._lock:
+            if now - self._published_at < self.stats_interval:
+                return
+            self._published_at = now
+            previous, self._published = self._published, self.stats()
+        for service, service_stats in self._published.items():
+            for name, value in service_stats.items():
+                delta = value - previous.get(service, {}).get(name, 0)
+                if delta > 0:
+                    metrics.increment(f"http_pool.{service}.{name}", delta)
+        logger.debug("HTTP connection pool statistics: %s", self._published)
+
+
 class UnmanagedResourceOptions(rackit.resource.Options):
     def __init__(self, options = None):
         options = options or dict()
@@ -190,46 +409,68 @@ class Connection(rackit.Connection):
     """
     projects = rackit.RootResource(AuthProject)
 
-    def __init__(self, auth_url, token, interface = 'public', verify = True):
+    def __init__(self, auth_url,
+                       token,
+                       interface = 'public',
+                       verify = True,
+                       token_data = None,
+                       token_store = None,
+                       transport = None):
         # Store the given parameters, as it is sometimes useful to be able to query them later
         self.auth_url = auth_url.rstrip('/')
         self.token = token
         self.interface = interface
         self.verify = verify
+        # The token store, if given, is used to reuse project-scoped tokens
+        # It must have methods get(token, project_id) -> (scoped_token, token_data) | None,
+        # set(token, project_id, scoped_token, token_data) and delete(token, project_id)
+        self.token_store = token_store
+        # If the token was taken from the token store, this is a callable that discards it
+        # and issues a new token for the project, which is used if the token is rejected
+        self.reissue_token = None
+        # The transport, if given, is a TransportPool providing shared connection pools
+        self.transport = transport
 
         # Configure the session
         session = requests.Session()
         # This object is the auth object for the session
         session.auth = self
         session.verify = verify
+        if transport:
+            transport.mount(session, self.auth_url, 'identity')
 
         # Once the superclass init is called, we can use the api_{} methods
         super().__init__(auth_url, session)
 
-        # Confirm whether the token is still valid
+        # If we were not given the token data from a previous validation, confirm whether
+        # the token is still valid
         # If this returns anything other than a 200, close the session
-        try:
-            response = self.api_get('/auth/tokens', headers = { 'X-Subject-Token': token })
-        except rackit.ApiError:
-            session.close()
-            raise
-
-        # Extract information about the user and project from the response
-        json = response.json()
-        self.auth_method = json['token']['methods'][0]
-        user = json['token']['user']
+        if token_data is None:
+            try:
+                response = self.api_get('/auth/tokens', headers = { 'X-Subject-Token': token })
+            except rackit.ApiError:
+                session.close()
+                raise
+            token_data = response.json()['token']
+        # Keep the token data so that it can be reused without revalidating the token
+        self.token_data = token_data
+
+        # Extract information about the user and project from the token data
+        self.auth_method = token_data['methods'][0]
+        self.expires_at = dateutil.parser.isoparse(token_data['expires_at'])
+        user = token_data['user']
         self.user_id = user['id']
         self.username = user['name']
         self.domain_id = user['domain']['id']
         self.domain_name = user['domain']['name']
-        project = json['token'].get('project', {})
+        project = token_data.get('project', {})
         self.project_id = project.get('id')
         self.project_name = project.get('name')
-        self.roles = json['token'].get('roles', [])
+        self.roles = token_data.get('roles', [])
 
         # Extract the endpoints from the catalog on the correct interface
         self.endpoints = {}
-        for entry in json['token'].get('catalog', []):
+        for entry in token_data.get('catalog', []):
             # Find the endpoint on the specified interface
             try:
                 endpoint = next(
@@ -241,6 +482,8 @@ class Connection(rackit.Connection):
                 continue
             # Strip any path component from the endpoint
             self.endpoints[entry['type']] = urlsplit(endpoint)._replace(path = '').geturl()
+            if transport:
+                transport.mount(session, self.endpoints[entry['type']], entry['type'])
 
     def __call__(self, request):
         # This is what allows the connection to be used as a requests auth
@@ -249,8 +492,63 @@ class Connection(rackit.Connection):
             request.headers['X-Auth-Token'] = self.token
         except AttributeError:
             pass
+        if self.reissue_token:
+            request.register_hook('response', self.handle_unauthorized)
         return request
 
+    def handle_unauthorized(self, response, **kwargs):
+        """
+        Response hook that replaces a reused scoped token that has been rejected, e.g.
+        because it was revoked, and retries the request once with the new token.
+        """
+        if response.status_code != 401 or not self.reissue_token:
+            return response
+        reissue_token, self.reissue_token = self.reissue_token, None
+        logger.info("Stored token for project '%s' was rejected - reissuing", self.project_id)
+        try:
+            self.token, self.token_data = reissue_token()
+        except rackit.ApiError:
+            logger.exception("Failed to reissue token for project '%s'", self.project_id)
+            return response
+        self.expires_at = dateutil.parser.isoparse(self.token_data['expires_at'])
+        # Consume the content so the connection can be released back to the pool
+        response.content
+        response.close()
+        request = response.request.copy()
+        request.headers['X-Auth-Token'] = self.token
+        retry = response.connection.send(request, **kwargs)
+        retry.history.append(response)
+        retry.request = request
+        return retry
+
+    def issue_scoped_token(self, project_id):
+        """
+        Obtain a new token scoped to the given project, returning a ``(token, token_data)``
+        tuple, and add it to the token store if there is one.
+        """
+        response = self.api_post(
+            '/auth/tokens',
+            json = dict(
+                auth = dict(
+                    identity = dict(methods = ['token'], token = dict(id = self.token)),
+                    scope = dict(project = dict(id = project_id))
+                )
+            )
+        )
+        token = response.headers['X-Subject-Token']
+        # The response contains the token data, so the new token doesn't need validating
+        token_data = response.json()['token']
+        if self.token_store:
+            self.token_store.set(self.token, project_id, token, token_data)
+        return token, token_data
+
+    def reissue_scoped_token(self, project_id):
+        """
+        Discard the stored token for the given project and obtain a new one.
+        """
+        self.token_store.delete(self.token, project_id)
+        return self.issue_scoped_token(project_id)
+
     def scoped_connection(self, project_or_id):
         """
         Return a new connection that is scoped to the given project.
@@ -262,19 +560,30 @@ class Connection(rackit.Connection):
             project_id = project_or_id
         if project_id == self.project_id:
             return self
+        # If we have a token store, see if there is a previously issued token for the project
+        scoped = self.token_store.get(self.token, project_id) if self.token_store else None
+        if scoped:
+            token, token_data = scoped
         else:
             # Obtain a new token with the requested scope
-            response = self.api_post(
-                '/auth/tokens',
-                json = dict(
-                    auth = dict(
-                        identity = dict(methods = ['token'], token = dict(id = self.token)),
-                        scope = dict(project = dict(id = project_id))
-                    )
-                )
+            token, token_data = self.issue_scoped_token(project_id)
+        connection = self.__class__(
+            self.auth_url,
+            token,
+            self.interface,
+            self.verify,
+            token_data = token_data,
+            token_store = self.token_store,
+            transport = self.transport
+        )
+        # A stored token may have been revoked since it was issued, in which case the
+        # first request that is rejected discards it and scopes the token again
+        if scoped:
+            connection.reissue_token = functools.partial(
+                self.reissue_scoped_token,
+                project_id
             )
-            token = response.headers['X-Subject-Token']
-            return self.__class__(self.auth_url, token, self.interface, self.verify)
+        return connection
 
 
 class ServiceNotSupported(RuntimeError):
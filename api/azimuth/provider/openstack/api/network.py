@@ -25,6 +25,24 @@ class Quotas(UnmanagedResource):
         )
 
 
+class QuotaDetails(UnmanagedResource):
+    """
+    Represents the quotas for a project, including the usage of each resource.
+
+    Each attribute is a dictionary with ``limit``, ``used`` and ``reserved`` keys.
+    """
+    class Meta:
+        endpoint = "/quotas/{project_id}/details"
+        resource_key = "quota"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Interpolate the project id into the path
+        self._path = self._path.format(
+            project_id = self._connection.session.auth.project_id
+        )
+
+
 class NetworkResourceManager(ResourceManager):
     """
     Custom resource manager for networking resources.
@@ -134,6 +152,7 @@ class NetworkService(Service):
     error_keys = ('NeutronError', 'message')
 
     quotas = Endpoint(Quotas)
+    quota_details = Endpoint(QuotaDetails)
     floatingips = RootResource(FloatingIp)
     ports = RootResource(Port)
     networks = RootResource(Network)
@@ -0,0 +1,395 @@
+"""
+Module containing caches for data fetched from OpenStack that can be shared between
+requests and workers.
+"""
+
+import base64
+import collections
+import datetime
+import hashlib
+import json
+import time
+
+from cryptography.fernet import Fernet, InvalidToken
+
+import dateutil.parser
+
+from ... import metrics
+from ...cache import SHARED_CACHE_ALIAS, get_cache, hash_key
+
+
+#: The alias of the Django cache used to store validated tokens
+TOKEN_CACHE_ALIAS = "azimuth-tokens"
+
+
+def _seconds_until(expires_at):
+    """
+    Returns the number of seconds until the given ISO-8601 timestamp.
+    """
+    expires_at = dateutil.parser.isoparse(expires_at)
+    return (expires_at - datetime.datetime.now(datetime.timezone.utc)).total_seconds()
+
+
+def _fernet(purpose, token):
+    """
+    Returns a Fernet instance using a key derived from the given token, so that data
+    encrypted with it can only be recovered by a request presenting the token.
+    """
+    key = hashlib.sha256("{}:{}".format(purpose, token).encode()).digest()
+    return Fernet(base64.urlsafe_b64encode(key))
+
+
+def _encrypt(purpose, token, data):
+    """
+    Returns the JSON-serialisable data encrypted using a key derived from the token.
+    """
+    return _fernet(purpose, token).encrypt(json.dumps(data).encode())
+
+
+def _decrypt(purpose, token, encrypted):
+    """
+    Returns the data decrypted using a key derived from the token, or ``None`` if it
+    cannot be decrypted.
+    """
+    try:
+        return json.loads(_fernet(purpose, token).decrypt(encrypted))
+    except (InvalidToken, TypeError):
+        return None
+
+
+class TokenCache:
+    """
+    Cache of the data returned by Keystone when a token is validated.
+
+    Entries are keyed by a hash of the token, so the token itself is never stored, and
+    contain the user, project, roles and service catalog for the token, encrypted using
+    a key derived from the token. Entries are kept
+    for at most ``max_age`` seconds, after which the token is revalidated with Keystone,
+    and never beyond the expiry of the token itself.
+
+    Args:
+        max_age: The maximum number of seconds to trust a token before it is revalidated.
+                 A value of zero disables the cache.
+        alias: The alias of the Django cache to use. The number of tokens that are
+               remembered is bounded by the ``MAX_ENTRIES`` of that cache.
+    """
+    def __init__(self, max_age = 300, alias = TOKEN_CACHE_ALIAS):
+        self.max_age = max_age
+        self.alias = alias
+
+    def _key(self, token):
+        return "openstack-token:{}".format(hash_key(token))
+
+    def get(self, token):
+        """
+        Returns the cached token data for the given token, or ``None`` if there is none.
+        """
+        if self.max_age <= 0:
+            return None
+        encrypted = get_cache(self.alias).get(self._key(token))
+        token_data = _decrypt("openstack-token", token, encrypted) if encrypted else None
+        # Even though entries are stored with a timeout, make sure we never return data
+        # for a token that has expired
+        if token_data and _seconds_until(token_data["expires_at"]) > 0:
+            return token_data
+        else:
+            return None
+
+    def set(self, token, token_data):
+        """
+        Stores the token data for the given token.
+        """
+        if self.max_age <= 0:
+            return
+        timeout = int(min(self.max_age, _seconds_until(token_data["expires_at"])))
+        if timeout > 0:
+            get_cache(self.alias).set(
+                self._key(token),
+                _encrypt("openstack-token", token, token_data),
+                timeout
+            )
+
+    def delete(self, token):
+        """
+        Removes any cached token data for the given token.
+        """
+        get_cache(self.alias).delete(self._key(token))
+
+
+class ScopedTokenStore:
+    """
+    Store of project-scoped tokens, shared between workers, that allows a project-scoped
+    token and its service catalog to be reused for as long as the token is valid.
+
+    Entries are keyed by a hash of the unscoped token and the project id. The scoped token
+    and its data are encrypted using a key derived from the unscoped token, so they can
+    only be recovered
+    by a request presenting the unscoped token that it was issued for. Like the entries in
+    :py:class:`TokenCache`, entries are kept for at most ``max_age`` seconds so that a token
+    that has been revoked is not reused indefinitely.
+
+    This object is used as the ``token_store`` for :py:class:`.api.Connection`.
+
+    Args:
+        max_age: The maximum number of seconds to reuse a scoped token. A value of zero
+                 disables the store.
+        expiry_margin: Scoped tokens are not reused when they are due to expire within
+                       this many seconds.
+        alias: The alias of the Django cache to use.
+    """
+    def __init__(self, max_age = 300, expiry_margin = 60, alias = TOKEN_CACHE_ALIAS):
+        self.max_age = max_age
+        self.expiry_margin = expiry_margin
+        self.alias = alias
+
+    def _key(self, token, project_id):
+        return "openstack-scoped-token:{}".format(hash_key(token, project_id))
+
+    def get(self, token, project_id):
+        """
+        Returns a ``(scoped_token, token_data)`` tuple for the given token and project, or
+        ``None`` if there is no usable scoped token.
+        """
+        if self.max_age <= 0:
+            return None
+        encrypted = get_cache(self.alias).get(self._key(token, project_id))
+        entry = _decrypt("openstack-scoped-token", token, encrypted) if encrypted else None
+        if not entry:
+            return None
+        scoped_token, token_data = entry
+        if _seconds_until(token_data["expires_at"]) <= self.expiry_margin:
+            return None
+        return scoped_token, token_data
+
+    def set(self, token, project_id, scoped_token, token_data):
+        """
+        Stores the scoped token and token data for the given token and project.
+        """
+        if self.max_age <= 0:
+            return
+        timeout = int(
+            min(self.max_age, _seconds_until(token_data["expires_at"]) - self.expiry_margin)
+        )
+        if timeout > 0:
+            get_cache(self.alias).set(
+                self._key(token, project_id),
+                _encrypt("openstack-scoped-token", token, [scoped_token, token_data]),
+                timeout
+            )
+
+    def delete(self, token, project_id):
+        """
+        Removes the scoped token for the given token and project, e.g. because it has been
+        rejected by OpenStack.
+        """
+        get_cache(self.alias).delete(self._key(token, project_id))
+
+
+#: Reference to a network, which is all that is needed by consumers of cached networks
+NetworkRef = collections.namedtuple("NetworkRef", ["id", "name"])
+
+
+class FlavorIndex:
+    """
+    Index of the flavors available to a project, by id and by name.
+
+    Args:
+        flavors: Iterable of ``(size, is_disabled)`` tuples where ``size`` is a
+                 :py:class:`..dto.Size`.
+    """
+    def __init__(self, flavors):
+        flavors = tuple(flavors)
+        #: All the sizes, including those for disabled flavors
+        self.all = tuple(size for size, _ in flavors)
+        #: The sizes for the flavors that are not disabled
+        self.enabled = tuple(size for size, is_disabled in flavors if not is_disabled)
+        #: The sizes indexed by id
+        self.by_id = { size.id: size for size in self.all }
+        #: Map of flavor name to flavor id
+        self.ids_by_name = { size.name: size.id for size in self.all }
+
+
+class ImageIndex:
+    """
+    Index of the active images available to a project, by id.
+
+    The index records the most recent ``updated_at`` of the images it has seen, so that it
+    can be refreshed incrementally using only the images that have changed since.
+
+    Args:
+        by_id: Mapping of image id to :py:class:`..dto.Image`.
+        updated_at: The most recent ``updated_at`` of the images in the index.
+        full_refresh_at: The time at which the index was last populated from scratch.
+    """
+    def __init__(self, by_id = None, updated_at = None, full_refresh_at = None):
+        self.by_id = by_id or {}
+        self.updated_at = updated_at
+        self.full_refresh_at = full_refresh_at or time.time()
+        self.refreshed_at = time.time()
+
+    @property
+    def all(self):
+        """
+        All the images in the index.
+        """
+        return tuple(self.by_id.values())
+
+    def updated(self, changes):
+        """
+        Returns a new index with the given changes applied.
+
+        Args:
+            changes: Iterable of ``(image_id, updated_at, image)`` tuples where ``image``
+                     is ``None`` if the image is no longer active.
+        """
+        by_id = dict(self.by_id)
+        updated_at = self.updated_at
+        for image_id, image_updated_at, image in changes:
+            if image:
+                by_id[image_id] = image
+            else:
+                by_id.pop(image_id, None)
+            # The timestamps are all in the same ISO-8601 format, so compare as strings
+            if not updated_at or image_updated_at > updated_at:
+                updated_at = image_updated_at
+        return ImageIndex(by_id, updated_at, self.full_refresh_at)
+
+
+class ProjectCache:
+    """
+    Cache of resources that are the same for all the users of a project, shared between
+    requests and workers.
+
+    Args:
+        flavor_ttl: The number of seconds to cache the flavors for a project. A value of
+                    zero disables caching of flavors.
+        image_ttl: The number of seconds after which the images for a project are refreshed
+                   using only the images that have changed. A value of zero disables
+                   caching of images.
+        image_full_refresh_interval: The number of seconds after which the images for a
+                                     project are refreshed from scratch, which is required
+                                     to notice images that have been deleted.
+        network_ttl: The number of seconds to cache the networks discovered for a project.
+                     A value of zero disables caching of networks.
+        quota_ttl: The number of seconds for which a snapshot of the quotas for a project
+                   is kept. A value of zero disables the snapshots.
+        alias: The alias of the Django cache to use.
+    """
+    def __init__(
+        self,
+        flavor_ttl = 300,
+        image_ttl = 60,
+        image_full_refresh_interval = 900,
+        network_ttl = 300,
+        quota_ttl = 30,
+        alias = SHARED_CACHE_ALIAS
+    ):
+        self.flavor_ttl = flavor_ttl
+        self.image_ttl = image_ttl
+        self.image_full_refresh_interval = image_full_refresh_interval
+        self.network_ttl = network_ttl
+        self.quota_ttl = quota_ttl
+        self.alias = alias
+
+    def _key(self, project_id, resource):
+        return f"openstack-project:{project_id}:{resource}"
+
+    def _get_or_fetch(self, project_id, resource, ttl, fetch):
+        """
+        Returns the cached value for the resource in the project, calling ``fetch`` to
+        obtain and cache a value if there is no cached value.
+        """
+        if ttl <= 0:
+            return fetch()
+        cache = get_cache(self.alias)
+        key = self._key(project_id, resource)
+        value = cache.get(key)
+        if value is None:
+            metrics.increment(f"cache.{resource}.miss")
+            value = fetch()
+            cache.set(key, value, ttl)
+        else:
+            metrics.increment(f"cache.{resource}.hit")
+        return value
+
+    def flavors(self, project_id, fetch):
+        """
+        Returns the :py:class:`FlavorIndex` for the project, using ``fetch`` to obtain the
+        ``(size, is_disabled)`` tuples for the project if required.
+        """
+        return self._get_or_fetch(
+            project_id,
+            "flavors",
+            self.flavor_ttl,
+            lambda: FlavorIndex(fetch())
+        )
+
+    def images(self, project_id, fetch):
+        """
+        Returns the :py:class:`ImageIndex` for the project.
+
+        ``fetch`` is called with the ``updated_at`` of the most recently changed image that
+        has been seen, or ``None`` for a full refresh, and should return the
+        ``(image_id, updated_at, image)`` tuples for the images that have changed since.
+        """
+        if self.image_ttl <= 0:
+            return ImageIndex().updated(fetch(None))
+        cache = get_cache(self.alias)
+        key = self._key(project_id, "images")
+        index = cache.get(key)
+        now = time.time()
+        if index and now - index.refreshed_at < self.image_ttl:
+            metrics.increment("cache.images.hit")
+            return index
+        if index and now - index.full_refresh_at < self.image_full_refresh_interval:
+            metrics.increment("cache.images.refresh")
+            index = index.updated(fetch(index.updated_at))
+        else:
+            metrics.increment("cache.images.miss")
+            index = ImageIndex().updated(fetch(None))
+        cache.set(key, index, self.image_full_refresh_interval)
+        return index
+
+    def network(self, project_id, net_type, fetch):
+        """
+        Returns the :py:class:`NetworkRef` of the given type for the project, using ``fetch``
+        to discover it if required. The result may be ``None`` if there is no such network,
+        which is also cached.
+        """
+        # Wrap the network in a tuple so that a missing network can be cached
+        return self._get_or_fetch(
+            project_id,
+            f"network_{net_type}",
+            self.network_ttl,
+            lambda: (fetch(), )
+        )[0]
+
+    def set_network(self, project_id, net_type, network):
+        """
+        Stores the :py:class:`NetworkRef` of the given type for the project, e.g. when the
+        network has just been discovered or created.
+        """
+        if self.network_ttl > 0:
+            get_cache(self.alias).set(
+                self._key(project_id, f"network_{net_type}"),
+                (network, ),
+                self.network_ttl
+            )
+
+    def quotas(self, project_id):
+        """
+        Returns the most recent snapshot of the quotas for the project, or ``None`` if there
+        is no recent snapshot.
+        """
+        if self.quota_ttl <= 0:
+            return None
+        quotas = get_cache(self.alias).get(self._key(project_id, "quotas"))
+        metrics.increment("cache.quotas.{}".format("miss" if quotas is None else "hit"))
+        return quotas
+
+    def set_quotas(self, project_id, quotas):
+        """
+        Stores a snapshot of the quotas for the project.
+        """
+        if self.quota_ttl > 0:
+            get_cache(self.alias).set(self._key(project_id, "quotas"), quotas, self.quota_ttl)
@@ -20,9 +20,11 @@ import rackit
 
 import yaml
 
+from ... import concurrency, metrics
 from .. import base, errors, dto
 
 from . import api
+from .cache import NetworkRef, ProjectCache, ScopedTokenStore, TokenCache
 
 
 logger = logging.getLogger(__name__)
@@ -124,6 +126,10 @@ def convert_exceptions(f):
     return wrapper
 
 
+#: Decorator that coalesces identical concurrent reads for the same project
+coalesce_reads = concurrency.coalesce(lambda session: session._connection.project_id)
+
+
 class Provider(base.Provider):
     """
     Provider implementation for OpenStack.
@@ -158,6 +164,31 @@ class Provider(base.Provider):
                             no vNIC type will be specified (default ``None``).
         verify_ssl: If ``True`` (the default), verify SSL certificates. If ``False``
                     SSL certificates are not verified.
+        token_cache_max_age: The maximum number of seconds that the result of validating a
+                             token is reused, by any worker, before the token is revalidated
+                             with Keystone (default ``300``). Results are never reused beyond
+                             the expiry of the token. The same limit applies to reusing
+                             project-scoped tokens. A value of zero disables the cache.
+        http_pool_maxsize: The number of connections to each OpenStack endpoint host that
+                           are kept alive and shared between requests (default ``10``).
+        http_pool_maxsize_per_service: Mapping of service catalog type to the number of
+                                       connections to keep for that service, overriding
+                                       ``http_pool_maxsize`` (default ``None``).
+        flavor_cache_ttl: The number of seconds that the flavors for a project are cached,
+                          shared by all users of the project (default ``300``). A value of
+                          zero disables the cache.
+        image_cache_ttl: The number of seconds after which the cached images for a project
+                         are refreshed using only the images that have changed since the
+                         last refresh (default ``60``). A value of zero disables the cache.
+        image_cache_full_refresh_interval: The number of seconds after which the cached
+                                           images for a project are refreshed from scratch,
+                                           which removes deleted images (default ``900``).
+        network_cache_ttl: The number of seconds that the internal, external and storage
+                           networks discovered for a project are cached (default ``300``).
+                           A value of zero disables the cache.
+        quota_snapshot_ttl: The number of seconds for which the quotas for a project are
+                            reused by quota checks (default ``30``). A value of zero
+                            disables the reuse.
     """
     provider_name = "openstack"
 
@@ -173,7 +204,15 @@ class Provider(base.Provider):
                        internal_net_dns_nameservers = None,
                        az_backdoor_net_map = None,
                        backdoor_vnic_type = None,
-                       verify_ssl = True):
+                       verify_ssl = True,
+                       token_cache_max_age = 300,
+                       http_pool_maxsize = 10,
+                       http_pool_maxsize_per_service = None,
+                       flavor_cache_ttl = 300,
+                       image_cache_ttl = 60,
+                       image_cache_full_refresh_interval = 900,
+                       network_cache_ttl = 300,
+                       quota_snapshot_ttl = 30):
         # Strip any trailing slashes from the auth URL
         self._auth_url = auth_url.rstrip("/")
         self._domain = domain
@@ -190,20 +229,52 @@ class Provider(base.Provider):
         self._az_backdoor_net_map = az_backdoor_net_map or dict()
         self._backdoor_vnic_type = backdoor_vnic_type
         self._verify_ssl = verify_ssl
+        self._token_cache = TokenCache(int(token_cache_max_age))
+        self._scoped_token_store = ScopedTokenStore(int(token_cache_max_age))
+        # The transport is shared by all the connections made by this provider
+        self._transport = api.TransportPool(
+            int(http_pool_maxsize),
+            {
+                service: int(maxsize)
+                for service, maxsize in (http_pool_maxsize_per_service or {}).items()
+            }
+        )
+        self._project_cache = ProjectCache(
+            int(flavor_cache_ttl),
+            int(image_cache_ttl),
+            int(image_cache_full_refresh_interval),
+            int(network_cache_ttl),
+            int(quota_snapshot_ttl)
+        )
 
     @convert_exceptions
     def from_token(self, token):
         """
         See :py:meth:`.base.Provider.from_token`.
         """
-        logger.info("Authenticating token with OpenStack")
+        # If the token was validated recently, possibly by another worker, reuse the result
+        token_data = self._token_cache.get(token)
+        if token_data:
+            logger.info("Using cached validation for token")
+        else:
+            logger.info("Authenticating token with OpenStack")
         try:
-            conn = api.Connection(self._auth_url, token, self._interface, self._verify_ssl)
+            conn = api.Connection(
+                self._auth_url,
+                token,
+                self._interface,
+                self._verify_ssl,
+                token_data = token_data,
+                token_store = self._scoped_token_store,
+                transport = self._transport
+            )
         except (rackit.Unauthorized, rackit.NotFound):
             logger.info("Authentication failed for token")
             # Failing to validate a token is a 404 for some reason
             raise errors.AuthenticationError("Your session has expired.")
         else:
+            if not token_data:
+                self._token_cache.set(token, conn.token_data)
             logger.info("Successfully authenticated user '%s'", conn.username)
             return UnscopedSession(
                 conn,
@@ -215,7 +286,8 @@ class Provider(base.Provider):
                 internal_net_cidr = self._internal_net_cidr,
                 internal_net_dns_nameservers = self._internal_net_dns_nameservers,
                 az_backdoor_net_map = self._az_backdoor_net_map,
-                backdoor_vnic_type = self._backdoor_vnic_type
+                backdoor_vnic_type = self._backdoor_vnic_type,
+                project_cache = self._project_cache
             )
 
 
@@ -234,7 +306,8 @@ class UnscopedSession(base.UnscopedSession):
                        internal_net_cidr = "192.168.3.0/24",
                        internal_net_dns_nameservers = None,
                        az_backdoor_net_map = None,
-                       backdoor_vnic_type = None):
+                       backdoor_vnic_type = None,
+                       project_cache = None):
         self._connection = connection
         self._metadata_prefix = metadata_prefix
         self._internal_net_template = internal_net_template
@@ -245,6 +318,7 @@ class UnscopedSession(base.UnscopedSession):
         self._internal_net_dns_nameservers = internal_net_dns_nameservers
         self._az_backdoor_net_map = az_backdoor_net_map or dict()
         self._backdoor_vnic_type = backdoor_vnic_type
+        self._project_cache = project_cache
 
     def token(self):
         """
@@ -362,35 +436,35 @@ class UnscopedSession(base.UnscopedSession):
         """
         See :py:meth:`.base.UnscopedSession.scoped_session`.
         """
-        # Make sure we have a tenancy id
-        if not isinstance(tenancy, dto.Tenancy):
-            # There is no (obvious) way to list individual auth projects, so traverse the list
-            try:
-                tenancy = next(t for t in self.tenancies() if t.id == tenancy)
-            except StopIteration:
-                raise errors.ObjectNotFoundError(
-                    "Could not find tenancy with ID {}.".format(tenancy)
-                )
-        self._log("Creating scoped session for project '%s'", tenancy.name)
+        tenancy_id = tenancy.id if isinstance(tenancy, dto.Tenancy) else tenancy
+        # Scoping a token to a project the user does not belong to fails, so there is no
+        # need to list the user's projects first
+        # This means that a previously issued token for the project can be reused without
+        # any calls to Keystone, and the project name can be taken from the token
         try:
-            return ScopedSession(
-                self.username(),
-                tenancy,
-                self._connection.scoped_connection(tenancy.id),
-                metadata_prefix = self._metadata_prefix,
-                internal_net_template = self._internal_net_template,
-                external_net_template = self._external_net_template,
-                create_internal_net = self._create_internal_net,
-                manila_project_share_gb = self._manila_project_share_gb,
-                internal_net_cidr = self._internal_net_cidr,
-                internal_net_dns_nameservers = self._internal_net_dns_nameservers,
-                az_backdoor_net_map = self._az_backdoor_net_map,
-                backdoor_vnic_type = self._backdoor_vnic_type
-            )
-        except (rackit.Unauthorized, rackit.Forbidden):
+            connection = self._connection.scoped_connection(tenancy_id)
+        except (rackit.Unauthorized, rackit.Forbidden, rackit.NotFound):
             raise errors.ObjectNotFoundError(
-                "Could not find tenancy with ID {}.".format(tenancy.id)
+                "Could not find tenancy with ID {}.".format(tenancy_id)
             )
+        if not isinstance(tenancy, dto.Tenancy):
+            tenancy = dto.Tenancy(connection.project_id, connection.project_name)
+        self._log("Creating scoped session for project '%s'", tenancy.name)
+        return ScopedSession(
+            self.username(),
+            tenancy,
+            connection,
+            metadata_prefix = self._metadata_prefix,
+            internal_net_template = self._internal_net_template,
+            external_net_template = self._external_net_template,
+            create_internal_net = self._create_internal_net,
+            manila_project_share_gb = self._manila_project_share_gb,
+            internal_net_cidr = self._internal_net_cidr,
+            internal_net_dns_nameservers = self._internal_net_dns_nameservers,
+            az_backdoor_net_map = self._az_backdoor_net_map,
+            backdoor_vnic_type = self._backdoor_vnic_type,
+            project_cache = self._project_cache
+        )
 
     def close(self):
         """
@@ -417,7 +491,8 @@ class ScopedSession(base.ScopedSession):
                        internal_net_cidr = "192.168.3.0/24",
                        internal_net_dns_nameservers = None,
                        az_backdoor_net_map = None,
-                       backdoor_vnic_type = None):
+                       backdoor_vnic_type = None,
+                       project_cache = None):
         self._username = username
         self._tenancy = tenancy
         self._connection = connection
@@ -430,6 +505,13 @@ class ScopedSession(base.ScopedSession):
         self._internal_net_dns_nameservers = internal_net_dns_nameservers
         self._az_backdoor_net_map = az_backdoor_net_map or dict()
         self._backdoor_vnic_type = backdoor_vnic_type
+        # If no project cache is given, use one that doesn't cache anything
+        self._project_cache = project_cache or ProjectCache(
+            flavor_ttl = 0,
+            image_ttl = 0,
+            network_ttl = 0,
+            quota_ttl = 0
+        )
 
         # TODO(johngarbutt): consider moving some of this to config
         # and/or hopefully having this feature on by default
@@ -465,16 +547,14 @@ class ScopedSession(base.ScopedSession):
         """
         return self._tenancy
 
-    @convert_exceptions
-    def quotas(self):
+    def _compute_quotas(self):
         """
-        See :py:meth:`.base.ScopedSession.quotas`.
+        Returns the quotas for the compute service.
         """
-        self._log("Fetching tenancy quotas")
         # Compute provides a way to fetch this information through the SDK, but
         # the floating IP quota obtained through it is rubbish...
         compute_limits = self._connection.compute.limits.absolute
-        quotas = [
+        return [
             dto.Quota(
                 "cpus",
                 "CPUs",
@@ -497,42 +577,86 @@ class ScopedSession(base.ScopedSession):
                 compute_limits.instances_used
             ),
         ]
-        # Get the floating ip quota
-        network_quotas = self._connection.network.quotas
-        quotas.append(
+
+    def _network_quotas(self):
+        """
+        Returns the quotas for the network service.
+        """
+        # Use the quota details, which include the usage, to avoid listing all the FIPs
+        try:
+            floatingip = self._connection.network.quota_details.floatingip
+        except rackit.NotFound:
+            # The quota details extension is not enabled, so count the FIPs
+            floatingip = dict(
+                limit = self._connection.network.quotas.floatingip,
+                used = len(list(self._connection.network.floatingips.all()))
+            )
+        return [
             dto.Quota(
                 "external_ips",
                 "External IPs",
                 None,
-                network_quotas.floatingip,
-                # Just get the length of the list of IPs
-                len(list(self._connection.network.floatingips.all()))
+                floatingip["limit"],
+                floatingip["used"]
             )
-        )
+        ]
+
+    def _volume_quotas(self):
+        """
+        Returns the quotas for the volume service, if available.
+        """
         # The volume service is optional
         # In the case where the service is not enabled, just don't add the quotas
         try:
             volume_limits = self._connection.block_store.limits.absolute
-            quotas.extend([
-                dto.Quota(
-                    "storage",
-                    "Volume Storage",
-                    "GB",
-                    volume_limits.total_volume_gigabytes,
-                    volume_limits.total_gigabytes_used
-                ),
-                dto.Quota(
-                    "volumes",
-                    "Volumes",
-                    None,
-                    volume_limits.volumes,
-                    volume_limits.volumes_used
-                )
-            ])
         except api.ServiceNotSupported:
-            pass
+            return []
+        return [
+            dto.Quota(
+                "storage",
+                "Volume Storage",
+                "GB",
+                volume_limits.total_volume_gigabytes,
+                volume_limits.total_gigabytes_used
+            ),
+            dto.Quota(
+                "volumes",
+                "Volumes",
+                None,
+                volume_limits.volumes,
+                volume_limits.volumes_used
+            )
+        ]
+
+    @convert_exceptions
+    @coalesce_reads
+    def quotas(self):
+        """
+        See :py:meth:`.base.ScopedSession.quotas`.
+        """
+        self._log("Fetching tenancy quotas")
+        # The services are independent, so query them concurrently
+        quotas = [
+            quota
+            for service_quotas in concurrency.run_concurrently(
+                self._compute_quotas,
+                self._network_quotas,
+                self._volume_quotas
+            )
+            for quota in service_quotas
+        ]
+        # Store the quotas so that they can be reused by quota checks
+        self._project_cache.set_quotas(self._connection.project_id, quotas)
         return quotas
 
+    @convert_exceptions
+    def recent_quotas(self):
+        """
+        See :py:meth:`.base.ScopedSession.recent_quotas`.
+        """
+        quotas = self._project_cache.quotas(self._connection.project_id)
+        return quotas if quotas is not None else self.quotas()
+
     def _from_api_image(self, api_image):
         """
         Converts an OpenStack API image object into a :py:class:`.dto.Image`.
@@ -559,26 +683,67 @@ class ScopedSession(base.ScopedSession):
             metadata = metadata
         )
 
+    def _fetch_images(self, updated_since):
+        """
+        Fetches the images for the project that have changed since the given time, or all
+        the active images if no time is given.
+
+        Returns ``(image_id, updated_at, image)`` tuples, where ``image`` is ``None`` for
+        images that are no longer active.
+        """
+        if updated_since:
+            self._log("Fetching images updated since %s", updated_since)
+            # Inactive images must be included so that they can be removed from the index
+            api_images = self._connection.image.images.all(
+                updated_at = f"gte:{updated_since}",
+                sort = "updated_at:asc",
+                # Only show shared images that have been accepted
+                member_status = "accepted"
+            )
+        else:
+            self._log("Fetching available images")
+            # Fetch from the SDK using our custom image resource
+            api_images = self._connection.image.images.all(
+                status = "active",
+                # Only show shared images that have been accepted
+                member_status = "accepted"
+            )
+        images = [
+            (
+                image.id,
+                image.updated_at,
+                self._from_api_image(image) if image.status == "active" else None
+            )
+            for image in api_images
+        ]
+        self._log("Found %s images", len(images))
+        return images
+
+    def _images(self):
+        """
+        Returns the image index for the project, which is shared by all users of the project.
+        """
+        return self._project_cache.images(self._connection.project_id, self._fetch_images)
+
     @convert_exceptions
+    @coalesce_reads
     def images(self):
         """
         See :py:meth:`.base.ScopedSession.images`.
         """
-        self._log("Fetching available images")
-        # Fetch from the SDK using our custom image resource
-        images = list(self._connection.image.images.all(
-            status = "active",
-            # Only show shared images that have been accepted
-            member_status = "accepted"
-        ))
-        self._log("Found %s images", len(images))
-        return tuple(self._from_api_image(i) for i in images)
+        return self._images().all
 
     @convert_exceptions
+    @coalesce_reads
     def find_image(self, id):
         """
         See :py:meth:`.base.ScopedSession.find_image`.
         """
+        image = self._images().by_id.get(id)
+        if image:
+            return image
+        # The image may not be in the index if it is new or not in the image list
+        # for the project, e.g. a community image
         self._log("Fetching image with id '%s'", id)
         # Just convert the SDK image to a DTO image
         return self._from_api_image(self._connection.image.images.get(id))
@@ -598,25 +763,42 @@ class ScopedSession(base.ScopedSession):
             getattr(api_flavor, "extra_specs", None) or {}
         )
 
-    @convert_exceptions
-    def sizes(self):
+    def _fetch_flavors(self):
         """
-        See :py:meth:`.base.ScopedSession.sizes`.
+        Fetches the flavors for the project, returning ``(size, is_disabled)`` tuples.
         """
         self._log("Fetching available flavors")
         flavors = tuple(
-            self._from_api_flavor(flavor)
+            (self._from_api_flavor(flavor), flavor.is_disabled)
             for flavor in self._connection.compute.flavors.all()
-            if not flavor.is_disabled
         )
         self._log("Found %s flavors", len(flavors))
         return flavors
 
+    def _flavors(self):
+        """
+        Returns the flavor index for the project, which is shared by all users of the project.
+        """
+        return self._project_cache.flavors(self._connection.project_id, self._fetch_flavors)
+
     @convert_exceptions
+    @coalesce_reads
+    def sizes(self):
+        """
+        See :py:meth:`.base.ScopedSession.sizes`.
+        """
+        return self._flavors().enabled
+
+    @convert_exceptions
+    @coalesce_reads
     def find_size(self, id):
         """
         See :py:meth:`.base.ScopedSession.find_size`.
         """
+        size = self._flavors().by_id.get(id)
+        if size:
+            return size
+        # The flavor may have been created since the index was populated
         self._log("Fetching flavor with id '%s'", id)
         return self._from_api_flavor(self._connection.compute.flavors.get(id))
 
@@ -633,7 +815,7 @@ class ScopedSession(base.ScopedSession):
         networks = list(self._connection.network.networks.all(tags = tag, **kwargs))
         if len(networks) == 1:
             self._log("Using tagged %s network '%s'", net_type, networks[0].name)
-            return networks[0]
+            return NetworkRef(networks[0].id, networks[0].name)
         elif len(networks) > 1:
             self._log("Found multiple networks with tag '%s'.", tag, level = logging.ERROR)
             raise errors.InvalidOperationError(f"Found multiple networks with tag '{tag}'.")
@@ -656,7 +838,7 @@ class ScopedSession(base.ScopedSession):
         networks = list(self._connection.network.networks.all(name = net_name, **kwargs))
         if len(networks) == 1:
             self._log("Found %s network '%s' using template.", net_type, networks[0].name)
-            return networks[0]
+            return NetworkRef(networks[0].id, networks[0].name)
         elif len(networks) > 1:
             self._log("Found multiple networks named '%s'.", net_name, level = logging.ERROR)
             raise errors.InvalidOperationError(f"Found multiple networks named '{net_name}'.")
@@ -669,14 +851,16 @@ class ScopedSession(base.ScopedSession):
             )
             raise errors.InvalidOperationError("Could not find {} network.".format(net_type))
 
-    def _tenant_network(self, create_network = False):
+    def _cached_network(self, net_type, discover):
         """
-        Returns the tenant internal network.
-
-        If create_network = True then an attempt is made to auto-create the networking.
-        If this fails then an exception is raised.
+        Returns the network of the given type for the project, using the given function
+        to discover it if it is not cached.
+        """
+        return self._project_cache.network(self._connection.project_id, net_type, discover)
 
-        If create_network = False then None is returned when the network is not found.
+    def _discover_tenant_network(self):
+        """
+        Discovers the tenant internal network, returning None if it is not found.
         """
         # First, try to find a network that is tagged as the portal internal network
         tagged_network = self._tagged_network("internal")
@@ -685,9 +869,29 @@ class ScopedSession(base.ScopedSession):
         # Next, attempt to use the name template
         if self._internal_net_template:
             return self._templated_network(self._internal_net_template, "internal")
+        return None
+
+    def _tenant_network(self, create_network = False):
+        """
+        Returns the tenant internal network.
+
+        If create_network = True then an attempt is made to auto-create the networking.
+        If this fails then an exception is raised.
+
+        If create_network = False then None is returned when the network is not found.
+        """
+        network = self._cached_network("internal", self._discover_tenant_network)
+        if network:
+            return network
         # If we get to here and are not creating a network, return
         if not create_network:
             return None
+        # A missing network is cached, but it may have been created since, e.g. by another
+        # process, so discover it again before creating one
+        network = self._discover_tenant_network()
+        if network:
+            self._project_cache.set_network(self._connection.project_id, "internal", network)
+            return network
         if self._create_internal_net:
             # Unfortunately, the tags cannot be set in the POST request
             self._log("Creating internal network")
@@ -722,6 +926,9 @@ class ScopedSession(base.ScopedSession):
                 )
                 self._log("Attaching router to network '%s'", network.name)
                 router._add_interface(subnet_id = subnet.id)
+            # Make sure that the new networking is used by subsequent requests
+            network = NetworkRef(network.id, network.name)
+            self._project_cache.set_network(self._connection.project_id, "internal", network)
             return network
         else:
             raise errors.InvalidOperationError("Could not find internal network.")
@@ -825,6 +1032,12 @@ class ScopedSession(base.ScopedSession):
         """
         Returns the external network that connects the tenant router to the outside world.
         """
+        return self._cached_network("external", self._discover_external_network)
+
+    def _discover_external_network(self):
+        """
+        Discovers the external network that connects the tenant router to the outside world.
+        """
         # First, try to find a network that is tagged as the portal external network
         tagged_network = self._tagged_network("external")
         if tagged_network:
@@ -839,7 +1052,7 @@ class ScopedSession(base.ScopedSession):
             list(self._connection.network.networks.all(**params, project_id = None))
         )
         if len(networks) == 1:
-            return networks[0]
+            return NetworkRef(networks[0].id, networks[0].name)
         elif len(networks) > 1:
             raise errors.InvalidOperationError("Multiple external networks found.")
         else:
@@ -850,9 +1063,7 @@ class ScopedSession(base.ScopedSession):
         Returns the direct storage network.
         """
         # Try to find a network that is tagged as the portal storage network
-        tagged_network = self._tagged_network("storage")
-        
-        return tagged_network
+        return self._cached_network("storage", lambda: self._tagged_network("storage"))
 
     def _get_or_create_keypair(self, ssh_key):
         """
@@ -938,36 +1149,72 @@ class ScopedSession(base.ScopedSession):
             dateutil.parser.parse(api_server.created)
         )
 
+    def _timed(self, name, func, *args, **kwargs):
+        """
+        Calls the function with the given arguments, recording the duration with the
+        given timer name.
+        """
+        with metrics.timer(name):
+            return func(*args, **kwargs)
+
     @convert_exceptions
+    @coalesce_reads
+    @metrics.timer("machines.duration")
     def machines(self):
         """
         See :py:meth:`.base.ScopedSession.machines`.
         """
         self._log("Fetching available servers")
-        api_servers = tuple(self._connection.compute.servers.all())
-        self._log("Found %s servers", len(api_servers))
         # We need to be able to look up the flavor ID from the name, which is all that is reported
-        # To avoid multiple queries, we look up all the flavors and index them by name
-        flavors = { f.name: f.id for f in self._connection.compute.flavors.all() }
+        # To avoid multiple queries, we use the flavor index for the project, which is fetched
+        # at the same time as the servers if it is not cached
+        api_servers, flavor_index = concurrency.run_concurrently(
+            lambda: self._timed(
+                "machines.fetch_servers.duration",
+                lambda: tuple(self._connection.compute.servers.all())
+            ),
+            lambda: self._timed("machines.fetch_flavors.duration", self._flavors)
+        )
+        self._log("Found %s servers", len(api_servers))
         # Note that this will (a) only load the network if required and (b)
-        # reuse the network once loaded
+        # reuse the network once loaded
         get_tenant_network = Lazy(self._tenant_network)
-        return tuple(self._from_api_server(s, flavors, get_tenant_network) for s in api_servers)
+        with metrics.timer("machines.convert.duration"):
+            return tuple(
+                self._from_api_server(s, flavor_index.ids_by_name, get_tenant_network)
+                for s in api_servers
+            )
 
     @convert_exceptions
+    @coalesce_reads
+    @metrics.timer("find_machine.duration")
     def find_machine(self, id):
         """
         See :py:meth:`.base.ScopedSession.find_machine`.
         """
         self._log("Fetching server with id '%s'", id)
-        server = self._connection.compute.servers.get(id)
-        # We need to be able to look up the flavor from the name
-        # It is not possible to filter the query by name using GET params, so the best
-        # we can do it query the list and index it
-        flavors = { f.name: f.id for f in self._connection.compute.flavors.all() }
+        # The flavor is reported by name, and it is not possible to filter the flavors
+        # by name using GET params, so we use the flavor index for the project
+        # This is fetched at the same time as the server if it is not cached
+        server, flavor_index = concurrency.run_concurrently(
+            lambda: self._timed(
+                "find_machine.fetch_server.duration",
+                # Force the fetch so that it happens in the thread
+                lambda: self._connection.compute.servers.get(id, force = True)
+            ),
+            lambda: self._timed("find_machine.fetch_flavors.duration", self._flavors)
+        )
+        # Resolve only the flavor that the server uses
+        flavor_name = getattr(server, "flavor", {}).get("original_name")
+        flavors = (
+            { flavor_name: flavor_index.ids_by_name[flavor_name] }
+            if flavor_name in flavor_index.ids_by_name
+            else {}
+        )
         # Don't discover the tenant network unless the server is found
         get_tenant_network = Lazy(self._tenant_network)
-        return self._from_api_server(server, flavors, get_tenant_network)
+        with metrics.timer("find_machine.convert.duration"):
+            return self._from_api_server(server, flavors, get_tenant_network)
 
     @convert_exceptions
     def fetch_logs_for_machine(self, machine):
@@ -1231,6 +1478,7 @@ class ScopedSession(base.ScopedSession):
         )
 
     @convert_exceptions
+    @coalesce_reads
     def external_ips(self):
         """
         See :py:meth:`.base.ScopedSession.external_ips`.
@@ -1263,6 +1511,7 @@ class ScopedSession(base.ScopedSession):
         return self._from_api_floatingip(fip)
 
     @convert_exceptions
+    @coalesce_reads
     def find_external_ip(self, ip):
         """
         See :py:meth:`.base.ScopedSession.find_external_ip`.
@@ -1376,6 +1625,7 @@ class ScopedSession(base.ScopedSession):
         )
 
     @convert_exceptions
+    @coalesce_reads
     def volumes(self):
         """
         See :py:meth:`.base.ScopedSession.volumes`.
@@ -1389,6 +1639,7 @@ class ScopedSession(base.ScopedSession):
         return volumes
 
     @convert_exceptions
+    @coalesce_reads
     def find_volume(self, id):
         """
         See :py:meth:`.base.ScopedSession.find_volume`.
@@ -1,22 +1,24 @@
 import datetime
 import typing as t
 
+from easykube import ApiError
+
+from ..kube import get_capability_registry
 from . import dto
 
 
 SCHEDULE_API_VERSION = "scheduling.azimuth.stackhpc.com/v1alpha1"
 
 
-def leases_available(ekclient):
+def leases_available():
     """
     Returns True if leases are available on the target cluster, False otherwise.
+
+    The answer comes from the process-wide capability registry, so no request is made to
+    the target cluster. If the registry is stale and the lease cannot be created, the
+    registry is invalidated by :py:func:`create_scheduling_resources`.
     """
-    try:
-        _ = ekclient.api(SCHEDULE_API_VERSION).resource("leases")
-    except ValueError:
-        return False
-    else:
-        return True
+    return get_capability_registry().has_resource(SCHEDULE_API_VERSION, "leases")
 
 
 def create_scheduling_resources(
@@ -25,10 +27,15 @@ def create_scheduling_resources(
     owner: t.Dict[str, t.Any],
     cloud_credentials_secret_name: str,
     resources: dto.PlatformResources,
-    schedule: t.Optional[dto.PlatformSchedule]
+    schedule: t.Optional[dto.PlatformSchedule],
+    use_leases: t.Optional[bool] = None
 ):
     """
     Creates scheduling resources for the given Kubernetes object.
+
+    ``use_leases`` should be the result of :py:func:`leases_available` that was used
+    when creating the object, so that the same decision is used for both. If not given,
+    it is determined from the capability registry.
     """
     # Get the formatted time from the schedule object
     if schedule is not None:
@@ -37,11 +44,10 @@ def create_scheduling_resources(
         ends_at = end_time_utc.strftime("%Y-%m-%dT%H:%M:%SZ")
     else:
         ends_at = None
-    # Try to get the leases resource from the schedule API
-    ekapi = ekclient.api(SCHEDULE_API_VERSION)
-    try:
-        ekleases = ekapi.resource("leases")
-    except ValueError:
+    # Check if the leases resource is available in the schedule API
+    if use_leases is None:
+        use_leases = leases_available()
+    if not use_leases:
         # If the lease CRD does not exist, fall back to the previous behaviour
         # I.e. create a schedule object if a schedule is set, do nothing otherwise
         if ends_at is not None:
@@ -72,34 +78,41 @@ def create_scheduling_resources(
                 }
             )
     else:
-        _ = ekleases.create(
-            {
-                "metadata": {
-                    "name": name,
-                    "labels": {"app.kubernetes.io/managed-by": "azimuth"},
-                    # ensure we delete the lease when the cluster is deleted
-                    "ownerReferences": [
-                        {
-                            "apiVersion": owner["apiVersion"],
-                            "kind": owner["kind"],
-                            "name": owner["metadata"]["name"],
-                            "uid": owner["metadata"]["uid"],
-                            "blockOwnerDeletion": True,
-                        },
-                    ],
-                },
-                "spec": {
-                    "cloudCredentialsSecretName": cloud_credentials_secret_name,
-                    "endsAt": ends_at,
-                    "resources": {
-                        "machines": [
+        ekleases = ekclient.api(SCHEDULE_API_VERSION).resource("leases")
+        try:
+            _ = ekleases.create(
+                {
+                    "metadata": {
+                        "name": name,
+                        "labels": {"app.kubernetes.io/managed-by": "azimuth"},
+                        # ensure we delete the lease when the cluster is deleted
+                        "ownerReferences": [
                             {
-                                "sizeId": req.size.id,
-                                "count": req.count
-                            }
-                            for req in resources.machines()
+                                "apiVersion": owner["apiVersion"],
+                                "kind": owner["kind"],
+                                "name": owner["metadata"]["name"],
+                                "uid": owner["metadata"]["uid"],
+                                "blockOwnerDeletion": True,
+                            },
                         ],
                     },
-                },
-            }
-        )
+                    "spec": {
+                        "cloudCredentialsSecretName": cloud_credentials_secret_name,
+                        "endsAt": ends_at,
+                        "resources": {
+                            "machines": [
+                                {
+                                    "sizeId": req.size.id,
+                                    "count": req.count
+                                }
+                                for req in resources.machines()
+                            ],
+                        },
+                    },
+                }
+            )
+        except ApiError as exc:
+            # If the leases resource has gone away, make sure the registry notices
+            if exc.status_code == 404:
+                get_capability_registry().invalidate()
+            raise
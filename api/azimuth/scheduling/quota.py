@@ -34,7 +34,9 @@ class QuotaChecker:
         # Check whether the delta fits within the remaining quota
         projected_quotas = []
         fits = True
-        for quota in self._session.quotas():
+        # A recent snapshot of the quotas is good enough for a quota check, and allows
+        # several checks in quick succession to reuse the same quotas
+        for quota in self._session.recent_quotas():
             future = getattr(future_summary, quota.resource, 0)
             current = getattr(current_summary, quota.resource, 0)
             delta = future - current
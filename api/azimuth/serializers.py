@@ -967,6 +967,42 @@ class KubernetesAppTemplateSerializer(
     versions = KubernetesAppTemplateVersionSerializer(many = True)
 
 
+class KubernetesAppTemplateSummarySerializer(
+    KubernetesAppTemplateRefSerializer,
+    make_dto_serializer(
+        capi_dto.AppTemplate,
+        exclude = ["chart", "default_values", "versions"]
+    )
+):
+    """
+    Serializer for an app template that omits the schemas for the versions, which can be
+    large, and instead links to them.
+    """
+    versions = serializers.SerializerMethodField()
+
+    def get_versions(self, obj):
+        request = self.context.get("request")
+        tenant = self.context.get("tenant")
+        versions = []
+        for version in obj.versions:
+            version_obj = { "name": version.name }
+            if request and tenant:
+                version_obj["links"] = {
+                    "schema": request.build_absolute_uri(
+                        reverse(
+                            "azimuth:kubernetes_app_template_version_schema",
+                            kwargs = {
+                                "tenant": tenant,
+                                "template": obj.id,
+                                "version": version.name,
+                            }
+                        )
+                    ),
+                }
+            versions.append(version_obj)
+        return versions
+
+
 class KubernetesAppSerializer(
     make_dto_serializer(
         capi_dto.App,
@@ -2,6 +2,8 @@
 Settings helpers for the ``azimuth`` Django app.
 """
 
+import os
+
 from settings_object import (
     SettingsObject,
     Setting,
@@ -42,6 +44,16 @@ class AwxSettings(SettingsObject):
     #: Determines whether newly created teams should have the allow all permission granted
     #: Only used if CREATE_TEAMS = True
     CREATE_TEAM_ALLOW_ALL_PERMISSION = Setting(default = False)
+    #: The maximum number of seconds to wait for an inventory to be deleted before
+    #: an inventory with the same name can be created
+    INVENTORY_DELETE_TIMEOUT = Setting(default = 5)
+    #: The number of seconds after which cached cluster type metadata is revalidated
+    CLUSTER_TYPE_CACHE_TTL = Setting(default = 300)
+    #: The number of seconds to wait when fetching cluster type metadata
+    CLUSTER_TYPE_FETCH_TIMEOUT = Setting(default = 10)
+    #: The number of seconds for which the team for a tenancy and its permissions on job
+    #: templates are cached
+    TEAM_CACHE_TTL = Setting(default = 15)
 
     ####
     # Admin settings
@@ -91,12 +103,18 @@ class ClusterDriverSetting(ObjectFactorySetting):
                     ),
                     "VERIFY_SSL": instance.AWX.VERIFY_SSL,
                     "TEMPLATE_INVENTORY": instance.AWX.TEMPLATE_INVENTORY,
+                    "INVENTORY_DELETE_TIMEOUT": instance.AWX.INVENTORY_DELETE_TIMEOUT,
+                    "CLUSTER_TYPE_CACHE_TTL": instance.AWX.CLUSTER_TYPE_CACHE_TTL,
+                    "CLUSTER_TYPE_FETCH_TIMEOUT": instance.AWX.CLUSTER_TYPE_FETCH_TIMEOUT,
+                    "TEAM_CACHE_TTL": instance.AWX.TEAM_CACHE_TTL,
                 },
             }
         else:
             return {
                 "FACTORY": "azimuth.cluster_engine.drivers.crd.Driver",
-                "PARAMS": {},
+                "PARAMS": {
+                    "OPERATOR_TIMEOUT": instance.CRD_OPERATOR_TIMEOUT,
+                },
             }
 
 
@@ -190,6 +208,34 @@ class SchedulingSettings(SettingsObject):
     ENABLED = Setting(default = False)
 
 
+class EventsSettings(SettingsObject):
+    """
+    Settings object for settings related to the tenancy event streams.
+    """
+    #: Indicates whether the event streams are enabled
+    ENABLED = Setting(default = True)
+    #: The number of seconds between refreshes of the resources in a watched tenancy
+    POLL_INTERVAL = Setting(default = 5)
+    #: The number of seconds after which a stream is closed and the client reconnects
+    #: Streams occupy a worker thread, so they are kept short to free threads regularly
+    STREAM_DURATION = Setting(default = 300)
+    #: The number of seconds between keepalive messages on an idle stream
+    HEARTBEAT_INTERVAL = Setting(default = 15)
+    #: The maximum number of open streams per worker process
+    #: Clients that are refused a stream fall back to polling
+    #: Each stream holds a request thread, so streams should only be served by a dedicated
+    #: deployment with enough threads, which sets AZIMUTH_EVENTS_MAX_STREAMS
+    MAX_STREAMS = Setting(
+        default = lambda settings: int(os.environ.get("AZIMUTH_EVENTS_MAX_STREAMS", "0"))
+    )
+    #: The maximum number of events that are queued for a stream
+    #: If a client falls this far behind, the stream is closed and the client reconnects
+    MAX_QUEUED_EVENTS = Setting(default = 1000)
+    #: The number of seconds between checks that the token for each stream is still valid
+    #: and has access to the tenancy
+    REVALIDATE_INTERVAL = Setting(default = 60)
+
+
 class AzimuthSettings(SettingsObject):
     """
     Settings object for the ``AZIMUTH`` setting.
@@ -199,6 +245,11 @@ class AzimuthSettings(SettingsObject):
 
     #: The name of the header that may contain the tenancy id for a verification
     VERIFY_TENANCY_ID_HEADER = Setting(default = "HTTP_X_AUTH_TENANCY_ID")
+    #: The number of seconds for which the result of a successful verification is reused
+    #: for the same token
+    VERIFY_CACHE_TTL = Setting(default = 30)
+    #: The number of seconds for which a failed verification is remembered for a token
+    VERIFY_NEGATIVE_CACHE_TTL = Setting(default = 10)
 
     #: Cloud provider configuration
     PROVIDER = ObjectFactorySetting()
@@ -206,6 +257,9 @@ class AzimuthSettings(SettingsObject):
     #: Cluster engine configuration
     CLUSTER_DRIVER = ClusterDriverSetting()
     CLUSTER_ENGINE = ClusterEngineSetting()
+    #: The maximum number of seconds that the CRD cluster driver waits for the operator to
+    #: acknowledge an update or delete before returning
+    CRD_OPERATOR_TIMEOUT = Setting(default = 2)
 
     #: Cluster API configuration
     CLUSTER_API_PROVIDER = ClusterApiProviderSetting()
@@ -263,6 +317,9 @@ class AzimuthSettings(SettingsObject):
     #: Configuration for advanced scheduling
     SCHEDULING = NestedSetting(SchedulingSettings)
 
+    #: Configuration for the tenancy event streams
+    EVENTS = NestedSetting(EventsSettings)
+
     #: URL for documentation
     DOCUMENTATION_URL = Setting(default = "https://azimuth-cloud.github.io/azimuth-user-docs/")
 
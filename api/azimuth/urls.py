@@ -25,6 +25,12 @@ urlpatterns = [
     path("session/verify/", views.session_verify, name = "session_verify"),
     path("ssh_public_key/", views.ssh_public_key, name = "ssh_public_key"),
     path("tenancies/", views.tenancies, name = "tenancies"),
+    # Event streams are kept separate so that they can be routed to a dedicated deployment
+    path(
+        "events/tenancies/<id:tenant>/",
+        views.tenancy_events,
+        name = "tenancy_events"
+    ),
     path("tenancies/<id:tenant>/", include([
         path("quotas/", views.quotas, name = "quotas"),
         path("identity_provider/", views.identity_provider, name = "identity_provider"),
@@ -102,11 +108,18 @@ urlpatterns = [
         ])),
         path("kubernetes_app_templates/", include([
             path("", views.kubernetes_app_templates, name = "kubernetes_app_templates"),
-            path(
-                "<id:template>/",
-                views.kubernetes_app_template_details,
-                name = "kubernetes_app_template_details"
-            ),
+            path("<id:template>/", include([
+                path(
+                    "",
+                    views.kubernetes_app_template_details,
+                    name = "kubernetes_app_template_details"
+                ),
+                path(
+                    "versions/<str:version>/schema/",
+                    views.kubernetes_app_template_version_schema,
+                    name = "kubernetes_app_template_version_schema"
+                ),
+            ])),
         ])),
         path("kubernetes_apps/", include([
             path("", views.kubernetes_apps, name = "kubernetes_apps"),
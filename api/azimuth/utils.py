@@ -1,8 +1,10 @@
 import logging
 import re
+import threading
 
 import easykube
 
+from .informer import Informer
 from .provider import dto
 
 
@@ -31,28 +33,84 @@ def sanitise(value):
     return re.sub(r"[^a-z0-9]+", "-", str(value).lower()).strip("-")
 
 
+_namespace_informer = None
+_namespace_informer_lock = threading.Lock()
+
+
+def get_namespace_informer() -> Informer:
+    """
+    Returns the process-wide informer for namespaces that are labelled with a tenancy ID,
+    which is indexed by the tenancy ID.
+    """
+    global _namespace_informer
+    if _namespace_informer is None:
+        with _namespace_informer_lock:
+            if _namespace_informer is None:
+                _namespace_informer = Informer(
+                    easykube.Configuration.from_environment(),
+                    "v1",
+                    "namespaces",
+                    namespaced = False,
+                    labels = { TENANCY_ID_LABEL: easykube.PRESENT },
+                    indexers = {
+                        "tenancy": lambda ns: [ns["metadata"]["labels"][TENANCY_ID_LABEL]],
+                    }
+                )
+    return _namespace_informer
+
+
+def _use_labelled_namespace(namespace, expected_namespace, tenancy_id):
+    found_namespace = namespace["metadata"]["name"]
+    logger.info(f"using namespace '{found_namespace}' for tenant '{tenancy_id}'")
+    if found_namespace != expected_namespace:
+        logger.warn(
+            f"expected namespace '{expected_namespace}' for "
+            f"tenant '{tenancy_id}', but found '{found_namespace}'"
+        )
+    return found_namespace
+
+
+def _use_expected_namespace(namespace, expected_namespace, tenancy_id):
+    # Before returning it, verify that it isn't labelled with another tenancy ID
+    owner_id = namespace["metadata"].get("labels", {}).get(TENANCY_ID_LABEL)
+    if not owner_id or owner_id == tenancy_id:
+        logger.info(f"using namespace '{expected_namespace}' for tenant '{tenancy_id}'")
+        return expected_namespace
+    else:
+        raise NamespaceOwnershipError(expected_namespace, tenancy_id, owner_id)
+
+
 def get_namespace(ekclient, tenancy: dto.Tenancy) -> str:
     """
     Returns the correct namespace to use for the given tenancy.
+
+    The namespace is found using the namespace informer where possible, falling back to
+    the Kubernetes API while the informer is not synced.
     """
     tenancy_id = sanitise(tenancy.id)
     tenancy_name = sanitise(tenancy.name)
-    ekresource = ekclient.api("v1").resource("namespaces")
     expected_namespace = f"az-{tenancy_name}"
+    informer = get_namespace_informer()
+    if informer.wait_for_sync():
+        # Try to find the namespace that is labelled with the tenant ID
+        labelled = informer.by_index("tenancy", tenancy_id)
+        if labelled:
+            return _use_labelled_namespace(labelled[0], expected_namespace, tenancy_id)
+        # The informer only holds labelled namespaces, and an unlabelled namespace with
+        # the expected name is still the correct one to use
+        namespace = informer.get(expected_namespace)
+        if namespace is not None:
+            return _use_expected_namespace(namespace, expected_namespace, tenancy_id)
+        logger.info(f"using namespace '{expected_namespace}' for tenant '{tenancy_id}'")
+        return expected_namespace
+    ekresource = ekclient.api("v1").resource("namespaces")
     # Try to find the namespace that is labelled with the tenant ID
     try:
         namespace = next(ekresource.list(labels = {TENANCY_ID_LABEL: tenancy_id}))
     except StopIteration:
         pass
     else:
-        found_namespace = namespace["metadata"]["name"]
-        logger.info(f"using namespace '{found_namespace}' for tenant '{tenancy_id}'")
-        if found_namespace != expected_namespace:
-            logger.warn(
-                f"expected namespace '{expected_namespace}' for "
-                f"tenant '{tenancy_id}', but found '{found_namespace}'"
-            )
-        return found_namespace
+        return _use_labelled_namespace(namespace, expected_namespace, tenancy_id)
     # If there is no namespace labelled with the tenant ID, find the namespace
     # that uses the standard naming convention
     try:
@@ -64,13 +122,7 @@ def get_namespace(ekclient, tenancy: dto.Tenancy) -> str:
             return expected_namespace
         else:
             raise
-    # Before returning it, verify that it isn't labelled with another tenancy ID
-    owner_id = namespace["metadata"].get("labels", {}).get(TENANCY_ID_LABEL)
-    if not owner_id or owner_id == tenancy_id:
-        logger.info(f"using namespace '{expected_namespace}' for tenant '{tenancy_id}'")
-        return expected_namespace
-    else:
-        raise NamespaceOwnershipError(expected_namespace, tenancy_id, owner_id)
+    return _use_expected_namespace(namespace, expected_namespace, tenancy_id)
 
 
 def ensure_namespace(ekclient, namespace: str, tenancy: dto.Tenancy):
@@ -81,7 +133,7 @@ def ensure_namespace(ekclient, namespace: str, tenancy: dto.Tenancy):
     Assumes that the namespace name was discovered using ``get_namespace``.
     """
     # First try to patch the namespace to add the label
-    ekclient.api("v1").resource("namespaces").create_or_patch(
+    namespace = ekclient.api("v1").resource("namespaces").create_or_patch(
         namespace,
         {
             "metadata": {
@@ -92,3 +144,5 @@ def ensure_namespace(ekclient, namespace: str, tenancy: dto.Tenancy):
             },
         }
     )
+    # Record the namespace so that subsequent lookups in this process see the label
+    get_namespace_informer().record(namespace)
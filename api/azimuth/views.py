@@ -4,23 +4,35 @@ Django views for interacting with the configured cloud provider.
 
 import dataclasses
 import functools
+import hashlib
+import json
 import logging
 import math
 
+from django.http import StreamingHttpResponse
 from django.template import Context, Engine
 from django.shortcuts import redirect, render
 from django.urls import reverse
 from django.utils.safestring import mark_safe
 from django.utils.encoding import smart_str
+from django.utils.http import parse_etags
 
 from docutils import core
 
-from rest_framework import decorators, permissions, response, status, exceptions as drf_exceptions
+from rest_framework import (
+    decorators,
+    permissions,
+    renderers,
+    response,
+    status,
+    exceptions as drf_exceptions
+)
 from rest_framework.utils import formatting
 
 from azimuth_auth.settings import auth_settings
 
-from . import identity, scheduling, serializers
+from . import events, identity, metrics, scheduling, serializers
+from .authentication import CachedSessionAuthentication
 from .cluster_api import errors as cluster_api_errors
 from .cluster_engine import errors as cluster_engine_errors
 from .keystore import errors as keystore_errors
@@ -31,6 +43,10 @@ from .settings import cloud_settings
 log = logging.getLogger(__name__)
 
 
+#: The number of seconds for which clients can cache immutable responses, e.g. schemas
+SCHEMA_MAX_AGE = 7 * 24 * 60 * 60
+
+
 def get_view_description(view_cls, html = False):
     """
     Alternative django-rest-framework ``VIEW_DESCRIPTION_FUNCTION`` that allows
@@ -50,6 +66,16 @@ def get_view_description(view_cls, html = False):
     return description
 
 
+def _query_flag(request, name):
+    """
+    Returns true if the named query parameter is given, unless it has a false value.
+    """
+    if name in request.query_params:
+        return request.query_params[name].lower() not in {"0", "false", "no"}
+    else:
+        return False
+
+
 def convert_provider_exceptions(view):
     """
     Decorator that converts errors from :py:mod:`.provider.errors` into appropriate
@@ -324,7 +350,11 @@ def session(request):
     })
 
 
+@metrics.timer("session_verify.duration")
 @provider_api_view(["GET"])
+# Verification is called for every request to a Zenith service, so the result of
+# authenticating the token is cached for a short time
+@decorators.authentication_classes([CachedSessionAuthentication])
 def session_verify(request):
     """
     Verify the current session and return information about the authenticated user.
@@ -423,6 +453,82 @@ def tenancies(request):
     return response.Response(serializer.data)
 
 
+class EventStreamRenderer(renderers.BaseRenderer):
+    """
+    Renderer that allows ``text/event-stream`` to be negotiated. Event streams are
+    rendered by the view, so this is only used to render error responses.
+    """
+    media_type = "text/event-stream"
+    format = "event-stream"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type = None, renderer_context = None):
+        return "event: error\ndata: {}\n\n".format(json.dumps(data))
+
+
+@provider_api_view(["GET"])
+@decorators.renderer_classes([EventStreamRenderer, renderers.JSONRenderer])
+def tenancy_events(request, tenant):
+    """
+    Returns a stream of server-sent events for changes to the machines, volumes,
+    external IPs, clusters, Kubernetes clusters and Kubernetes apps in the tenancy.
+
+    Each event has the kind of resource as the event name and data of the form::
+
+        {
+            "type": "update",
+            "object": { ... }
+        }
+
+    where ``type`` is ``update`` for resources that are new or have changed and ``delete``
+    for resources that have been deleted. When a stream starts, an ``update`` event is
+    sent for each of the existing resources that are known.
+
+    Streams are closed after a fixed time, after which clients should reconnect. If the
+    server cannot accept more streams, a 503 is returned and clients should poll instead.
+
+    Each stream occupies a request thread for its duration, so streams are served under
+    ``/api/events/`` to allow them to be routed to a dedicated deployment with many threads.
+    """
+    if not cloud_settings.EVENTS.ENABLED:
+        return response.Response(
+            {
+                "detail": "Event streams are not enabled.",
+                "code": "unsupported_operation"
+            },
+            status = status.HTTP_404_NOT_FOUND
+        )
+    # Check that the user has access to the tenancy before subscribing
+    with request.auth.scoped_session(tenant):
+        pass
+    try:
+        # The request is not kept by the subscription, only the base URL for links
+        subscription = events.subscribe(
+            tenant,
+            request.META[cloud_settings.TOKEN_HEADER],
+            request.build_absolute_uri("/")
+        )
+    except events.TooManyStreams:
+        return response.Response(
+            {
+                "detail": "Too many event streams, please try again later.",
+                "code": "too_many_streams"
+            },
+            status = status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+    stream = StreamingHttpResponse(
+        subscription.stream(
+            cloud_settings.EVENTS.STREAM_DURATION,
+            cloud_settings.EVENTS.HEARTBEAT_INTERVAL
+        ),
+        content_type = "text/event-stream"
+    )
+    stream["Cache-Control"] = "no-cache"
+    # Prevent proxies from buffering the events
+    stream["X-Accel-Buffering"] = "no"
+    return stream
+
+
 @provider_api_view(["GET"])
 def quotas(request, tenant):
     """
@@ -1664,6 +1770,9 @@ def kubernetes_cluster_service(request, tenant, cluster, service):
 def kubernetes_app_templates(request, tenant):
     """
     Return a list of the available Kubernetes app templates for the tenancy.
+
+    If the ``metadata_only`` query parameter is given, the schemas for the versions are
+    omitted and each version has a link to its schema instead.
     """
     if not cloud_settings.CLUSTER_API_PROVIDER:
         return response.Response(
@@ -1675,7 +1784,11 @@ def kubernetes_app_templates(request, tenant):
         )
     with request.auth.scoped_session(tenant) as session:
         with cloud_settings.CLUSTER_API_PROVIDER.session(session) as capi_session:
-            serializer = serializers.KubernetesAppTemplateSerializer(
+            if _query_flag(request, "metadata_only"):
+                serializer_class = serializers.KubernetesAppTemplateSummarySerializer
+            else:
+                serializer_class = serializers.KubernetesAppTemplateSerializer
+            serializer = serializer_class(
                 capi_session.app_templates(),
                 many = True,
                 context = { "request": request, "tenant": tenant }
@@ -1705,6 +1818,51 @@ def kubernetes_app_template_details(request, tenant, template):
     return response.Response(serializer.data)
 
 
+@provider_api_view(["GET"])
+def kubernetes_app_template_version_schema(request, tenant, template, version):
+    """
+    Return the values schema and UI schema for the specified version of a Kubernetes
+    app template.
+
+    The schema for a version does not change, so the response has a strong ETag derived
+    from its content and can be cached by clients for a long time.
+    """
+    if not cloud_settings.CLUSTER_API_PROVIDER:
+        return response.Response(
+            {
+                "detail": "Kubernetes apps are not supported.",
+                "code": "unsupported_operation"
+            },
+            status = status.HTTP_404_NOT_FOUND
+        )
+    with request.auth.scoped_session(tenant) as session:
+        with cloud_settings.CLUSTER_API_PROVIDER.session(session) as capi_session:
+            app_template = capi_session.find_app_template(template)
+    try:
+        template_version = next(v for v in app_template.versions if v.name == version)
+    except StopIteration:
+        raise drf_exceptions.NotFound(
+            f"Version '{version}' not found for Kubernetes app template '{template}'"
+        )
+    content = {
+        "values_schema": template_version.values_schema,
+        "ui_schema": template_version.ui_schema,
+    }
+    etag = '"{}"'.format(
+        hashlib.sha256(json.dumps(content, sort_keys = True).encode()).hexdigest()
+    )
+    headers = {
+        "ETag": etag,
+        # The schema depends on the tenancy being allowed to use the template, so it
+        # should only be cached by the browser
+        "Cache-Control": f"private, max-age={SCHEMA_MAX_AGE}, immutable",
+    }
+    if etag in parse_etags(request.META.get("HTTP_IF_NONE_MATCH", "")):
+        return response.Response(status = status.HTTP_304_NOT_MODIFIED, headers = headers)
+    else:
+        return response.Response(content, headers = headers)
+
+
 @provider_api_view(["GET", "POST"])
 def kubernetes_apps(request, tenant):
     """
@@ -44,6 +44,49 @@ WSGI_APPLICATION = 'azimuth_site.wsgi.application'
 # Use cookie sessions so that we don't need a database
 SESSION_ENGINE = 'django.contrib.sessions.backends.signed_cookies'
 
+# Caches for data that is shared between requests
+# Each cache keeps recently used entries in memory in front of a file-based cache that is
+# shared by all the gunicorn workers in a pod, and /tmp is an emptyDir in the pod so it is
+# writable even with a read-only root filesystem
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # General purpose cache for data derived from the cloud and Kubernetes APIs
+    'azimuth': {
+        'BACKEND': 'azimuth.cache.TieredCache',
+        'LOCATION': 'azimuth',
+        'TIMEOUT': 300,
+        'LOCAL_TIMEOUT': 10,
+        'LOCAL_MAX_ENTRIES': 2000,
+        'SHARED': {
+            'BACKEND': 'azimuth.cache.ThrottledFileBasedCache',
+            'LOCATION': '/tmp/azimuth/cache',
+            'TIMEOUT': 300,
+            'OPTIONS': {
+                'MAX_ENTRIES': 10000,
+            },
+        },
+    },
+    # Cache of validated tokens, which are encrypted using the token
+    # MAX_ENTRIES bounds the number of tokens that are remembered at any one time
+    'azimuth-tokens': {
+        'BACKEND': 'azimuth.cache.TieredCache',
+        'LOCATION': 'azimuth-tokens',
+        'TIMEOUT': 300,
+        'LOCAL_TIMEOUT': 10,
+        'LOCAL_MAX_ENTRIES': 1000,
+        'SHARED': {
+            'BACKEND': 'azimuth.cache.ThrottledFileBasedCache',
+            'LOCATION': '/tmp/azimuth/tokens',
+            'TIMEOUT': 300,
+            'OPTIONS': {
+                'MAX_ENTRIES': 5000,
+            },
+        },
+    },
+}
+
 REST_FRAMEWORK = {
     'VIEW_DESCRIPTION_FUNCTION': 'azimuth.views.get_view_description',
     'DEFAULT_AUTHENTICATION_CLASSES': ['azimuth.authentication.TokenHeaderAuthentication'],
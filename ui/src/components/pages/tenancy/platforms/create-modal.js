@@ -32,7 +32,11 @@ import { useClusterFormState, ClusterForm } from './clusters/form';
 import { useKubernetesClusterFormState, KubernetesClusterForm } from './kubernetes/form';
 import KubernetesIcon from './kubernetes/kubernetes-logo.png';
 
-import { useKubernetesAppFormState, KubernetesAppForm } from './kubernetes_apps/form';
+import {
+    useKubernetesAppFormState,
+    KubernetesAppForm,
+    KubernetesAppTemplateSchemas
+} from './kubernetes_apps/form';
 
 
 const PlatformTypeSelectCard = ({ platformType, selected, onSelect }) => (
@@ -257,15 +261,23 @@ const PlatformConfigurationForm = ({
                     />
                 )}
                 {platformType.kind === "kubernetesAppTemplate" && (
-                    <KubernetesAppConfigurationForm
-                        formId="platform-create"
+                    <KubernetesAppTemplateSchemas
                         kubernetesAppTemplate={platformType.object}
-                        onSuccess={onSuccess}
-                        kubernetesAppActions={tenancyActions.kubernetesApp}
                         tenancy={tenancy}
                         tenancyActions={tenancyActions}
-                        capabilities={capabilities}
-                    />
+                    >
+                        {kubernetesAppTemplate => (
+                            <KubernetesAppConfigurationForm
+                                formId="platform-create"
+                                kubernetesAppTemplate={kubernetesAppTemplate}
+                                onSuccess={onSuccess}
+                                kubernetesAppActions={tenancyActions.kubernetesApp}
+                                tenancy={tenancy}
+                                tenancyActions={tenancyActions}
+                                capabilities={capabilities}
+                            />
+                        )}
+                    </KubernetesAppTemplateSchemas>
                 )}
             </Modal.Body>
             <Modal.Footer>
@@ -16,7 +16,11 @@ import {
     faSyncAlt
 } from '@fortawesome/free-solid-svg-icons';
 
-import { Field, Form, Select } from '../../../../utils';
+import get from 'lodash/get';
+
+import { Error, Field, Form, Loading, Select } from '../../../../utils';
+
+import { hasSchemas } from '../../../../../redux/tenancies/kubernetes-app-templates';
 
 import { SchemaField, getInitialValueFromSchema } from '../../../../json-schema-field';
 
@@ -101,6 +105,55 @@ const KubernetesClusterSelectControlWithCreate = ({
 };
 
 
+/**
+ * Component that fetches the schemas for the versions of an app template, which are not
+ * included in the template list, and renders its children with the template once they
+ * are available.
+ */
+export const KubernetesAppTemplateSchemas = ({
+    kubernetesAppTemplate,
+    tenancy,
+    tenancyActions,
+    children
+}) => {
+    // Use the latest version of the template from the store
+    const template = get(
+        tenancy.kubernetesAppTemplates.data,
+        kubernetesAppTemplate.id,
+        kubernetesAppTemplate
+    );
+    // The placeholder for an unavailable template has no schemas to load
+    const schemasLoaded = template.placeholder || hasSchemas(template);
+    const fetchError = get(tenancy.kubernetesAppTemplates.schemaFetchErrors, template.id);
+    const fetchSchemas = () => tenancyActions.kubernetesAppTemplate.fetchSchemas(template.id);
+    useEffect(
+        () => { if( !schemasLoaded ) fetchSchemas(); },
+        [template.id, schemasLoaded]
+    );
+    if( schemasLoaded ) {
+        return children(template);
+    }
+    else if( fetchError ) {
+        return (
+            <Row className="justify-content-center">
+                <Col xs="auto">
+                    <Error message={fetchError.message} />
+                    <div className="text-center mt-2">
+                        <Button variant="secondary" onClick={fetchSchemas}>
+                            <FontAwesomeIcon icon={faSyncAlt} className="me-2" />
+                            Retry
+                        </Button>
+                    </div>
+                </Col>
+            </Row>
+        );
+    }
+    else {
+        return <Loading message="Loading platform configuration..." />;
+    }
+};
+
+
 const initialValues = (kubernetesAppTemplate, kubernetesApp) => {
     if( kubernetesApp ) {
         const version = kubernetesAppTemplate.versions.find(v => v.name === kubernetesApp.version);
@@ -313,6 +366,31 @@ export const KubernetesAppForm = ({
 };
 
 
+// The modal body is only rendered while the modal is shown, so the form state is
+// initialised each time the modal is opened
+const KubernetesAppModalFormBody = ({
+    formId,
+    kubernetesAppTemplate,
+    kubernetesApp,
+    onSubmit,
+    tenancy,
+    tenancyActions,
+    capabilities
+}) => {
+    const [formState, _] = useKubernetesAppFormState(kubernetesAppTemplate, kubernetesApp);
+    return (
+        <KubernetesAppForm
+            id={formId}
+            formState={formState}
+            onSubmit={onSubmit}
+            tenancy={tenancy}
+            tenancyActions={tenancyActions}
+            capabilities={capabilities}
+        />
+    );
+};
+
+
 export const KubernetesAppModalForm = ({
     show,
     kubernetesAppTemplate,
@@ -329,13 +407,10 @@ export const KubernetesAppModalForm = ({
             `kubernetes-app-update-${kubernetesApp.id}` :
             "kubernetes-app-create"
     );
-    const [formState, resetForm] = useKubernetesAppFormState(kubernetesAppTemplate, kubernetesApp);
     return (
         <Modal
             backdrop="static"
             onHide={onCancel}
-            onEnter={resetForm}
-            onExited={resetForm}
             size="lg"
             show={show}
             {...props}
@@ -362,14 +437,23 @@ export const KubernetesAppModalForm = ({
                         </Col>
                     </Row>
                 )}
-                <KubernetesAppForm
-                    id={formId}
-                    formState={formState}
-                    onSubmit={onSubmit}
+                <KubernetesAppTemplateSchemas
+                    kubernetesAppTemplate={kubernetesAppTemplate}
                     tenancy={tenancy}
                     tenancyActions={tenancyActions}
-                    capabilities={capabilities}
-                />
+                >
+                    {template => (
+                        <KubernetesAppModalFormBody
+                            formId={formId}
+                            kubernetesAppTemplate={template}
+                            kubernetesApp={kubernetesApp}
+                            onSubmit={onSubmit}
+                            tenancy={tenancy}
+                            tenancyActions={tenancyActions}
+                            capabilities={capabilities}
+                        />
+                    )}
+                </KubernetesAppTemplateSchemas>
             </Modal.Body>
             <Modal.Footer>
                 <Button variant="success" type="submit" form={formId}>
@@ -33,6 +33,7 @@ const {
     reducer: resourceReducer,
     epic: resourceEpic
 } = createTenancyResource('cluster', {
+    streamed: true,
     isActive: cluster => ['CONFIGURING', 'DELETING'].includes(cluster.status),
     transform
 });
@@ -18,7 +18,7 @@ const {
     actionCreators,
     reducer,
     epic: resourceEpic,
-} = createTenancyResource('external_ip');
+} = createTenancyResource('external_ip', { streamed: true });
 
 
 const epic = combineEpics(
@@ -2,15 +2,173 @@
  * This module contains Redux bits for loading Kubernetes app templates.
  */
 
+import { of } from 'rxjs';
+import { filter, map, mergeMap, withLatestFrom } from 'rxjs/operators';
+
+import { combineEpics, ofType } from 'redux-observable';
+
+import get from 'lodash/get';
+
 import { createTenancyResource } from './resource';
 
 
 const {
-    actions,
-    actionCreators,
-    reducer,
-    epic,
+    actions: resourceActions,
+    actionCreators: resourceActionCreators,
+    reducer: resourceReducer,
+    epic: resourceEpic
 } = createTenancyResource('kubernetes_app_template');
 
 
-export { actions, actionCreators, reducer, epic };
+export const actions = {
+    ...resourceActions,
+
+    FETCH_SCHEMAS: 'TENANCIES/KUBERNETES_APP_TEMPLATE/FETCH_SCHEMAS',
+
+    FETCH_VERSION_SCHEMA: 'TENANCIES/KUBERNETES_APP_TEMPLATE/FETCH_VERSION_SCHEMA',
+    FETCH_VERSION_SCHEMA_SUCCEEDED: 'TENANCIES/KUBERNETES_APP_TEMPLATE/FETCH_VERSION_SCHEMA_SUCCEEDED',
+    FETCH_VERSION_SCHEMA_FAILED: 'TENANCIES/KUBERNETES_APP_TEMPLATE/FETCH_VERSION_SCHEMA_FAILED',
+};
+
+
+export const actionCreators = {
+    ...resourceActionCreators,
+    // The list omits the schemas for the versions, which are fetched when required
+    fetchList: tenancyId => ({
+        ...resourceActionCreators.fetchList(tenancyId),
+        options: {
+            url: `/api/tenancies/${tenancyId}/kubernetes_app_templates/?metadata_only=true`
+        }
+    }),
+    fetchSchemas: (tenancyId, templateId) => ({
+        type: actions.FETCH_SCHEMAS,
+        tenancyId,
+        templateId
+    }),
+    fetchVersionSchema: (tenancyId, templateId, version) => ({
+        type: actions.FETCH_VERSION_SCHEMA,
+        tenancyId,
+        templateId,
+        version,
+        apiRequest: true,
+        failSilently: true,
+        successAction: actions.FETCH_VERSION_SCHEMA_SUCCEEDED,
+        failureAction: actions.FETCH_VERSION_SCHEMA_FAILED,
+        options: {
+            url: (
+                `/api/tenancies/${tenancyId}/kubernetes_app_templates/${templateId}` +
+                `/versions/${encodeURIComponent(version)}/schema/`
+            )
+        }
+    })
+};
+
+
+/**
+ * Returns true if the schemas for all the versions of the template have been loaded.
+ */
+export const hasSchemas = template => template.versions.every(v => !!v.values_schema);
+
+
+/**
+ * Returns the versions for the template with the schemas from the previous versions,
+ * as schemas do not change for a version.
+ */
+const mergeSchemas = (versions, previousVersions) => versions.map(version => {
+    const previous = (previousVersions || []).find(v => v.name === version.name);
+    return (
+        previous && previous.values_schema ?
+            {
+                ...version,
+                values_schema: previous.values_schema,
+                ui_schema: previous.ui_schema
+            } :
+            version
+    );
+});
+
+
+export function reducer(state, action) {
+    const nextState = resourceReducer(state, action);
+    switch(action.type) {
+        case actions.FETCH_SCHEMAS:
+            // Clear any error from a previous attempt to fetch the schemas
+            return {
+                ...nextState,
+                schemaFetchErrors: {
+                    ...nextState.schemaFetchErrors,
+                    [action.templateId]: null
+                }
+            };
+        case actions.FETCH_VERSION_SCHEMA_FAILED:
+            // Keep the errors outside of the data so that they survive the list being refreshed
+            return {
+                ...nextState,
+                schemaFetchErrors: {
+                    ...nextState.schemaFetchErrors,
+                    [action.request.templateId]: action.payload
+                }
+            };
+        case actions.FETCH_LIST_SUCCEEDED:
+            // Keep any schemas that have already been fetched
+            return {
+                ...nextState,
+                data: Object.assign(
+                    {},
+                    ...Object.entries(nextState.data).map(([id, template]) => ({
+                        [id]: {
+                            ...template,
+                            versions: mergeSchemas(
+                                template.versions,
+                                get(state, ['data', id, 'versions'])
+                            )
+                        }
+                    }))
+                )
+            };
+        case actions.FETCH_VERSION_SCHEMA_SUCCEEDED:
+            const { templateId, version } = action.request;
+            if( !(nextState.data || {}).hasOwnProperty(templateId) ) return nextState;
+            const template = nextState.data[templateId];
+            return {
+                ...nextState,
+                data: {
+                    ...nextState.data,
+                    [templateId]: {
+                        ...template,
+                        versions: template.versions.map(v =>
+                            v.name === version ? { ...v, ...action.payload } : v
+                        )
+                    }
+                }
+            };
+        default:
+            return nextState;
+    }
+}
+
+
+export const epic = combineEpics(
+    resourceEpic,
+    // When the schemas for a template are requested, fetch the schema for each version
+    // that does not already have one
+    // The responses can be cached by the browser, as schemas do not change for a version
+    (action$, state$) => action$.pipe(
+        ofType(actions.FETCH_SCHEMAS),
+        withLatestFrom(state$),
+        map(([action, state]) => [
+            action,
+            get(state, ['tenancies', 'current', 'kubernetesAppTemplates', 'data', action.templateId])
+        ]),
+        filter(([_, template]) => !!template),
+        mergeMap(([action, template]) => of(
+            ...template.versions
+                .filter(version => !version.values_schema)
+                .map(version => actionCreators.fetchVersionSchema(
+                    action.tenancyId,
+                    action.templateId,
+                    version.name
+                ))
+        ))
+    )
+);
@@ -21,6 +21,7 @@ const {
     reducer,
     epic: resourceEpic
 } = createTenancyResource('kubernetes_app', {
+    streamed: true,
     // Mark clusters with an in-progress operation as active
     // Also mark unhealthy clusters as active if autohealing is enabled as there is a
     // high likelihood that a remediation will start soon
@@ -19,6 +19,7 @@ const {
     reducer: resourceReducer,
     epic
 } = createTenancyResource('kubernetes_cluster', {
+    streamed: true,
     // Mark clusters with an in-progress operation as active
     // Also mark unhealthy clusters as active if autohealing is enabled as there is a
     // high likelihood that a remediation will start soon
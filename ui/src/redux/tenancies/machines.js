@@ -25,6 +25,7 @@ const {
     reducer: resourceReducer,
     epic: resourceEpic
 } = createTenancyResource('machine', {
+    streamed: true,
     isActive: machine => (['BUILD', 'DELETED'].includes(machine.status.type) || !!machine.task),
     transform
 });
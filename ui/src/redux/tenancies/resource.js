@@ -3,8 +3,19 @@
  * tenancy resources.
  */
 
-import { of } from 'rxjs';
-import { filter, map, merge, mergeMap, delay, takeUntil } from 'rxjs/operators';
+import { Observable, of } from 'rxjs';
+import {
+    catchError,
+    filter,
+    finalize,
+    map,
+    merge,
+    mergeMap,
+    delay,
+    share,
+    switchMap,
+    takeUntil
+} from 'rxjs/operators';
 
 import { combineEpics, ofType } from 'redux-observable';
 
@@ -14,6 +25,50 @@ import { actions as sessionActions } from '../session';
 import { actions as tenancyActions } from './index';
 
 
+// The names of the events that are streamed for tenancy resources
+const eventNames = new Set();
+
+// The shared event stream for each tenancy
+const eventStreams = {};
+
+
+/**
+ * Returns an observable of the events for the given tenancy.
+ *
+ * A single event source is shared by all the resources for the tenancy, and is closed
+ * when there are no more subscribers. The observable emits an 'open' event each time the
+ * stream is (re)connected, and errors if the stream cannot be used, e.g. because the
+ * server has too many streams, in which case the resources should be polled instead.
+ */
+function tenancyEvents(tenancyId) {
+    if( !eventStreams.hasOwnProperty(tenancyId) ) {
+        eventStreams[tenancyId] = new Observable(subscriber => {
+            const source = new EventSource(`/api/events/tenancies/${tenancyId}/`);
+            let opened = false;
+            source.onopen = () => {
+                subscriber.next({ name: 'open', reconnected: opened });
+                opened = true;
+            };
+            // The event source reconnects automatically when the server ends the stream,
+            // so an error is only permanent if the event source is closed
+            source.onerror = () => {
+                if( source.readyState === EventSource.CLOSED )
+                    subscriber.error(new Error('Event stream closed'));
+            };
+            eventNames.forEach(name => source.addEventListener(
+                name,
+                event => subscriber.next({ name, ...JSON.parse(event.data) })
+            ));
+            return () => source.close();
+        }).pipe(
+            finalize(() => { delete eventStreams[tenancyId]; }),
+            share()
+        );
+    }
+    return eventStreams[tenancyId];
+}
+
+
 export function createActions(resourceName) {
     const prefix = `TENANCIES/${resourceName.toUpperCase()}`
     return {
@@ -36,6 +91,10 @@ export function createActions(resourceName) {
         DELETE: `${prefix}/DELETE`,
         DELETE_SUCCEEDED: `${prefix}/DELETE_SUCCEEDED`,
         DELETE_FAILED: `${prefix}/DELETE_FAILED`,
+
+        EVENTS_SUBSCRIBED: `${prefix}/EVENTS_SUBSCRIBED`,
+        EVENTS_UNSUBSCRIBED: `${prefix}/EVENTS_UNSUBSCRIBED`,
+        EVENT_RECEIVED: `${prefix}/EVENT_RECEIVED`,
     };
 }
 
@@ -103,6 +162,21 @@ export function createActionCreators(resourceName, actions) {
                 method: 'DELETE'
             }
         }),
+        eventsSubscribed: (tenancyId, reconnected) => ({
+            type: actions.EVENTS_SUBSCRIBED,
+            tenancyId,
+            reconnected
+        }),
+        eventsUnsubscribed: tenancyId => ({
+            type: actions.EVENTS_UNSUBSCRIBED,
+            tenancyId
+        }),
+        eventReceived: (tenancyId, event) => ({
+            type: actions.EVENT_RECEIVED,
+            tenancyId,
+            eventType: event.type,
+            payload: event.object
+        }),
     };
 }
 
@@ -122,7 +196,8 @@ export function createReducer(actions, id, transform) {
         fetching: false,
         data: null,
         fetchError: null,
-        creating: false
+        creating: false,
+        streaming: false
     };
     return (state = initialState, action) => {
         switch(action.type) {
@@ -294,6 +369,33 @@ export function createReducer(actions, id, transform) {
                     };
                 else
                     return state;
+            case actions.EVENTS_SUBSCRIBED:
+                return { ...state, streaming: true };
+            case actions.EVENTS_UNSUBSCRIBED:
+                return { ...state, streaming: false };
+            case actions.EVENT_RECEIVED:
+                if( action.eventType === 'delete' )
+                    return {
+                        ...state,
+                        data: Object.assign(
+                            {},
+                            // Compare IDs as strings to avoid any mismatch between int/string
+                            ...Object.entries(state.data || {})
+                                .filter(([resourceId, _]) =>
+                                    resourceId.toString() !== id(action.payload).toString()
+                                )
+                                .map(([resourceId, resource]) => ({ [resourceId]: resource }))
+                        )
+                    };
+                else
+                    return {
+                        ...state,
+                        data: Object.assign(
+                            {},
+                            state.data,
+                            nextStateEntry(state, id(action.payload), transform(action.payload))
+                        )
+                    };
             default:
                 return state;
         }
@@ -301,22 +403,80 @@ export function createReducer(actions, id, transform) {
 }
 
 
-export function createEpic(actions, actionCreators, isActive, id) {
+/**
+ * Create the epics that subscribe to the events for the resource, if it is streamed.
+ */
+function createEventEpics(actions, actionCreators, eventName, streaming) {
+    if( !eventName ) return [];
+    eventNames.add(eventName);
+    return [
+        // When a tenancy is switched to, subscribe to the events for the tenancy
+        // While the events are being received, polling is suspended
+        action$ => action$.pipe(
+            ofType(tenancyActions.SWITCH),
+            filter(action => !!action.tenancyId),
+            switchMap(action => {
+                const tenancyId = action.tenancyId;
+                return tenancyEvents(tenancyId).pipe(
+                    filter(event => event.name === 'open' || event.name === eventName),
+                    map(event => {
+                        if( event.name === 'open' ) {
+                            streaming.add(tenancyId);
+                            return actionCreators.eventsSubscribed(tenancyId, event.reconnected);
+                        }
+                        else {
+                            return actionCreators.eventReceived(tenancyId, event);
+                        }
+                    }),
+                    // If the events cannot be received, fall back to polling
+                    catchError(() => {
+                        streaming.delete(tenancyId);
+                        return of(actionCreators.eventsUnsubscribed(tenancyId));
+                    }),
+                    finalize(() => streaming.delete(tenancyId)),
+                    takeUntil(action$.pipe(ofType(sessionActions.TERMINATED)))
+                );
+            })
+        ),
+        // When the event stream reconnects, refetch the list in case any deletions
+        // were missed while it was disconnected
+        action$ => action$.pipe(
+            ofType(actions.EVENTS_SUBSCRIBED),
+            filter(action => action.reconnected),
+            map(action => actionCreators.fetchList(action.tenancyId))
+        ),
+        // When the event stream fails, refetch the list to restart the polling
+        action$ => action$.pipe(
+            ofType(actions.EVENTS_UNSUBSCRIBED),
+            map(action => actionCreators.fetchList(action.tenancyId))
+        )
+    ];
+}
+
+
+export function createEpic(actions, actionCreators, isActive, id, eventName) {
+    // The tenancies for which events are being received, which are not polled
+    const streaming = new Set();
+    const isPolled = tenancyId => !streaming.has(tenancyId);
     return combineEpics(
+        ...createEventEpics(actions, actionCreators, eventName, streaming),
         // Whenever a resource list is fetched successfully, wait 2 min before fetching it again
         action$ => action$.pipe(
             ofType(actions.FETCH_LIST_SUCCEEDED),
+            filter(action => isPolled(action.request.tenancyId)),
             mergeMap(action => {
                 const tenancyId = action.request.tenancyId;
                 // Cancel the timer if:
                 //   * A separate fetch is requested before the timer expires
                 //   * The session is terminated before the timer expires
                 //   * A switch takes place to a different tenancy before the timer expires
+                //   * Events start being received for the tenancy
                 return of(actionCreators.fetchList(tenancyId)).pipe(
                     delay(120000),
                     takeUntil(
                         action$.pipe(
                             ofType(actions.FETCH_LIST),
+                            merge(action$.pipe(ofType(actions.EVENTS_SUBSCRIBED))),
                             filter(action => action.tenancyId === tenancyId),
                             merge(action$.pipe(ofType(sessionActions.TERMINATED))),
                             merge(
@@ -334,6 +494,7 @@ export function createEpic(actions, actionCreators, isActive, id) {
         // 'active' resources, as determined by the given predicate
         action$ => action$.pipe(
             ofType(actions.FETCH_LIST_SUCCEEDED),
+            filter(action => isPolled(action.request.tenancyId)),
             mergeMap(action => of(
                 ...action.payload
                     .filter(isActive)
@@ -349,6 +510,7 @@ export function createEpic(actions, actionCreators, isActive, id) {
             merge(action$.pipe(ofType(actions.CREATE_SUCCEEDED))),
             merge(action$.pipe(ofType(actions.UPDATE_SUCCEEDED))),
             filter(action => isActive(action.payload)),
+            filter(action => isPolled(action.request.tenancyId)),
             mergeMap(action => {
                 const tenancyId = action.request.tenancyId;
                 const resourceId = id(action.payload);
@@ -357,13 +519,15 @@ export function createEpic(actions, actionCreators, isActive, id) {
                 //     timer expires
                 //   * The session is terminated while we are waiting
                 //   * A switch takes place to a different tenancy before the timer expires
+                //   * Events start being received for the tenancy
                 return of(actionCreators.fetchOne(tenancyId, resourceId)).pipe(
                     delay(5000),
                     takeUntil(
                         action$.pipe(
                             ofType(actions.FETCH_ONE),
-                            filter(action => action.tenancyId === tenancyId),
                             filter(action => action.resourceId === resourceId),
+                            merge(action$.pipe(ofType(actions.EVENTS_SUBSCRIBED))),
+                            filter(action => action.tenancyId === tenancyId),
                             merge(action$.pipe(ofType(sessionActions.TERMINATED))),
                             merge(
                                 action$.pipe(
@@ -394,11 +558,19 @@ export function createTenancyResource(resourceName, options = {}) {
     const {
         isActive = _ => false,
         id = resource => resource.id,
-        transform = resource => resource
+        transform = resource => resource,
+        // Indicates whether events are streamed for the resource
+        streamed = false
     } = options;
     const actions = createActions(resourceName);
     const actionCreators = createActionCreators(resourceName, actions);
     const reducer = createReducer(actions, id, transform);
-    const epic = createEpic(actions, actionCreators, isActive, id);
+    const epic = createEpic(
+        actions,
+        actionCreators,
+        isActive,
+        id,
+        streamed ? `${resourceName.toLowerCase()}s` : null
+    );
     return { actions, actionCreators, reducer, epic };
 }
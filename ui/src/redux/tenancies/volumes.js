@@ -14,6 +14,7 @@ const {
     reducer,
     epic,
 } = createTenancyResource('volume', {
+    streamed: true,
     isActive: volume => activeStatuses.includes(volume.status.toUpperCase())
 });
 